@@ -2,19 +2,27 @@
 """
 Flask приложение для веб-интерфейса мониторинга успеваемости
 """
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory
 import threading
 import time
 import os
 import json
 import re
+import shutil
 from datetime import datetime
 from pathlib import Path
 import sys
 
+import config
+
 # Импортируем наши модули
-from mektep_scraper import MektepScraper
+from mektep_scraper import SuccessDataWriter, summarize_spans
 from process_quarters_final import process_success_data
+from sapa_http import SapaHttpClient, build_class_requests
+from jobs import JobStore, JobScheduler, configure_log_file, current_job
+from browser_pool import BrowserPool
+from scrape_cache import get_scrape_cache
+from grades_store import SUMMARY_FIELDS, get_grades_store
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
@@ -22,23 +30,8 @@ from selenium.common.exceptions import TimeoutException
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
-# Глобальное состояние
-scraper_state = {
-    'running': False,
-    'progress': 0,
-    'current_step': None,
-    'message': 'Готов к запуску',
-    'error': None,
-    'waiting_for_school': False,
-    'waiting_for_class': False,
-    'schools': [],
-    'classes': [],
-    'selected_school': None,
-    'selected_class': None,
-    'scraper': None,
-    'thread': None,
-    'logs': [],
-    'auth_start_time': None,  # Время начала ожидания авторизации
+# Учетные данные, сохраненные через веб-интерфейс (только в памяти процесса)
+credentials = {
     'login': None,  # Сохраненный логин
     'password': None  # Сохраненный пароль
 }
@@ -51,40 +44,87 @@ FILES_DIR = UPLOADS_DIR
 # Создаем папку uploads, если её нет
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Хранилище заданий (общее для всех воркеров gunicorn)
+job_store = JobStore(OUTPUT_DIR / config.JOBS_DB)
+if config.LOG_FILE:
+    configure_log_file(str(OUTPUT_DIR / config.LOG_FILE), config.LOG_FILE_MAX_BYTES, config.LOG_FILE_BACKUPS)
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# Пул авторизованных браузеров процесса
+browser_pool = BrowserPool()
+
+
+def get_scheduler():
+    """Планировщик заданий процесса (создается при первом обращении)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler(job_store, {
+                'interactive': run_scraper,
+                'batch': run_batch_job
+            }, finalizers={
+                'cleanup_files': cleanup_session_files,
+                'reset': reset_job_data
+            })
+        return _scheduler
+
 
 def add_log(source, message, level='info'):
-    """Добавление лога"""
-    timestamp = datetime.now().strftime('%H:%M:%S')
-    log_entry = {
-        'timestamp': timestamp,
-        'source': source,
-        'message': message,
-        'level': level
-    }
-    scraper_state['logs'].append(log_entry)
-    # Ограничиваем количество логов
-    if len(scraper_state['logs']) > 1000:
-        scraper_state['logs'] = scraper_state['logs'][-1000:]
+    """Добавление лога (в лог задания текущего потока или в системный лог)"""
+    job = current_job()
+    job_store.add_log(job.id if job else '', source, message, level)
+
+
+def round_floats(item):
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in item.items()}
+
+
+def flush_spans(scraper):
+    """Сохранение новых спанов шагов задания текущего потока (видны всем воркерам)"""
+    job = current_job()
+    if job is None or scraper is None:
+        return
+    try:
+        job_store.add_spans(job.id, scraper.take_new_spans())
+    except Exception as e:
+        add_log('SYSTEM', f'Не удалось сохранить время шагов: {str(e)}', 'warning')
+
+
+def log_timing_report(job):
+    """Отчет о времени шагов и ожиданий браузера в лог и состояние задания"""
+    if job.scraper is None or not job.scraper.timings:
+        return
+    flush_spans(job.scraper)
+    report = job.scraper.timing_report()
+    job.update(timings=[round_floats(item) for item in report])
+    for item in report:
+        add_log('TIMING', f"{item['step']}: {item['count']}x, всего {item['total']:.2f} с, "
+                          f"среднее {item['avg']:.2f} с, макс {item['max']:.2f} с", 'info')
+
 
+def release_browser(job):
+    """Возврат браузера задания в пул; после остановки задания браузер закрывается"""
+    if job.scraper is not None:
+        log_timing_report(job)
+        browser_pool.checkin(job.scraper, healthy=not job.should_stop())
+        job.scraper = None
 
-def cleanup_session_files():
-    """Очистка файлов сессии (промежуточный и конечный Excel)"""
+
+def job_files_dir(job_id):
+    """Папка с файлами задания"""
+    return UPLOADS_DIR / job_id
+
+
+def cleanup_session_files(job_id):
+    """Очистка файлов задания (промежуточный и конечный Excel)"""
     try:
-        deleted_files = []
-        
-        # Удаляем промежуточный файл
-        intermediate_file = UPLOADS_DIR / 'success_data.xlsx'
-        if intermediate_file.exists():
-            intermediate_file.unlink()
-            deleted_files.append(intermediate_file.name)
-            add_log('SYSTEM', f'Удален промежуточный файл: {intermediate_file.name}', 'info')
-        
-        # Удаляем все конечные файлы (обработанные)
-        for file_path in UPLOADS_DIR.glob('*.xlsx'):
-            if file_path.is_file() and file_path.name != 'success_data.xlsx':
-                file_path.unlink()
-                deleted_files.append(file_path.name)
-                add_log('SYSTEM', f'Удален файл: {file_path.name}', 'info')
+        files_dir = job_files_dir(job_id)
+        deleted_files = [path.name for path in files_dir.glob('*.xlsx')] if files_dir.exists() else []
+        shutil.rmtree(files_dir, ignore_errors=True)
+        
+        for name in deleted_files:
+            add_log('SYSTEM', f'Удален файл: {name}', 'info')
         
         if deleted_files:
             add_log('SYSTEM', f'Очищено файлов сессии: {len(deleted_files)}', 'success')
@@ -97,67 +137,413 @@ def cleanup_session_files():
         return 0
 
 
-def run_scraper():
-    """Запуск скрапера в отдельном потоке"""
+def reset_job_data(job_id):
+    """Сброс задания: удаление файлов и логов"""
+    cleanup_session_files(job_id)
+    job_store.clear_logs(job_id)
+
+
+def run_after_job(job, command, action):
+    """Действие над файлами/логами задания: сразу, если задание не выполняется, иначе - командой,
+    которую планировщик выполнит после завершения обработчика (он еще может писать в эти файлы)
+    """
+    if not job_store.send_command(job['id'], command):
+        action(job['id'])
+
+
+def collect_class_table_browser(scraper, group, group_idx):
+    """Извлечение таблицы 'Сапа' одного класса кликом по кнопке в браузере.
+    Возвращает {"headers", "data"} или None, если класс нужно пропустить
+    """
+    # Кликаем по кнопке "Успеваемость" для текущего класса
+    if not group.get('button'):
+        add_log('SCRAPER', f'Кнопка не найдена для {group["name"]}, пропускаем', 'warning')
+        return None
+
+    try:
+        # ШАГ 1: Убеждаемся, что предыдущее модальное окно закрыто (если есть)
+        if group_idx > 0 and scraper.is_modal_open():
+            add_log('SCRAPER', 'Ожидание закрытия предыдущего модального окна...', 'info')
+            # Пробуем закрыть принудительно, если не закрылось само
+            if not scraper.wait_modal_closed(timeout=3):
+                scraper.close_modal()
+
+            if scraper.is_modal_open():
+                add_log('SCRAPER', f'Предыдущее модальное окно не закрылось, пропускаем {group["name"]}', 'warning')
+                return None
+
+        # ШАГ 2: Получаем свежую ссылку на кнопку (может стать устаревшей после закрытия модального окна)
+        button = None
+        try:
+            # Пробуем использовать сохраненную кнопку
+            button = group['button']
+            # Проверяем, что кнопка еще валидна
+            _ = button.is_displayed()
+        except Exception:
+            # Кнопка стала устаревшей, переполучаем её
+            add_log('SCRAPER', f'Переполучение кнопки для {group["name"]}...', 'info')
+            button = None
+            try:
+                # Ищем кнопку заново по имени класса
+                # Ищем строку таблицы с нужным классом
+                tables = scraper.driver.find_elements(By.CSS_SELECTOR, "table.table-striped, table.table-bordered")
+                for table in tables:
+                    rows = table.find_elements(By.TAG_NAME, "tr")
+                    for row in rows:
+                        cells = row.find_elements(By.TAG_NAME, "td")
+                        if cells:
+                            # Проверяем, содержит ли первая ячейка название класса
+                            if group['name'] in cells[0].text:
+                                # Ищем кнопку в последней ячейке (столбец "Действия")
+                                try:
+                                    button = cells[-1].find_element(By.TAG_NAME, "button")
+                                    break
+                                except:
+                                    pass
+                        if button:
+                            break
+                    if button:
+                        break
+            except Exception as e:
+                add_log('SCRAPER', f'Не удалось найти кнопку для {group["name"]}: {str(e)}', 'warning')
+                return None
+
+        if not button:
+            add_log('SCRAPER', f'Кнопка не найдена для {group["name"]}, пропускаем', 'warning')
+            return None
+
+        # ШАГ 3: Прокручиваем к кнопке и убеждаемся, что она видна
+        try:
+            # Без плавной прокрутки кнопка сразу оказывается на месте
+            scraper.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
+
+            # Проверяем, что кнопка видна после прокрутки
+            if not button.is_displayed():
+                add_log('SCRAPER', f'Кнопка для {group["name"]} все еще не видна, пропускаем', 'warning')
+                return None
+        except Exception as e:
+            add_log('SCRAPER', f'Ошибка при работе с кнопкой для {group["name"]}: {str(e)}', 'warning')
+            return None
+
+        # ШАГ 4: Открываем модальное окно
+        scraper.driver.execute_script("arguments[0].click();", button)
+        add_log('SCRAPER', f'Клик по кнопке для {group["name"]}', 'info')
+
+        # ШАГ 5: Убеждаемся, что модальное окно открылось
+        try:
+            # Ждем появления модального окна (Bootstrap добавляет класс "show" после анимации)
+            with scraper.timed('wait:modal_open'):
+                scraper.wait.until(lambda d: scraper.is_modal_open())
+
+            # Проверяем, что модальное окно действительно открыто
+            if not scraper.is_modal_open():
+                add_log('SCRAPER', f'Модальное окно не открылось для {group["name"]}', 'warning')
+                return None
+
+            # Ждем появления таблицы
+            try:
+                scraper.wait.until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "#classSapa table"))
+                )
+                # Ждем, пока таблица полностью загрузится (строки перестанут добавляться)
+                if not scraper.wait_for_rows_stable("#classSapa table tbody tr", step='modal_rows'):
+                    raise TimeoutException()
+                add_log('SCRAPER', f'Модальное окно открыто и таблица загружена для {group["name"]}', 'success')
+            except TimeoutException:
+                add_log('SCRAPER', f'Таблица не появилась для {group["name"]}, но продолжаем...', 'warning')
+        except TimeoutException:
+            add_log('SCRAPER', f'Модальное окно не найдено для {group["name"]}', 'warning')
+            return None
+
+        # ШАГ 6: Извлекаем данные из модального окна
+        with scraper.timed('extract_table'):
+            table_data = scraper.extract_modal_table_data()
+        if not table_data:
+            add_log('SCRAPER', f'Не удалось извлечь данные для {group["name"]}', 'warning')
+            scraper.close_modal()
+            # Убеждаемся, что закрылось
+            if not scraper.wait_modal_closed():
+                add_log('SCRAPER', f'Не удалось закрыть модальное окно для {group["name"]}', 'error')
+            return None
+
+        # ШАГ 7: Закрываем модальное окно
+        with scraper.timed('close_modal'):
+            closed = scraper.close_modal()
+        if closed:
+            add_log('SCRAPER', f'Модальное окно закрыто для {group["name"]}', 'info')
+        else:
+            add_log('SCRAPER', f'Не удалось закрыть модальное окно для {group["name"]}', 'warning')
+
+        # ШАГ 8: Убеждаемся, что модальное окно закрыто перед следующим
+        if not closed and not scraper.wait_modal_closed():
+            add_log('SCRAPER', f'Модальное окно все еще открыто для {group["name"]}, принудительно закрываем', 'warning')
+            # Принудительное закрытие
+            try:
+                scraper.driver.execute_script("""
+                    var modal = document.getElementById('classSapa');
+                    if (modal) {
+                        modal.classList.remove('show');
+                        modal.style.display = 'none';
+                    }
+                    var backdrop = document.querySelector('.modal-backdrop');
+                    if (backdrop) {
+                        backdrop.remove();
+                    }
+                    document.body.classList.remove('modal-open');
+                """)
+            except:
+                pass
+
+        return table_data
+
+    except Exception as e:
+        add_log('SCRAPER', f'Ошибка при обработке {group["name"]}: {str(e)}', 'error')
+        import traceback
+        add_log('SCRAPER', f'Трассировка: {traceback.format_exc()}', 'error')
+        # Пытаемся закрыть модальное окно при ошибке
+        try:
+            scraper.close_modal()
+        except:
+            pass
+        return None
+
+
+def collect_class_tables_http(scraper, class_groups, should_stop):
+    """Загрузка таблиц 'Сапа' всех классов параллели прямыми HTTP-запросами.
+
+    Один раз перехватывает AJAX-запрос модального окна в браузере, строит по нему
+    запросы для остальных классов и выполняет их через пул соединений с cookies
+    авторизованной сессии. Возвращает ({индекс группы: table_data}, индексы классов,
+    для которых HTTP-запрос выполнялся); классы, которые не удалось загрузить,
+    отсутствуют в таблицах (для них используется браузер)
+    """
+    tables = {}
+    attempted = set()
+
+    # Образец запроса берем у первого класса с кнопкой
+    template_group = next((group for group in class_groups if group.get('button')), None)
+    if not template_group:
+        add_log('SCRAPER', 'HTTP: нет кнопок для перехвата запроса, используем браузер', 'warning')
+        return tables, attempted
+
+    template_request = scraper.capture_sapa_request(template_group['button'])
+    if not template_request:
+        add_log('SCRAPER', 'HTTP: запрос таблицы не перехвачен, используем браузер', 'warning')
+        return tables, attempted
+
+    class_requests = build_class_requests(template_request, template_group, class_groups)
+    add_log('SCRAPER', f'HTTP: загрузка {len(class_groups)} классов '
+            f'(потоков: {config.SCRAPER_CONCURRENCY}, лимит: {config.SCRAPER_RATE_LIMIT} запр/с)', 'info')
+    client = SapaHttpClient.from_scraper(scraper, pool_size=max(config.HTTP_POOL_SIZE, config.SCRAPER_CONCURRENCY))
+    try:
+        results = client.fetch_many(class_requests, should_stop=should_stop)
+        for group_idx, (group, sapa_request, (table_data, error)) in enumerate(zip(class_groups, class_requests, results)):
+            if sapa_request is None:
+                continue
+            if table_data is None and error is None and should_stop():
+                continue  # После остановки fetch_many пропускает оставшиеся запросы
+            attempted.add(group_idx)
+            if error is not None:
+                add_log('SCRAPER', f'HTTP: ошибка загрузки {group["name"]}: {str(error)}', 'warning')
+                continue
+            if table_data:
+                tables[group_idx] = table_data
+                add_log('SCRAPER', f'HTTP: таблица {group["name"]} загружена ({len(table_data["data"])} строк)', 'success')
+            else:
+                add_log('SCRAPER', f'HTTP: пустой ответ для {group["name"]}', 'warning')
+    finally:
+        client.close()
+
+    add_log('SCRAPER', f'HTTP: загружено {len(tables)} из {len(class_groups)} классов', 'info')
+    return tables, attempted
+
+
+def collect_parallel_tables(scraper, class_groups, should_stop, on_class=None, school=None):
+    """Извлечение таблиц 'Сапа' всех классов выбранной параллели (вкладки).
+
+    Использует движок из config.SCRAPER_ENGINE; для классов, которые не удалось
+    загрузить по HTTP, используется браузер. Если указана школа и включен кэш
+    (SCRAPE_CACHE_DIR), изменения классов сверяются с прошлым запуском по хэшам,
+    а классы с неизменной строкой в списке классов берутся из кэша без загрузки
+    (SCRAPE_PROBE_MAX_AGE). Возвращает список (group, table_data) в исходном порядке классов
+    """
+    cache = get_scrape_cache() if school else None
+    cached_tables = {}
+    if cache:
+        for group_idx, group in enumerate(class_groups):
+            table_data = cache.cached_table(school, group)
+            if table_data:
+                cached_tables[group_idx] = table_data
+        if cached_tables:
+            add_log('SCRAPER', f'Классы без изменений в списке классов берутся из кэша: '
+                    f'{len(cached_tables)} из {len(class_groups)}', 'info')
+
+    # Для HTTP-движка заранее загружаем таблицы всех классов прямыми запросами
+    http_tables = {}
+    http_attempted = set()
+    fetch_indexes = [group_idx for group_idx in range(len(class_groups)) if group_idx not in cached_tables]
+    if config.SCRAPER_ENGINE == 'http' and fetch_indexes:
+        with scraper.timed('classes:http', school=school):
+            fetched, attempted = collect_class_tables_http(scraper, [class_groups[idx] for idx in fetch_indexes],
+                                                           should_stop)
+        http_tables = {fetch_indexes[idx]: table_data for idx, table_data in fetched.items()}
+        http_attempted = {fetch_indexes[idx] for idx in attempted}
+
+    collected = []
+    unchanged = 0
+    total_groups = len(class_groups)
+    for group_idx, group in enumerate(class_groups):
+        if should_stop():
+            break
+
+        if on_class:
+            on_class(group_idx, total_groups, group)
+
+        table_data = cached_tables.get(group_idx)
+        from_cache = table_data is not None
+        if table_data is None:
+            table_data = http_tables.get(group_idx)
+        if table_data is None:
+            # Браузерный путь (основной или запасной для HTTP-движка); повтор - только если
+            # HTTP-запрос класса действительно выполнялся, а не HTTP-движок был недоступен
+            retries = 1 if group_idx in http_attempted else 0
+            with scraper.span_scope(class_name=group['name'], school=school), \
+                    scraper.timed('class:browser', retries=retries):
+                table_data = collect_class_table_browser(scraper, group, group_idx)
+        if table_data:
+            if cache:
+                changed = cache.update_class(school, group, table_data, fetched=not from_cache)
+                if changed:
+                    add_log('SCRAPER', f'{group["name"]}: изменены данные ({", ".join(changed)})', 'info')
+                else:
+                    unchanged += 1
+            collected.append((group, table_data))
+
+    if cache and unchanged:
+        add_log('SCRAPER', f'Без изменений с прошлого запуска: {unchanged} из {len(collected)} классов', 'info')
+    flush_spans(scraper)
+    return collected
+
+
+def save_parallel_tables(writer, collected, school=None):
+    """Добавление извлеченных таблиц к таблицам задания (лист на класс).
+    Таблицы передаются в process_success_data из памяти; если указана школа,
+    оценки также сохраняются в хранилище оценок (GRADES_DB)
+    """
+    grades_store = get_grades_store() if school else None
+    job = current_job()
+    saved = 0
+    for group, table_data in collected:
+        class_name = group['name']
+        if writer.add(table_data, class_name):
+            add_log('SCRAPER', f'Данные для {class_name} подготовлены к сохранению', 'success')
+            saved += 1
+        else:
+            add_log('SCRAPER', f'Не удалось сохранить данные для {class_name}', 'error')
+            continue
+        if grades_store:
+            try:
+                grades_store.save_table(school, class_name, table_data, job_id=job.id if job else None)
+            except Exception as e:
+                add_log('SCRAPER', f'Не удалось сохранить оценки {class_name} в хранилище: {str(e)}', 'warning')
+    return saved
+
+
+def save_debug_workbook(scraper, writer):
+    """Промежуточный success_data.xlsx - только для отладки (KEEP_INTERMEDIATE_XLSX)"""
+    if not config.KEEP_INTERMEDIATE_XLSX:
+        return
+    with scraper.timed('save_excel'):
+        if writer.save():
+            add_log('SCRAPER', f'Промежуточный файл сохранен для отладки: {Path(writer.output_file).name}', 'info')
+        else:
+            add_log('SCRAPER', 'Не удалось сохранить промежуточный файл', 'warning')
+
+
+def build_report(scraper, tables, school, report_name, files_dir):
+    """Итоговый отчет по четвертям для таблиц классов.
+
+    Если ни одна таблица не изменилась с прошлого запуска (тот же отпечаток в кэше),
+    ранее сформированный файл копируется в папку задания без повторной обработки.
+    Возвращает (success, путь к файлу)
+    """
+    cache = get_scrape_cache()
+    fingerprint = None
+    if cache:
+        fingerprint = cache.fingerprint(tables)
+        cached_file = cache.find_output(school, report_name, fingerprint)
+        if cached_file:
+            processed_file = Path(files_dir) / Path(cached_file).name
+            shutil.copyfile(cached_file, processed_file)
+            add_log('SCRAPER', f'Данные не изменились, использован ранее сформированный файл {processed_file.name}',
+                    'success')
+            return True, str(processed_file)
+
+    with scraper.timed('process_quarters', school=school):
+        success, processed_file = process_success_data(
+            input_file=None,
+            output_file=None,  # Будет определено внутри функции
+            class_name=report_name,
+            output_dir=str(files_dir),  # Передаем папку для сохранения
+            tables=tables,
+            workers=config.PROCESS_WORKERS
+        )
+
+    if success and processed_file and cache:
+        try:
+            cache.store_output(school, report_name, fingerprint, processed_file)
+        except OSError as e:
+            add_log('SCRAPER', f'Не удалось сохранить отчет в кэш: {str(e)}', 'warning')
+    return success, processed_file
+
+
+def run_scraper(job):
+    """Интерактивное задание: авторизация, выбор школы и класса пользователем, обработка параллели"""
     try:
-        scraper_state['running'] = True
-        scraper_state['progress'] = 0
-        scraper_state['error'] = None
-        scraper_state['current_step'] = 'Инициализация'
-        scraper_state['message'] = 'Запуск скрапера...'
+        job.update(progress=0, error=None, current_step='Инициализация', message='Запуск скрапера...')
         
         add_log('SCRAPER', 'Запуск скрапера', 'info')
         
         # Проверяем наличие учетных данных
-        login = scraper_state.get('login')
-        password = scraper_state.get('password')
+        login = job.secrets.get('login')
+        password = job.secrets.get('password')
         
         if not login or not password:
-            scraper_state['error'] = 'Логин и пароль не указаны. Пожалуйста, введите учетные данные перед запуском.'
-            scraper_state['running'] = False
+            job.update(error='Логин и пароль не указаны. Пожалуйста, введите учетные данные перед запуском.')
             add_log('SCRAPER', 'Ошибка: логин и пароль не указаны', 'error')
             return
         
-        # Создаем экземпляр скрапера с учетными данными
-        scraper = MektepScraper(login=login, password=password)
-        scraper.setup_driver()
-        scraper_state['scraper'] = scraper
-        
         # Запускаем основной процесс
-        scraper_state['current_step'] = 'Авторизация'
-        scraper_state['message'] = 'Выполняется автоматическая авторизация...'
-        scraper_state['progress'] = 10
-        scraper_state['auth_start_time'] = time.time()  # Запоминаем время начала ожидания
-        
-        # Открываем страницу и выполняем авторизацию
-        if not scraper.login():
-            scraper_state['error'] = 'Не удалось авторизоваться. Проверьте правильность логина и пароля.'
-            scraper_state['running'] = False
-            scraper_state['auth_start_time'] = None
+        job.update(
+            current_step='Авторизация',
+            message='Выполняется автоматическая авторизация...',
+            progress=10,
+            auth_start_time=time.time()  # Запоминаем время начала ожидания
+        )
+        
+        # Берем авторизованный браузер из пула (новый запускается и авторизуется только при необходимости)
+        try:
+            scraper = browser_pool.checkout(login, password)
+        except RuntimeError as e:
+            job.update(error=str(e), auth_start_time=None)
             add_log('SCRAPER', 'Ошибка авторизации', 'error')
             return
+        job.scraper = scraper
         
-        scraper_state['auth_start_time'] = None  # Сбрасываем после успешной авторизации
-        
-        scraper_state['progress'] = 20
-        scraper_state['current_step'] = 'Навигация'
-        scraper_state['message'] = 'Переход на страницу отчетов...'
+        # Сбрасываем время ожидания после успешной авторизации
+        job.update(auth_start_time=None, progress=20, current_step='Навигация', message='Переход на страницу отчетов...')
         
         # Переходим на страницу отчетов
         if not scraper.navigate_to_reports():
-            scraper_state['error'] = 'Не удалось перейти на страницу отчетов'
-            scraper_state['running'] = False
+            job.update(error='Не удалось перейти на страницу отчетов')
             return
         
-        scraper_state['progress'] = 30
-        scraper_state['current_step'] = 'Загрузка школ'
-        scraper_state['message'] = 'Загрузка списка школ...'
+        job.update(progress=30, current_step='Загрузка школ', message='Загрузка списка школ...')
         
         # Получаем список школ
         schools = scraper.get_schools_list()
         if not schools:
-            scraper_state['error'] = 'Не удалось загрузить список школ'
-            scraper_state['running'] = False
+            job.update(error='Не удалось загрузить список школ')
             return
         
         # Форматируем школы для фронтенда
@@ -168,52 +554,34 @@ def run_scraper():
                 'name': school.get('name', 'Неизвестная школа')
             })
         
-        scraper_state['schools'] = formatted_schools
-        scraper_state['waiting_for_school'] = True
-        scraper_state['message'] = 'Выберите школу из списка'
-        scraper_state['progress'] = 40
+        job.update(schools=formatted_schools, waiting_for_school=True, message='Выберите школу из списка', progress=40)
         
         add_log('SCRAPER', f'Найдено школ: {len(formatted_schools)}', 'success')
         
-        # Ждем выбора школы
-        timeout = 300  # 5 минут
-        start_time = time.time()
-        while scraper_state['waiting_for_school'] and scraper_state['running']:
-            if time.time() - start_time > timeout:
-                scraper_state['error'] = 'Превышено время ожидания выбора школы'
-                scraper_state['running'] = False
-                return
-            time.sleep(0.5)
-        
-        if not scraper_state['running']:
+        # Ждем команду выбора школы (выбор может прийти через любой воркер - команды в хранилище заданий)
+        try:
+            selected_school = job.wait_command('select_school', timeout=config.SELECTION_TIMEOUT)
+        except TimeoutError:
+            job.update(error='Превышено время ожидания выбора школы', waiting_for_school=False)
             return
         
-        selected_school = scraper_state['selected_school']
-        if not selected_school:
-            scraper_state['error'] = 'Школа не выбрана'
-            scraper_state['running'] = False
+        if selected_school is None or job.should_stop():
             return
         
-        scraper_state['progress'] = 50
-        scraper_state['current_step'] = 'Переход к школе'
-        scraper_state['message'] = f'Переход к школе: {selected_school["name"]}'
+        job.update(selected_school=selected_school, progress=50, current_step='Переход к школе', message=f'Переход к школе: {selected_school["name"]}')
         
         # Переходим к выбранной школе (используем номер из списка школ, 1-based)
         school_index = selected_school['number']  # Номер школы (1-based)
         if not scraper.select_school(school_index):
-            scraper_state['error'] = 'Не удалось перейти к выбранной школе'
-            scraper_state['running'] = False
+            job.update(error='Не удалось перейти к выбранной школе')
             return
         
-        scraper_state['progress'] = 60
-        scraper_state['current_step'] = 'Загрузка классов'
-        scraper_state['message'] = 'Загрузка списка классов...'
+        job.update(progress=60, current_step='Загрузка классов', message='Загрузка списка классов...')
         
         # Получаем список классов (вкладок)
         class_tabs = scraper.get_classes_list()
         if not class_tabs:
-            scraper_state['error'] = 'Не удалось загрузить список классов'
-            scraper_state['running'] = False
+            job.update(error='Не удалось загрузить список классов')
             return
         
         # Форматируем вкладки классов для фронтенда
@@ -226,309 +594,360 @@ def run_scraper():
                 'text': tab.get('text', f"{tab['number']} класс")
             })
         
-        scraper_state['classes'] = formatted_classes
-        scraper_state['waiting_for_class'] = True
-        scraper_state['message'] = 'Выберите класс из списка'
-        scraper_state['progress'] = 70
+        job.update(classes=formatted_classes, waiting_for_class=True, message='Выберите класс из списка', progress=70)
         
         add_log('SCRAPER', f'Найдено классов: {len(formatted_classes)}', 'success')
         
-        # Ждем выбора класса (вкладки)
-        timeout = 300  # 5 минут
-        start_time = time.time()
-        while scraper_state['waiting_for_class'] and scraper_state['running']:
-            if time.time() - start_time > timeout:
-                scraper_state['error'] = 'Превышено время ожидания выбора класса'
-                scraper_state['running'] = False
-                return
-            time.sleep(0.5)
-        
-        if not scraper_state['running']:
+        # Ждем команду выбора класса (вкладки)
+        try:
+            selected_class = job.wait_command('select_class', timeout=config.SELECTION_TIMEOUT)
+        except TimeoutError:
+            job.update(error='Превышено время ожидания выбора класса', waiting_for_class=False)
             return
         
-        selected_class = scraper_state['selected_class']
-        if not selected_class:
-            scraper_state['error'] = 'Класс не выбран'
-            scraper_state['running'] = False
+        if selected_class is None or job.should_stop():
             return
         
-        scraper_state['progress'] = 80
-        scraper_state['current_step'] = 'Обработка данных'
-        scraper_state['message'] = f'Обработка класса: {selected_class["name"]}'
+        job.update(selected_class=selected_class, progress=80, current_step='Обработка данных', message=f'Обработка класса: {selected_class["name"]}')
         
         # Выбираем вкладку класса
         class_grade = selected_class.get('grade')
         if not class_grade:
-            scraper_state['error'] = 'Не указан номер класса'
-            scraper_state['running'] = False
+            job.update(error='Не указан номер класса')
             return
         
         if not scraper.select_class_tab(class_grade):
-            scraper_state['error'] = f'Не удалось выбрать вкладку класса {class_grade}'
-            scraper_state['running'] = False
+            job.update(error=f'Не удалось выбрать вкладку класса {class_grade}')
             return
         
         # Получаем список групп классов для выбранной вкладки
         class_groups = scraper.get_class_groups_from_table()
         if not class_groups:
-            scraper_state['error'] = 'Не удалось загрузить список групп классов'
-            scraper_state['running'] = False
+            job.update(error='Не удалось загрузить список групп классов')
             return
         
         add_log('SCRAPER', f'Найдено групп в классе {class_grade}: {len(class_groups)}', 'success')
         
-        # Выбираем класс и обрабатываем данные
-        output_file = str(UPLOADS_DIR / 'success_data.xlsx')
+        # Файлы задания хранятся в отдельной папке, чтобы параллельные задания не мешали друг другу
+        files_dir = job_files_dir(job.id)
+        files_dir.mkdir(parents=True, exist_ok=True)
+        output_file = str(files_dir / 'success_data.xlsx')
         
-        # Получаем список групп классов для выбранной вкладки
-        class_groups = scraper.get_class_groups_from_table()
-        if not class_groups:
-            scraper_state['error'] = 'Не удалось загрузить список групп классов'
-            scraper_state['running'] = False
-            return
+        def on_class(group_idx, total_groups, group):
+            job.update(
+                message=f'Обработка класса: {group["name"]} ({group_idx + 1}/{total_groups})',
+                progress=80 + int((group_idx + 1) / total_groups * 10)
+            )
         
         # Обрабатываем все классы параллели
-        total_groups = len(class_groups)
-        for group_idx, group in enumerate(class_groups):
-            if not scraper_state['running']:
-                break
-            
-            scraper_state['message'] = f'Обработка класса: {group["name"]} ({group_idx + 1}/{total_groups})'
-            scraper_state['progress'] = 80 + int((group_idx + 1) / total_groups * 10)
-            
-            # Кликаем по кнопке "Успеваемость" для текущего класса
-            if not group.get('button'):
-                add_log('SCRAPER', f'Кнопка не найдена для {group["name"]}, пропускаем', 'warning')
-                continue
-            
-            try:
-                # ШАГ 1: Убеждаемся, что предыдущее модальное окно закрыто (если есть)
-                if group_idx > 0:
-                    max_wait = 10
-                    wait_count = 0
-                    while scraper.is_modal_open() and wait_count < max_wait:
-                        add_log('SCRAPER', f'Ожидание закрытия предыдущего модального окна... ({wait_count + 1}/{max_wait})', 'info')
-                        time.sleep(0.5)
-                        wait_count += 1
-                        # Пробуем закрыть принудительно
-                        if wait_count > 5:
-                            scraper.close_modal()
-                    
-                    if scraper.is_modal_open():
-                        add_log('SCRAPER', f'Предыдущее модальное окно не закрылось, пропускаем {group["name"]}', 'warning')
-                        continue
-                
-                # ШАГ 2: Получаем свежую ссылку на кнопку (может стать устаревшей после закрытия модального окна)
-                button = None
-                try:
-                    # Пробуем использовать сохраненную кнопку
-                    button = group['button']
-                    # Проверяем, что кнопка еще валидна
-                    _ = button.is_displayed()
-                except Exception:
-                    # Кнопка стала устаревшей, переполучаем её
-                    add_log('SCRAPER', f'Переполучение кнопки для {group["name"]}...', 'info')
-                    try:
-                        # Ищем кнопку заново по имени класса
-                        # Ищем строку таблицы с нужным классом
-                        tables = scraper.driver.find_elements(By.CSS_SELECTOR, "table.table-striped, table.table-bordered")
-                        for table in tables:
-                            rows = table.find_elements(By.TAG_NAME, "tr")
-                            for row in rows:
-                                cells = row.find_elements(By.TAG_NAME, "td")
-                                if cells:
-                                    # Проверяем, содержит ли первая ячейка название класса
-                                    if group['name'] in cells[0].text:
-                                        # Ищем кнопку в последней ячейке (столбец "Действия")
-                                        try:
-                                            button = cells[-1].find_element(By.TAG_NAME, "button")
-                                            break
-                                        except:
-                                            pass
-                                if button:
-                                    break
-                            if button:
-                                break
-                    except Exception as e:
-                        add_log('SCRAPER', f'Не удалось найти кнопку для {group["name"]}: {str(e)}', 'warning')
-                        continue
-                
-                if not button:
-                    add_log('SCRAPER', f'Кнопка не найдена для {group["name"]}, пропускаем', 'warning')
-                    continue
-                
-                # ШАГ 3: Прокручиваем к кнопке и убеждаемся, что она видна
-                try:
-                    scraper.driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", button)
-                    time.sleep(0.5)
-                    
-                    # Проверяем, что кнопка видна после прокрутки
-                    if not button.is_displayed():
-                        add_log('SCRAPER', f'Кнопка для {group["name"]} все еще не видна, пропускаем', 'warning')
-                        continue
-                except Exception as e:
-                    add_log('SCRAPER', f'Ошибка при работе с кнопкой для {group["name"]}: {str(e)}', 'warning')
-                    continue
-                
-                # ШАГ 4: Открываем модальное окно
-                scraper.driver.execute_script("arguments[0].click();", button)
-                add_log('SCRAPER', f'Клик по кнопке для {group["name"]}', 'info')
-                time.sleep(0.5)  # Уменьшена пауза
-                
-                # ШАГ 5: Убеждаемся, что модальное окно открылось
-                try:
-                    # Ждем появления модального окна
-                    scraper.wait.until(
-                        EC.any_of(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, "#classSapa.modal.show")),
-                            EC.presence_of_element_located((By.CSS_SELECTOR, "#classSapa.modal:not(.fade)")),
-                            EC.presence_of_element_located((By.ID, "classSapa"))
-                        )
-                    )
-                    time.sleep(0.5)  # Уменьшена пауза
-                    
-                    # Проверяем, что модальное окно действительно открыто
-                    if not scraper.is_modal_open():
-                        add_log('SCRAPER', f'Модальное окно не открылось для {group["name"]}', 'warning')
-                        continue
-                    
-                    # Ждем появления таблицы
-                    try:
-                        scraper.wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, "#classSapa table"))
-                        )
-                        # Ждем, пока таблица полностью загрузится (проверяем наличие строк)
-                        scraper.wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, "#classSapa table tbody tr")) > 0)
-                        time.sleep(0.3)  # Минимальная пауза для стабильности
-                        add_log('SCRAPER', f'Модальное окно открыто и таблица загружена для {group["name"]}', 'success')
-                    except TimeoutException:
-                        add_log('SCRAPER', f'Таблица не появилась для {group["name"]}, но продолжаем...', 'warning')
-                except TimeoutException:
-                    add_log('SCRAPER', f'Модальное окно не найдено для {group["name"]}', 'warning')
-                    continue
-                
-                # ШАГ 6: Извлекаем данные из модального окна
-                table_data = scraper.extract_modal_table_data()
-                if not table_data:
-                    add_log('SCRAPER', f'Не удалось извлечь данные для {group["name"]}', 'warning')
-                    scraper.close_modal()
-                    # Убеждаемся, что закрылось
-                    time.sleep(1)
-                    if scraper.is_modal_open():
-                        add_log('SCRAPER', f'Не удалось закрыть модальное окно для {group["name"]}', 'error')
-                    continue
-                
-                # ШАГ 7: Сохраняем данные в Excel
-                class_name = group['name']
-                if scraper.save_to_excel(table_data, class_name, output_file):
-                    add_log('SCRAPER', f'Данные для {class_name} сохранены', 'success')
-                else:
-                    add_log('SCRAPER', f'Не удалось сохранить данные для {class_name}', 'error')
-                
-                # ШАГ 8: Закрываем модальное окно
-                if scraper.close_modal():
-                    add_log('SCRAPER', f'Модальное окно закрыто для {group["name"]}', 'info')
-                else:
-                    add_log('SCRAPER', f'Не удалось закрыть модальное окно для {group["name"]}', 'warning')
-                
-                # ШАГ 9: Убеждаемся, что модальное окно закрыто перед следующим
-                max_wait = 10
-                wait_count = 0
-                while scraper.is_modal_open() and wait_count < max_wait:
-                    time.sleep(0.3)
-                    wait_count += 1
-                
-                if scraper.is_modal_open():
-                    add_log('SCRAPER', f'Модальное окно все еще открыто для {group["name"]}, принудительно закрываем', 'warning')
-                    # Принудительное закрытие
-                    try:
-                        scraper.driver.execute_script("""
-                            var modal = document.getElementById('classSapa');
-                            if (modal) {
-                                modal.classList.remove('show');
-                                modal.style.display = 'none';
-                            }
-                            var backdrop = document.querySelector('.modal-backdrop');
-                            if (backdrop) {
-                                backdrop.remove();
-                            }
-                            document.body.classList.remove('modal-open');
-                        """)
-                    except:
-                        pass
-                
-                # Пауза перед следующим классом (уменьшена для ускорения)
-                time.sleep(0.5)
-                
-            except Exception as e:
-                add_log('SCRAPER', f'Ошибка при обработке {group["name"]}: {str(e)}', 'error')
-                import traceback
-                add_log('SCRAPER', f'Трассировка: {traceback.format_exc()}', 'error')
-                # Пытаемся закрыть модальное окно при ошибке
-                try:
-                    scraper.close_modal()
-                    time.sleep(1)
-                except:
-                    pass
-                continue
+        collected = collect_parallel_tables(scraper, class_groups, should_stop=job.should_stop, on_class=on_class,
+                                            school=selected_school['name'])
         
-        scraper_state['progress'] = 90
-        scraper_state['current_step'] = 'Обработка файлов'
-        scraper_state['message'] = 'Обработка данных по четвертям...'
+        if job.should_stop():
+            return
+        
+        writer = SuccessDataWriter(output_file)
+        if not save_parallel_tables(writer, collected, school=selected_school['name']):
+            job.update(error='Не удалось сохранить данные классов')
+            return
+        save_debug_workbook(scraper, writer)
+        
+        job.update(progress=90, current_step='Обработка файлов', message='Обработка данных по четвертям...')
         
-        # Обрабатываем файл через process_quarters_final
+        # Обрабатываем таблицы через process_quarters_final (из памяти, без промежуточного файла;
+        # при неизменных данных берется отчет прошлого запуска)
         # Определяем имя класса из выбранного класса
         # Извлекаем номер класса из grade (например, "11" -> "11 класс")
         class_name = f"{class_grade} класс"
         
-        success, processed_file = process_success_data(
-            input_file=output_file,
-            output_file=None,  # Будет определено внутри функции
-            class_name=class_name,
-            output_dir=str(UPLOADS_DIR)  # Передаем папку для сохранения
-        )
+        success, processed_file = build_report(scraper, writer.sheets, selected_school['name'], class_name, files_dir)
         
         if success and processed_file:
-            scraper_state['progress'] = 100
-            scraper_state['current_step'] = 'Завершено'
-            scraper_state['message'] = 'Данные успешно обработаны!'
+            job.update(progress=100, current_step='Завершено', message='Данные успешно обработаны!',
+                       files=[Path(processed_file).name])
             add_log('SCRAPER', f'Файл сохранен: {processed_file}', 'success')
-            
-            # Очищаем промежуточный файл после успешной обработки
-            intermediate_file = UPLOADS_DIR / 'success_data.xlsx'
-            if intermediate_file.exists():
-                try:
-                    intermediate_file.unlink()
-                    add_log('SYSTEM', 'Промежуточный файл удален', 'info')
-                except Exception as e:
-                    add_log('SYSTEM', f'Не удалось удалить промежуточный файл: {str(e)}', 'warning')
         else:
-            scraper_state['error'] = 'Ошибка при обработке данных'
+            job.update(error='Ошибка при обработке данных')
             add_log('SCRAPER', 'Ошибка при обработке данных', 'error')
         
-        scraper_state['running'] = False
-        
-        # Закрываем браузер
-        try:
-            if scraper and scraper.driver:
-                scraper.driver.quit()
-        except Exception as e:
-            add_log('SCRAPER', f'Ошибка при закрытии браузера: {str(e)}', 'warning')
-        
     except Exception as e:
-        scraper_state['error'] = str(e)
-        scraper_state['running'] = False
+        job.update(error=str(e))
         add_log('SCRAPER', f'Ошибка: {str(e)}', 'error')
         import traceback
         traceback.print_exc()
-        
-        # Закрываем браузер при ошибке
+    finally:
+        # Возвращаем браузер в пул
+        release_browser(job)
+
+
+def match_batch_items(items, selectors, key):
+    """Отбор школ/вкладок по списку селекторов пакетного задания.
+
+    selectors - "all" или список. Для школ: число - номер в списке (1-based),
+    строка - часть названия; для вкладок - номер класса ("11" или 11)
+    """
+    if selectors in (None, 'all', ['all']):
+        return list(items)
+
+    selected = []
+    for selector in selectors:
+        for idx, item in enumerate(items, 1):
+            if isinstance(selector, int) and key == 'name':
+                matched = idx == selector
+            else:
+                selector_str = str(selector).strip().lower()
+                matched = selector_str == str(item.get(key, '')).strip().lower() or \
+                    (key == 'name' and selector_str in str(item.get('name', '')).lower())
+            if matched and item not in selected:
+                selected.append(item)
+    return selected
+
+
+def run_batch_job(job):
+    """Пакетная обработка школ и параллелей без интерактивного выбора.
+
+    Один раз авторизуется, затем для каждой выбранной школы обходит выбранные
+    вкладки классов и сохраняет результат в отдельный файл школы
+    """
+    should_stop = job.should_stop
+    files = []
+    failed = []
+
+    try:
+        job.update(current_step='Пакетная обработка', message='Авторизация...')
+        add_log('BATCH', f'Запуск пакетного задания {job.id}', 'info')
+
+        scraper = browser_pool.checkout(job.secrets.get('login'), job.secrets.get('password'))
+        job.scraper = scraper
+
+        job.update(message='Загрузка списка школ...')
+        if not scraper.navigate_to_reports():
+            raise RuntimeError('Не удалось перейти на страницу отчетов')
+        schools = scraper.get_schools_list()
+        if not schools:
+            raise RuntimeError('Не удалось загрузить список школ')
+
+        selected_schools = match_batch_items(schools, job.params['schools'], 'name')
+        job.update(total_schools=len(selected_schools))
+        add_log('BATCH', f'Школ к обработке: {len(selected_schools)} из {len(schools)}', 'info')
+
+        files_dir = job_files_dir(job.id)
+        files_dir.mkdir(parents=True, exist_ok=True)
+
+        for school_idx, school in enumerate(selected_schools):
+            if should_stop():
+                break
+
+            job.update(
+                current_school=school['name'],
+                message=f'Школа {school_idx + 1}/{len(selected_schools)}: {school["name"]}',
+                progress=int(school_idx / len(selected_schools) * 100)
+            )
+
+            # Переходим к школе напрямую по URL (список школ уже получен)
+            if not scraper.open_page(school['url']):
+                failed.append({'school': school['name'], 'error': 'Не удалось открыть страницу школы'})
+                job.update(failed=failed)
+                add_log('BATCH', f'Не удалось открыть страницу школы {school["name"]}', 'error')
+                continue
+
+            class_tabs = match_batch_items(scraper.get_classes_list(), job.params['grades'], 'number')
+            if not class_tabs:
+                failed.append({'school': school['name'], 'error': 'Нет вкладок классов'})
+                job.update(failed=failed)
+                add_log('BATCH', f'Нет подходящих вкладок классов в школе {school["name"]}', 'warning')
+                continue
+
+            # Таблицы школы: все параллели на отдельных листах (файл - только для отладки)
+            writer = SuccessDataWriter(str(files_dir / f'batch_{school["index"]}_success_data.xlsx'))
+            saved = 0
+            for tab in class_tabs:
+                if should_stop():
+                    break
+                if not scraper.select_class_tab(tab['number']):
+                    add_log('BATCH', f'{school["name"]}: не удалось выбрать вкладку {tab["number"]}', 'warning')
+                    continue
+                class_groups = scraper.get_class_groups_from_table()
+                if not class_groups:
+                    add_log('BATCH', f'{school["name"]}: нет классов во вкладке {tab["number"]}', 'warning')
+                    continue
+                collected = collect_parallel_tables(scraper, class_groups, should_stop, school=school['name'])
+                saved += save_parallel_tables(writer, collected, school=school['name'])
+
+            if should_stop():
+                break
+
+            if not saved:
+                failed.append({'school': school['name'], 'error': 'Нет данных'})
+                job.update(failed=failed)
+                continue
+            save_debug_workbook(scraper, writer)
+
+            # Сразу формируем итоговый файл школы, не дожидаясь остальных школ
+            success, processed_file = build_report(scraper, writer.sheets, school['name'], school['name'], files_dir)
+
+            if success and processed_file:
+                files.append(Path(processed_file).name)
+                job.update(files=files)
+                add_log('BATCH', f'Файл школы сохранен: {Path(processed_file).name}', 'success')
+            else:
+                failed.append({'school': school['name'], 'error': 'Ошибка при обработке данных'})
+                job.update(failed=failed)
+                add_log('BATCH', f'Ошибка при обработке данных школы {school["name"]}', 'error')
+
+        if should_stop():
+            job.update(message='Задание остановлено')
+            add_log('BATCH', 'Задание остановлено', 'warning')
+        else:
+            message = f'Обработано школ: {len(files)}, с ошибками: {len(failed)}'
+            job.update(progress=100, current_step='Завершено', message=message)
+            add_log('BATCH', message, 'success')
+
+    except Exception as e:
+        job.update(error=str(e))
+        add_log('BATCH', f'Ошибка пакетного задания {job.id}: {str(e)}', 'error')
+        import traceback
+        traceback.print_exc()
+    finally:
+        job.update(current_school=None)
+        release_browser(job)
+
+
+def job_status(job):
+    """Публичное представление задания для веб-интерфейса"""
+    if job is None:
+        return {
+            'job_id': None,
+            'status': None,
+            'running': False,
+            'progress': 0,
+            'current_step': None,
+            'message': 'Готов к запуску',
+            'error': None,
+            'waiting_for_school': False,
+            'waiting_for_class': False,
+            'schools': [],
+            'classes': [],
+            'auth_wait_time': None,
+            'files': []
+        }
+
+    state = job['state']
+    # Вычисляем время ожидания авторизации, если идет процесс авторизации
+    auth_wait_time = None
+    if state.get('auth_start_time') is not None:
+        auth_wait_time = int(time.time() - state['auth_start_time'])
+
+    status = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'running': job['status'] in ('queued', 'running'),
+        'progress': state.get('progress', 0),
+        'current_step': state.get('current_step'),
+        'message': state.get('message'),
+        'error': state.get('error'),
+        'waiting_for_school': state.get('waiting_for_school', False),
+        'waiting_for_class': state.get('waiting_for_class', False),
+        'schools': state.get('schools', []),
+        'classes': state.get('classes', []),
+        'auth_wait_time': auth_wait_time,  # Время ожидания авторизации в секундах
+        'files': state.get('files', []),
+        'created_at': datetime.fromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if job['kind'] == 'batch':
+        status.update({
+            'schools_filter': job['params'].get('schools'),
+            'grades_filter': job['params'].get('grades'),
+            'current_school': state.get('current_school'),
+            'total_schools': state.get('total_schools', 0),
+            'failed': state.get('failed', [])
+        })
+    return status
+
+
+def resolve_job(job_id=None):
+    """Задание по id из URL/запроса; по умолчанию - последнее интерактивное задание"""
+    if job_id is None:
+        data = request.get_json(silent=True) if request.method == 'POST' else None
+        job_id = request.args.get('job_id') or (data or {}).get('job_id')
+    if job_id:
+        return job_store.get_job(job_id)
+    return job_store.latest_job('interactive')
+
+
+def sse_message(event, data, event_id=None):
+    """Сообщение Server-Sent Events (id - seq последнего лога, для переподключения)"""
+    message = f'id: {event_id}\n' if event_id is not None else ''
+    return message + f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def job_events(job_id, after=None, stream_seconds=None):
+    """Поток событий задания: status - при изменении статуса, logs - только новые логи.
+
+    Без job_id отслеживается последнее интерактивное задание (как в /api/status/scraper).
+    Логи хранятся в общей БД заданий, поэтому поток работает на любом воркере gunicorn;
+    БД опрашивается на сервере, а браузеру уходят только изменения
+    """
+    stream_seconds = stream_seconds if stream_seconds is not None else config.EVENTS_STREAM_SECONDS
+    deadline = time.monotonic() + stream_seconds
+    last_status = None
+    last_sent = time.monotonic()
+    # Переподключение через 2 секунды после разрыва или окончания потока
+    yield 'retry: 2000\n\n'
+    while True:
+        job = job_store.get_job(job_id) if job_id else job_store.latest_job('interactive')
+        status = job_status(job)
+        if status != last_status:
+            last_status = status
+            last_sent = time.monotonic()
+            yield sse_message('status', status)
+
+        if after is None:
+            logs = job_store.get_logs(job['id'] if job else '', limit=100)
+        else:
+            logs = job_store.get_logs(job['id'] if job else '', after=after)
+        if logs:
+            after = logs[-1]['seq']
+            last_sent = time.monotonic()
+            yield sse_message('logs', {'logs': logs}, event_id=after)
+        elif after is None:
+            after = 0
+
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if now - last_sent >= 15:
+            # Комментарий не дает прокси закрыть простаивающее соединение
+            last_sent = now
+            yield ': ping\n\n'
+        time.sleep(config.EVENTS_POLL_INTERVAL)
+
+
+def stop_job(job):
+    """Остановка задания и закрытие браузера, если задание выполняется в этом процессе"""
+    job_store.request_stop(job['id'])
+    # Ожидание выбора школы/класса прерывается сразу
+    get_scheduler().notify(job['id'])
+    context = get_scheduler().get_context(job['id'])
+    if context and context.scraper:
         try:
-            scraper = scraper_state.get('scraper')
-            if scraper and scraper.driver:
-                scraper.driver.quit()
-        except Exception as e:
-            add_log('SCRAPER', f'Ошибка при закрытии браузера: {str(e)}', 'warning')
+            context.scraper.driver.quit()
+        except:
+            pass
+
+
+def start_job(kind, params):
+    """Постановка задания в очередь с учетными данными из запроса или сохраненными"""
+    data = request.get_json(silent=True) or {}
+    login = (data.get('login') or credentials.get('login') or '').strip()
+    password = (data.get('password') or credentials.get('password') or '').strip()
+
+    if not login or not password:
+        return jsonify({'error': 'Логин и пароль не указаны. Пожалуйста, введите учетные данные перед запуском.'}), 400
+
+    job_id = get_scheduler().submit(kind, params, secrets={'login': login, 'password': password})
+    return jsonify({'status': 'started', 'job_id': job_id}), 202
 
 
 @app.route('/')
@@ -544,72 +963,53 @@ def api_test():
 
 
 @app.route('/api/status/scraper')
-def api_status_scraper():
-    """Статус скрапера"""
-    # Вычисляем время ожидания авторизации, если идет процесс авторизации
-    auth_wait_time = None
-    if scraper_state['auth_start_time'] is not None:
-        elapsed = int(time.time() - scraper_state['auth_start_time'])
-        auth_wait_time = elapsed
-    
-    return jsonify({
-        'running': scraper_state['running'],
-        'progress': scraper_state['progress'],
-        'current_step': scraper_state['current_step'],
-        'message': scraper_state['message'],
-        'error': scraper_state['error'],
-        'waiting_for_school': scraper_state['waiting_for_school'],
-        'waiting_for_class': scraper_state['waiting_for_class'],
-        'schools': scraper_state['schools'],
-        'classes': scraper_state['classes'],
-        'auth_wait_time': auth_wait_time  # Время ожидания авторизации в секундах
-    })
+@app.route('/api/jobs/<job_id>/status')
+def api_status_scraper(job_id=None):
+    """Статус задания (по умолчанию - последнего интерактивного)"""
+    job = resolve_job(job_id)
+    if job_id and not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job_status(job))
 
 
 @app.route('/api/start/scraper', methods=['POST'])
 def api_start_scraper():
-    """Запуск скрапера"""
-    if scraper_state['running']:
-        return jsonify({'error': 'Скрапер уже запущен'}), 400
-    
-    # Запускаем в отдельном потоке
-    thread = threading.Thread(target=run_scraper, daemon=True)
-    thread.start()
-    scraper_state['thread'] = thread
-    
-    return jsonify({'status': 'started'})
+    """Запуск интерактивного задания"""
+    return start_job('interactive', {})
 
 
 @app.route('/api/stop/scraper', methods=['POST'])
-def api_stop_scraper():
-    """Остановка скрапера"""
-    scraper_state['running'] = False
-    scraper_state['waiting_for_school'] = False
-    scraper_state['waiting_for_class'] = False
+@app.route('/api/jobs/<job_id>/stop', methods=['POST'])
+def api_stop_scraper(job_id=None):
+    """Остановка задания"""
+    job = resolve_job(job_id)
+    if not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
     
-    # Закрываем браузер, если открыт
-    if scraper_state['scraper']:
-        try:
-            scraper_state['scraper'].driver.quit()
-        except:
-            pass
+    stop_job(job)
     
-    # Очищаем файлы сессии
-    cleanup_session_files()
+    # Очищаем файлы интерактивной сессии (файлы пакетных заданий сохраняются)
+    if job['kind'] == 'interactive':
+        run_after_job(job, 'cleanup_files', cleanup_session_files)
     
-    return jsonify({'status': 'stopped'})
+    return jsonify({'status': 'stopped', 'job_id': job['id']})
 
 
 @app.route('/api/select/school', methods=['POST'])
-def api_select_school():
+@app.route('/api/jobs/<job_id>/select/school', methods=['POST'])
+def api_select_school(job_id=None):
     """Выбор школы"""
+    job = resolve_job(job_id)
+    if not job or job['status'] != 'running':
+        return jsonify({'error': 'Задание не выполняется'}), 404
+    
     data = request.get_json()
     school_number = data.get('school_number')
     
     if not school_number:
         return jsonify({'error': 'Не указан номер школы'}), 400
     
-    schools = scraper_state['schools']
+    schools = job['state'].get('schools', [])
     selected_school = None
     for school in schools:
         if school['number'] == school_number:
@@ -619,24 +1019,30 @@ def api_select_school():
     if not selected_school:
         return jsonify({'error': 'Школа не найдена'}), 404
     
-    scraper_state['selected_school'] = selected_school
-    scraper_state['waiting_for_school'] = False
+    if not job_store.send_command(job['id'], 'select_school', selected_school, waiting_for='waiting_for_school'):
+        return jsonify({'error': 'Задание не ожидает выбора школы'}), 409
+    get_scheduler().notify(job['id'])
     
-    add_log('SYSTEM', f'Выбрана школа: {selected_school["name"]}', 'success')
+    job_store.add_log(job['id'], 'SYSTEM', f'Выбрана школа: {selected_school["name"]}', 'success')
     
     return jsonify({'status': 'ok', 'school': selected_school})
 
 
 @app.route('/api/select/class', methods=['POST'])
-def api_select_class():
+@app.route('/api/jobs/<job_id>/select/class', methods=['POST'])
+def api_select_class(job_id=None):
     """Выбор класса"""
+    job = resolve_job(job_id)
+    if not job or job['status'] != 'running':
+        return jsonify({'error': 'Задание не выполняется'}), 404
+    
     data = request.get_json()
     class_name = data.get('class_name')
     
     if not class_name:
         return jsonify({'error': 'Не указано имя класса'}), 400
     
-    classes = scraper_state['classes']
+    classes = job['state'].get('classes', [])
     selected_class = None
     for idx, cls in enumerate(classes):
         if cls['name'] == class_name:
@@ -646,50 +1052,92 @@ def api_select_class():
     if not selected_class:
         return jsonify({'error': 'Класс не найден'}), 404
     
-    scraper_state['selected_class'] = selected_class
-    scraper_state['waiting_for_class'] = False
+    if not job_store.send_command(job['id'], 'select_class', selected_class, waiting_for='waiting_for_class'):
+        return jsonify({'error': 'Задание не ожидает выбора класса'}), 409
+    get_scheduler().notify(job['id'])
     
-    add_log('SYSTEM', f'Выбран класс: {selected_class["name"]}', 'success')
+    job_store.add_log(job['id'], 'SYSTEM', f'Выбран класс: {selected_class["name"]}', 'success')
     
     return jsonify({'status': 'ok', 'class_name': selected_class['name']})
 
 
 @app.route('/api/files')
-def api_files():
-    """Список файлов"""
+@app.route('/api/jobs/<job_id>/files')
+def api_files(job_id=None):
+    """Список файлов задания"""
+    job = resolve_job(job_id)
     files = []
     
-    # Ищем все .xlsx файлы в директории
-    for file_path in FILES_DIR.glob('*.xlsx'):
-        if file_path.is_file():
-            stat = file_path.stat()
-            files.append({
-                'name': file_path.name,
-                'size': stat.st_size,
-                'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-            })
+    # Ищем все .xlsx файлы в папке задания
+    files_dir = job_files_dir(job['id']) if job else None
+    if files_dir and files_dir.exists():
+        for file_path in files_dir.glob('*.xlsx'):
+            if file_path.is_file():
+                stat = file_path.stat()
+                files.append({
+                    'name': file_path.name,
+                    'size': stat.st_size,
+                    'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                    'url': f"/api/jobs/{job['id']}/download/{file_path.name}"
+                })
     
     # Сортируем по дате изменения (новые первыми)
     files.sort(key=lambda x: x['modified'], reverse=True)
     
-    return jsonify({'files': files})
+    return jsonify({'files': files, 'job_id': job['id'] if job else None})
 
 
 @app.route('/api/download/<filename>')
-def api_download(filename):
-    """Скачивание файла"""
-    file_path = FILES_DIR / filename
+@app.route('/api/jobs/<job_id>/download/<filename>')
+def api_download(filename, job_id=None):
+    """Скачивание файла задания"""
+    job = resolve_job(job_id)
+    if not job:
+        return jsonify({'error': 'Файл не найден'}), 404
     
+    file_path = job_files_dir(job['id']) / filename
     if not file_path.exists() or not file_path.is_file():
         return jsonify({'error': 'Файл не найден'}), 404
     
-    return send_file(str(file_path), as_attachment=True)
+    return send_from_directory(str(job_files_dir(job['id'])), filename, as_attachment=True)
 
 
 @app.route('/api/logs')
-def api_logs():
-    """Получение логов"""
-    return jsonify({'logs': scraper_state['logs']})
+@app.route('/api/jobs/<job_id>/logs')
+def api_logs(job_id=None):
+    """Получение логов задания (вместе с системными).
+    ?after=<seq> - только записи новее указанной (seq последней записи - в last_seq)
+    """
+    job = resolve_job(job_id)
+    after = request.args.get('after')
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        return jsonify({'error': 'Некорректный seq'}), 400
+
+    logs = job_store.get_logs(job['id'] if job else '', after=after)
+    last_seq = logs[-1]['seq'] if logs else after
+    return jsonify({'logs': logs, 'last_seq': last_seq})
+
+
+@app.route('/api/events')
+@app.route('/api/jobs/<job_id>/events')
+def api_events(job_id=None):
+    """Поток Server-Sent Events со статусом и новыми логами задания (вместо опроса
+    /api/status/scraper и /api/logs). ?after= или заголовок Last-Event-ID - seq последнего
+    полученного лога
+    """
+    job_id = job_id or request.args.get('job_id')
+    if job_id and not job_store.get_job(job_id):
+        return jsonify({'error': 'Задание не найдено'}), 404
+    after = request.args.get('after') or request.headers.get('Last-Event-ID')
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        return jsonify({'error': 'Некорректный seq'}), 400
+
+    return Response(job_events(job_id, after), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/api/credentials', methods=['POST'])
@@ -702,8 +1150,8 @@ def api_save_credentials():
     if not login or not password:
         return jsonify({'error': 'Логин и пароль обязательны'}), 400
     
-    scraper_state['login'] = login
-    scraper_state['password'] = password
+    credentials['login'] = login
+    credentials['password'] = password
     
     add_log('SYSTEM', 'Учетные данные сохранены', 'success')
     
@@ -713,44 +1161,156 @@ def api_save_credentials():
 @app.route('/api/credentials', methods=['GET'])
 def api_get_credentials_status():
     """Проверка наличия учетных данных (без возврата самих данных)"""
-    has_credentials = bool(scraper_state.get('login') and scraper_state.get('password'))
+    has_credentials = bool(credentials.get('login') and credentials.get('password'))
     return jsonify({'has_credentials': has_credentials})
 
 
 @app.route('/api/reset', methods=['POST'])
 def api_reset():
-    """Сброс состояния"""
-    scraper_state['running'] = False
-    scraper_state['progress'] = 0
-    scraper_state['current_step'] = None
-    scraper_state['message'] = 'Готов к запуску'
-    scraper_state['error'] = None
-    scraper_state['waiting_for_school'] = False
-    scraper_state['waiting_for_class'] = False
-    scraper_state['schools'] = []
-    scraper_state['classes'] = []
-    scraper_state['selected_school'] = None
-    scraper_state['selected_class'] = None
-    scraper_state['logs'] = []
-    scraper_state['auth_start_time'] = None
+    """Сброс задания: остановка, удаление файлов и логов"""
     # НЕ сбрасываем логин и пароль при сбросе состояния
-    
-    # Закрываем браузер, если открыт
-    if scraper_state['scraper']:
-        try:
-            scraper_state['scraper'].driver.quit()
-        except:
-            pass
-    scraper_state['scraper'] = None
-    
-    # Очищаем файлы сессии
-    cleanup_session_files()
+    job = resolve_job()
+    if job:
+        if job['status'] in ('queued', 'running'):
+            stop_job(job)
+        
+        # Очищаем файлы и логи сессии (у выполняющегося задания - после его остановки)
+        run_after_job(job, 'reset', reset_job_data)
     
     add_log('SYSTEM', 'Состояние сброшено', 'info')
     
     return jsonify({'status': 'reset'})
 
 
+@app.route('/api/jobs', methods=['POST'])
+def api_create_job():
+    """Создание пакетного задания: {"schools": "all" | [...], "grades": "all" | [...]}"""
+    data = request.get_json(silent=True) or {}
+    schools = data.get('schools', 'all')
+    grades = data.get('grades', 'all')
+    for value in (schools, grades):
+        if value != 'all' and not (isinstance(value, list) and value):
+            return jsonify({'error': 'schools и grades должны быть "all" или непустым списком'}), 400
+
+    return start_job('batch', {'schools': schools, 'grades': grades})
+
+
+@app.route('/api/jobs')
+def api_list_jobs():
+    """Список заданий всех воркеров"""
+    return jsonify({'jobs': [job_status(job) for job in job_store.list_jobs()]})
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """Статус задания"""
+    job = job_store.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job_status(job))
+
+
+@app.route('/api/grades/snapshots')
+def api_grades_snapshots():
+    """Последние сохраненные таблицы классов (?school= - только одна школа)"""
+    grades_store = get_grades_store()
+    if grades_store is None:
+        return jsonify({'error': 'Хранилище оценок отключено (GRADES_DB)'}), 404
+    return jsonify({'snapshots': grades_store.snapshots(request.args.get('school'))})
+
+
+@app.route('/api/grades/summary')
+def api_grades_summary():
+    """Качество и успеваемость по сохраненным оценкам без повторного скрапинга.
+
+    ?group_by=class,subject,quarter (school, class, student, subject, quarter);
+    фильтры - те же поля: ?school=...&class=...&quarter=II
+    """
+    grades_store = get_grades_store()
+    if grades_store is None:
+        return jsonify({'error': 'Хранилище оценок отключено (GRADES_DB)'}), 404
+
+    group_by = [field.strip() for field in request.args.get('group_by', 'class,subject,quarter').split(',')
+                if field.strip()]
+    filters = {field: request.args[field] for field in SUMMARY_FIELDS if request.args.get(field)}
+    try:
+        rows = grades_store.summary(group_by, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'group_by': group_by, 'filters': filters, 'rows': rows})
+
+
+@app.route('/api/runs/<job_id>/timings')
+def api_run_timings(job_id):
+    """Спаны шагов задания (начало, конец, длительность, класс, повторы) и сводка по шагам"""
+    job = job_store.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
+
+    spans = job_store.get_spans(job_id)
+    # Спаны выполняющегося в этом процессе задания, еще не сохраненные в хранилище
+    context = get_scheduler().get_context(job_id)
+    scraper = context.scraper if context else None
+    if scraper is not None:
+        spans += [dict(span) for span in scraper.timings[scraper.spans_taken:]]
+    spans.sort(key=lambda span: span['start'])
+
+    started_at = job['started_at']
+    finished_at = job['finished_at']
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'duration': round(finished_at - started_at, 3) if started_at and finished_at else None,
+        'spans': [round_floats(span) for span in spans],
+        'summary': [round_floats(item) for item in summarize_spans(spans)]
+    })
+
+
+def prometheus_labels(**labels):
+    """Метки метрики Prometheus: {key="value",...} с экранированием значений"""
+    values = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        values.append(f'{key}="{value}"')
+    return '{' + ','.join(values) + '}'
+
+
+@app.route('/metrics')
+def metrics():
+    """Метрики в текстовом формате Prometheus: накопительные гистограммы длительности шагов
+    (не уменьшаются при удалении старых спанов) и число заданий по статусам
+    """
+    lines = [
+        '# HELP edus2_step_duration_seconds Длительность шагов скрапинга и обработки',
+        '# TYPE edus2_step_duration_seconds histogram'
+    ]
+    histograms = job_store.step_histograms()
+    bounds = {float(bound) for bound in config.METRICS_BUCKETS}
+    for step, histogram in histograms.items():
+        # Только текущие границы: накопленные по прежней настройке METRICS_BUCKETS не выводятся
+        for bound, count in histogram['buckets']:
+            if bound not in bounds:
+                continue
+            lines.append(f"edus2_step_duration_seconds_bucket{prometheus_labels(step=step, le=f'{bound:g}')} {count}")
+        lines.append(f"edus2_step_duration_seconds_bucket{prometheus_labels(step=step, le='+Inf')} "
+                     f"{histogram['count']}")
+        lines.append(f"edus2_step_duration_seconds_sum{prometheus_labels(step=step)} {histogram['sum']:.6f}")
+        lines.append(f"edus2_step_duration_seconds_count{prometheus_labels(step=step)} {histogram['count']}")
+
+    lines += ['# HELP edus2_step_retries_total Повторы шагов (например, загрузка класса браузером после HTTP)',
+              '# TYPE edus2_step_retries_total counter']
+    for step, histogram in histograms.items():
+        lines.append(f"edus2_step_retries_total{prometheus_labels(step=step)} {histogram['retries']}")
+
+    lines += ['# HELP edus2_jobs Задания по типу и статусу', '# TYPE edus2_jobs gauge']
+    for (kind, status), count in sorted(job_store.job_counts().items()):
+        lines.append(f"edus2_jobs{prometheus_labels(kind=kind, status=status)} {count}")
+
+    return Response('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print("="*70)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк разбора оценок и четвертей: кэшированные parse_grade/parse_cell_grades
+и normalize_quarter против прежней реализации (pd.isna + re.sub на каждое значение,
+словарь четвертей создается при каждом вызове).
+
+Нагрузка - все ячейки и заголовки четвертей школы синтетических классов.
+Запуск из корня репозитория:
+    python benchmarks/bench_grade_parser.py [--classes 40] [--repeat 5]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import make_tables  # noqa: E402
+from grade_stats import parse_cell_grades  # noqa: E402
+from process_quarters_final import normalize_quarter  # noqa: E402
+
+
+def legacy_parse_grade(value):
+    """parse_grade до кэширования"""
+    if pd.isna(value) or value == '' or value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return int(value) if value == int(value) and 1 <= int(value) <= 5 else None
+        value_str = re.sub(r'[^\d]', '', str(value).strip())
+        if value_str:
+            grade = int(value_str)
+            if 1 <= grade <= 5:
+                return grade
+    except:
+        pass
+    return None
+
+
+def legacy_parse_cell_grades(value):
+    """Разбор ячейки так, как это делал create_quarter_table"""
+    grades = []
+    if value:
+        for part in str(value).split(','):
+            grade = legacy_parse_grade(part.strip())
+            if grade:
+                grades.append(grade)
+    return tuple(grades)
+
+
+def legacy_normalize_quarter(quarter):
+    """normalize_quarter до кэширования"""
+    if not quarter:
+        return None
+    q = str(quarter).strip()
+    mapping = {
+        'і': 'I', '1': 'I', 'i': 'I',
+        'іі': 'II', '2': 'II', 'ii': 'II',
+        'ііі': 'III', '3': 'III', 'iii': 'III',
+        'іv': 'IV', 'iv': 'IV', '4': 'IV',
+        'ж': 'Ж', '5': 'Ж', 'год': 'Ж', 'годовая': 'Ж'
+    }
+    if q in ['I', 'II', 'III', 'IV', 'Ж', 'І', 'ІІ', 'ІІІ', 'ІV']:
+        if q in ['І', 'I', 'i', 'і']:
+            return 'I'
+        elif q in ['ІІ', 'II', 'ii', 'іі']:
+            return 'II'
+        elif q in ['ІІІ', 'III', 'iii', 'ііі']:
+            return 'III'
+        elif q in ['ІV', 'IV', 'iv', 'іv']:
+            return 'IV'
+        elif q == 'Ж':
+            return 'Ж'
+    if q.lower() in mapping:
+        return mapping[q.lower()]
+    return q
+
+
+def school_workload(classes, subjects, students):
+    """Значения ячеек и заголовки четвертей всех классов школы"""
+    cells, quarters = [], []
+    for table in make_tables(classes=classes, subjects=subjects, students=students, absent_ratio=0.03).values():
+        for row in table['data']:
+            cells.extend(row[2:])
+        quarters.extend(table['headers']['second_row'])
+    # Объединенные значения подгрупп и варианты записи четвертей
+    cells.extend(['5, 4', '4, 3', '3, 2'] * (len(cells) // 100))
+    quarters.extend(['І', 'ІІ', 'ІІІ', 'ІV', 'ж', '1', 'годовая'] * (len(quarters) // 100))
+    return cells, quarters
+
+
+def best_of(func, values, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in values:
+            func(value)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=40)
+    parser.add_argument('--subjects', type=int, default=22)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    cells, quarters = school_workload(args.classes, args.subjects, args.students)
+    print(f"Ячеек: {len(cells)}, заголовков четвертей: {len(quarters)}")
+
+    # Результаты должны совпадать с прежней реализацией
+    for value in cells:
+        assert parse_cell_grades(value) == legacy_parse_cell_grades(value), value
+    for value in quarters:
+        assert normalize_quarter(value) == legacy_normalize_quarter(value), value
+
+    print(f"{'функция':<22} {'прежняя, с':>11} {'кэш, с':>9} {'ускорение':>10}")
+    for name, legacy, current, values in [
+        ('parse_cell_grades', legacy_parse_cell_grades, parse_cell_grades, cells),
+        ('normalize_quarter', legacy_normalize_quarter, normalize_quarter, quarters),
+    ]:
+        before = best_of(legacy, values, args.repeat)
+        after = best_of(current, values, args.repeat)
+        print(f"{name:<22} {before:>11.3f} {after:>9.3f} {before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк process_success_data для школы из N классов при разном числе процессов
+(PROCESS_WORKERS): разбор таблиц и статистика идут в пуле, книга собирается в родителе.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_process_workers.py [--classes 30] [--workers 1 2 4]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_tables  # noqa: E402
+from process_quarters_final import process_success_data  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=30)
+    parser.add_argument('--subjects', type=int, default=22)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    tables = make_tables(classes=args.classes, subjects=args.subjects, students=args.students)
+    print(f"Классов: {args.classes}, ядер: {os.cpu_count()}")
+    print(f"{'процессов':>9} {'время, с':>9} {'ускорение':>10}")
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                success, _ = process_success_data(None, f'report_{workers}.xlsx', output_dir=tmp,
+                                                  tables=tables, workers=workers)
+            elapsed = time.perf_counter() - start
+            assert success
+            baseline = baseline or elapsed
+            print(f"{workers:>9} {elapsed:>9.2f} {baseline / elapsed:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
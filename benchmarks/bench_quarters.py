@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Набор микробенчмарков обработки по четвертям (process_quarters_final) на синтетической
+школе: время каждого этапа (лучшее из --repeat) и пиковая память (tracemalloc).
+
+Этапы: чтение листов read_data_with_two_level_headers, разбор таблиц из памяти
+read_data_from_table, merge_duplicate_columns, подсчет статистики, create_quarter_table
+для всех четвертей, сохранение книги и process_success_data целиком (из файла и из памяти).
+
+С --baseline результаты сравниваются с сохраненными ранее (--save-baseline) на той же
+машине: если этап медленнее или требует больше памяти, чем базовый, более чем на
+--threshold (по умолчанию 20%), скрипт завершается с кодом 1.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_quarters.py [--classes 10] [--save-baseline benchmarks/baseline.json]
+    python benchmarks/bench_quarters.py --baseline benchmarks/baseline.json [--threshold 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook  # noqa: E402
+
+from benchmarks.synthetic import make_tables, write_success_workbook  # noqa: E402
+from process_quarters_final import (  # noqa: E402
+    QUARTERS_ORDER, build_grade_stats, create_quarter_table, merge_duplicate_columns, normalize_quarter,
+    process_success_data, read_data_from_table, read_data_with_two_level_headers, register_report_styles
+)
+
+# Время этапов короче этого порога слишком зависит от шума и не проверяется
+MIN_CHECKED_SECONDS = 0.005
+
+
+def measure(func, repeat):
+    """Лучшее время из repeat вызовов и пиковая память отдельного вызова под tracemalloc"""
+    best = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak
+
+
+def build_stages(tables, success_file, output_dir):
+    """Этапы [(имя, функция)]; входные данные каждого этапа готовятся заранее"""
+    sheet_names = list(tables)
+    frames = [read_data_from_table(table_data)[0] for table_data in tables.values()]
+    merged = [merge_duplicate_columns(df) for df in frames]
+    stats = [build_grade_stats(merged_data) for merged_data in merged]
+    fio = [df.iloc[:, 1].tolist() for df in frames]
+    quarters = [normalize_quarter(quarter) for quarter in QUARTERS_ORDER]
+
+    def read_sheets():
+        for name in sheet_names:
+            read_data_with_two_level_headers(success_file, name)
+
+    def read_tables():
+        for table_data in tables.values():
+            read_data_from_table(table_data)
+
+    def merge_columns():
+        for df in frames:
+            merge_duplicate_columns(df)
+
+    def grade_stats():
+        for merged_data in merged:
+            build_grade_stats(merged_data)
+
+    def render(save=False):
+        wb = Workbook()
+        wb.remove(wb.active)
+        register_report_styles(wb)
+        for idx, name in enumerate(sheet_names):
+            ws = wb.create_sheet(title=name)
+            row = 1
+            for quarter in quarters:
+                row = create_quarter_table(ws, row, quarter, merged[idx], fio[idx], stats[idx])
+        if save:
+            wb.save(os.path.join(output_dir, 'stage_save.xlsx'))
+
+    def process_file():
+        success, _ = process_success_data(success_file, 'report_file.xlsx', output_dir=output_dir)
+        assert success
+
+    def process_tables():
+        success, _ = process_success_data(None, 'report_tables.xlsx', output_dir=output_dir, tables=tables)
+        assert success
+
+    return [
+        ('read_data_with_two_level_headers', read_sheets),
+        ('read_data_from_table', read_tables),
+        ('merge_duplicate_columns', merge_columns),
+        ('build_grade_stats', grade_stats),
+        ('create_quarter_table', render),
+        ('create_quarter_table+save', lambda: render(save=True)),
+        ('process_success_data (файл)', process_file),
+        ('process_success_data (память)', process_tables),
+    ]
+
+
+def compare(results, baseline, threshold):
+    """Этапы, которые медленнее или тяжелее базовых более чем на threshold"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['seconds'] >= MIN_CHECKED_SECONDS and result['seconds'] > base['seconds'] * (1 + threshold):
+            regressions.append(f"{name}: время {base['seconds']:.3f} -> {result['seconds']:.3f} с")
+        if base['peak'] and result['peak'] > base['peak'] * (1 + threshold):
+            regressions.append(f"{name}: память {base['peak'] / 2 ** 20:.1f} -> {result['peak'] / 2 ** 20:.1f} МБ")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--subjects', type=int, default=22)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--subgroups', type=int, default=2)
+    parser.add_argument('--empty-ratio', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help='JSON с базовыми результатами для проверки регрессий')
+    parser.add_argument('--save-baseline', help='сохранить результаты как базовые')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимое ухудшение (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    params = {'classes': args.classes, 'subjects': args.subjects, 'students': args.students,
+              'subgroups': args.subgroups, 'empty_ratio': args.empty_ratio}
+    tables = make_tables(classes=args.classes, subjects=args.subjects, students=args.students,
+                         subgroups=args.subgroups, empty_ratio=args.empty_ratio)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        success_file = os.path.join(tmp, 'success_data.xlsx')
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_success_workbook(success_file, tables)
+            # Прогрев: импорты и кэши разбора не должны попадать в первый замер
+            process_success_data(None, 'warmup.xlsx', output_dir=tmp, tables=tables)
+            stages = build_stages(tables, success_file, tmp)
+
+        print(f"Классов: {args.classes}, предметов: {args.subjects} (+{args.subgroups} подгрупп), "
+              f"учеников: {args.students}, повторов: {args.repeat}")
+        print(f"{'этап':<34} {'время, с':>9} {'пик, МБ':>8}")
+        for name, func in stages:
+            seconds, peak = measure(func, args.repeat)
+            results[name] = {'seconds': seconds, 'peak': peak}
+            print(f"{name:<34} {seconds:>9.3f} {peak / 2 ** 20:>8.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"✓ Базовые результаты сохранены: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print(f"⚠ Базовые результаты получены с другими параметрами: {baseline.get('params')}")
+        regressions = compare(results, baseline.get('results', {}), args.threshold)
+        if regressions:
+            print(f"✗ Регрессия больше {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✓ Регрессий больше {args.threshold:.0%} нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк оформления отчетов Excel: время, пиковая память (tracemalloc)
+и размер таблицы стилей сохраненного файла для параллели из N классов.
+
+Измеряются оба отчета: success_data.xlsx через save_to_excel (лист за листом)
+и итоговый отчет по четвертям process_success_data.
+Запуск из корня репозитория:
+    python benchmarks/bench_report_styles.py [--classes 10]
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_tables  # noqa: E402
+from mektep_scraper import MektepScraper  # noqa: E402
+from process_quarters_final import process_success_data  # noqa: E402
+
+
+def style_table(path):
+    """Число записей cellXfs, шрифтов, заливок и границ в xl/styles.xml"""
+    with zipfile.ZipFile(path) as archive:
+        styles = archive.read('xl/styles.xml').decode('utf-8')
+    counts = {}
+    for tag in ('cellXfs', 'fonts', 'fills', 'borders'):
+        match = re.search(rf'<{tag} count="(\d+)"', styles)
+        counts[tag] = int(match.group(1)) if match else 0
+    return counts
+
+
+def measure(func):
+    """Время вызова и пиковая память отдельного вызова под tracemalloc
+    (трассировка сильно замедляет выполнение, поэтому время меряется без нее)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--subjects', type=int, default=22)
+    parser.add_argument('--students', type=int, default=30)
+    args = parser.parse_args()
+
+    tables = make_tables(classes=args.classes, subjects=args.subjects, students=args.students)
+    scraper = MektepScraper(login='bench', password='bench')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        success_file = os.path.join(tmp, 'success_data.xlsx')
+
+        def save_success():
+            if os.path.exists(success_file):
+                os.remove(success_file)
+            for name, table_data in tables.items():
+                scraper.save_to_excel(table_data, name, success_file)
+
+        def process():
+            process_success_data(None, 'report.xlsx', output_dir=tmp, tables=tables)
+
+        print(f"Классов: {args.classes}, предметов: {args.subjects}, учеников: {args.students}")
+        print(f"{'отчет':<16} {'время, с':>9} {'пик, МБ':>8} {'размер, КБ':>11}  стили")
+        for name, func, path in [
+            ('save_to_excel', save_success, success_file),
+            ('по четвертям', process, os.path.join(tmp, 'report.xlsx')),
+        ]:
+            elapsed, peak = measure(func)
+            size = os.path.getsize(path) / 1024
+            styles = ', '.join(f'{tag}={count}' for tag, count in style_table(path).items())
+            print(f"{name:<16} {elapsed:>9.2f} {peak / 2 ** 20:>8.1f} {size:>11.1f}  {styles}")
+
+
+if __name__ == '__main__':
+    main()
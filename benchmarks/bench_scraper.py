@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Сквозной бенчмарк MektepScraper на локальном макете mektep.edu.kz (benchmarks/mock_mektep.py).
+
+Проходит весь путь интерактивного задания без настоящего сайта и учетных данных:
+запуск Chrome, вход, список школ, страница школы, вкладка параллели, таблица классов,
+извлечение таблиц "Сапа" (браузером или HTTP-движком), запись success_data.xlsx и
+обработка по четвертям. Выводит время по шагам (отчет timing_report скрапера).
+Нужны Chrome и chromedriver, как для обычного запуска.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_scraper.py [--engine browser|http] [--latency 0.2] [--modal-latency 0.5]
+    python benchmarks/bench_scraper.py --base-url http://127.0.0.1:8765  # уже запущенный макет
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('HEADLESS', 'true')
+
+import config  # noqa: E402
+from benchmarks.mock_mektep import MockMektepServer, add_site_arguments, site_from_args  # noqa: E402
+from mektep_scraper import MektepScraper, SuccessDataWriter  # noqa: E402
+from process_quarters_final import process_success_data  # noqa: E402
+from sapa_http import SapaHttpClient, build_class_requests  # noqa: E402
+
+
+def collect_browser(scraper, class_groups):
+    """Таблицы классов кликом по кнопке "Успеваемость" и чтением модального окна"""
+    tables = {}
+    for group in class_groups:
+        with scraper.timed('class:extract'):
+            scraper.driver.execute_script("arguments[0].click();", group['button'])
+            table_data = scraper.extract_modal_table_data()
+            scraper.close_modal()
+            scraper.wait_modal_closed()
+        if table_data:
+            tables[group['name']] = table_data
+    return tables
+
+
+def collect_http(scraper, class_groups, concurrency):
+    """Таблицы классов HTTP-движком: один перехваченный запрос, остальные строятся по образцу"""
+    with scraper.timed('capture_sapa_request'):
+        template = scraper.capture_sapa_request(class_groups[0]['button'])
+    requests_list = build_class_requests(template, class_groups[0], class_groups)
+    client = SapaHttpClient.from_scraper(scraper)
+    try:
+        with scraper.timed('http:fetch_many'):
+            results = client.fetch_many(requests_list, max_workers=concurrency, rate=0)
+    finally:
+        client.close()
+    return {group['name']: table_data for group, (table_data, _) in zip(class_groups, results) if table_data}
+
+
+def run(args, base_url, output_dir):
+    """Один проход скрапера; возвращает отчет по шагам и число извлеченных классов"""
+    scraper = MektepScraper(args.login, args.password, site_url=base_url)
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log if not args.verbose else sys.stdout):
+            scraper.setup_driver()
+            if not scraper.login():
+                raise RuntimeError('не удалось войти на макет')
+            if not scraper.navigate_to_reports() or not scraper.select_school(school_index=1):
+                raise RuntimeError('не удалось открыть страницу школы')
+
+            classes = scraper.get_classes_list()
+            tables = {}
+            for cls in classes[:args.tabs]:
+                if not scraper.select_class_tab(cls['number']):
+                    continue
+                class_groups = scraper.get_class_groups_from_table()
+                if not class_groups:
+                    continue
+                if args.engine == 'http':
+                    tables.update(collect_http(scraper, class_groups, args.concurrency))
+                else:
+                    tables.update(collect_browser(scraper, class_groups))
+
+            writer = SuccessDataWriter(os.path.join(output_dir, 'success_data.xlsx'))
+            for name, table_data in tables.items():
+                writer.add(table_data, name)
+            with scraper.timed('save_excel'):
+                writer.save()
+            with scraper.timed('process_success_data'):
+                success, _ = process_success_data(None, 'report.xlsx', output_dir=output_dir, tables=tables)
+            if not success:
+                raise RuntimeError('обработка по четвертям не удалась')
+    except Exception:
+        if not args.verbose:
+            sys.stderr.write(log.getvalue())
+        raise
+    finally:
+        if scraper.driver:
+            scraper.driver.quit()
+    return scraper.timing_report(), len(tables)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='адрес уже запущенного макета (по умолчанию запускается свой)')
+    parser.add_argument('--engine', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--tabs', type=int, default=1, help='сколько вкладок параллелей обходить')
+    parser.add_argument('--concurrency', type=int, default=config.SCRAPER_CONCURRENCY)
+    parser.add_argument('--login', default='bench')
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--json', help='сохранить отчет по шагам в JSON')
+    parser.add_argument('--verbose', action='store_true', help='выводить лог скрапера')
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    # Сохраненная сессия пропустила бы вход - замеряем полный путь
+    config.SESSION_STORE_DIR = ''
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.base_url
+        if not base_url:
+            base_url = stack.enter_context(MockMektepServer(site_from_args(args))).base_url
+        output_dir = stack.enter_context(tempfile.TemporaryDirectory())
+
+        start = time.perf_counter()
+        report, classes = run(args, base_url, output_dir)
+        elapsed = time.perf_counter() - start
+
+    print(f"Макет: {base_url}, движок: {args.engine}, классов: {classes}, всего {elapsed:.2f} с")
+    print(f"{'шаг':<32} {'раз':>4} {'всего, с':>9} {'среднее':>8} {'макс':>7}")
+    for item in report:
+        print(f"{item['step']:<32} {item['count']:>4} {item['total']:>9.2f} {item['avg']:>8.2f} {item['max']:>7.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'engine': args.engine, 'classes': classes, 'total': elapsed, 'steps': report},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
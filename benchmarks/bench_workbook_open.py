@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк чтения success_data.xlsx в process_success_data: книга разбирается
+один раз против прежней схемы (список листов + отдельный load_workbook на каждый лист).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_workbook_open.py [--sheets 1 2 4 8 16] [--repeat 3]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import load_workbook  # noqa: E402
+
+from benchmarks.synthetic import make_tables, write_success_workbook  # noqa: E402
+from process_quarters_final import read_data_from_worksheet, read_data_with_two_level_headers  # noqa: E402
+
+
+def read_per_sheet(path):
+    """Прежняя схема: книга открывается для списка листов и затем заново для каждого листа"""
+    wb = load_workbook(path)
+    sheet_names = wb.sheetnames
+    wb.close()
+    return [read_data_with_two_level_headers(path, name) for name in sheet_names]
+
+
+def read_once(path):
+    """Текущая схема: книга открывается один раз"""
+    wb = load_workbook(path, data_only=True)
+    try:
+        return [read_data_from_worksheet(wb[name]) for name in wb.sheetnames]
+    finally:
+        wb.close()
+
+
+def best_of(func, path, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sheets', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--subjects', type=int, default=20)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'листов':>7} {'по листу, с':>12} {'один раз, с':>12} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for sheets in args.sheets:
+            path = os.path.join(tmp, f'success_{sheets}.xlsx')
+            tables = make_tables(classes=sheets, subjects=args.subjects, students=args.students)
+            with contextlib.redirect_stdout(io.StringIO()):
+                write_success_workbook(path, tables)
+
+            # Результаты обеих схем должны совпадать
+            for (df_old, map_old), (df_new, map_new) in zip(read_per_sheet(path), read_once(path)):
+                assert df_old.equals(df_new) and map_old == map_new
+
+            per_sheet = best_of(read_per_sheet, path, args.repeat)
+            once = best_of(read_once, path, args.repeat)
+            print(f"{sheets:>7} {per_sheet:>12.3f} {once:>12.3f} {per_sheet / once:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный макет mektep.edu.kz/_monitor/ для бенчмарков скрапера.
+
+Отдает те же элементы, на которые опирается MektepScraper: форму входа index.php,
+таблицу школ pg_reports.php, страницу школы с вкладками параллелей (#pills-tab),
+таблицу классов с кнопками "Успеваемость" и модальное окно #classSapa, таблица
+которого загружается AJAX-запросом (его же повторяет HTTP-движок). Таблицы "Сапа"
+строятся генератором benchmarks/synthetic.py, задержки ответов настраиваются.
+
+Запуск отдельно (скрапер - с MEKTEP_BASE_URL=http://127.0.0.1:8765):
+    python benchmarks/mock_mektep.py [--port 8765] [--latency 0.2] [--modal-latency 0.5]
+"""
+import argparse
+import html
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, abort, make_response, redirect, request  # noqa: E402
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+from benchmarks.synthetic import make_table  # noqa: E402
+
+# Четверти во второй строке заголовка, как на сайте
+SITE_QUARTERS = ['І', 'ІІ', 'ІІІ', 'ІV', 'Ж']
+LETTERS = 'АБВГДЕЖЗИКЛМН'
+SESSION_COOKIE = 'MOCKSESSID'
+
+# Минимальная замена jQuery: скрапер ждет jQuery.active === 0 после AJAX-запросов
+PAGE_SCRIPT = """
+window.jQuery = {active: 0};
+function mockLoad(method, url, body, target, onload) {
+    jQuery.active++;
+    var xhr = new XMLHttpRequest();
+    xhr.open(method, url);
+    if (body) xhr.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded; charset=UTF-8');
+    xhr.onloadend = function() {
+        target.innerHTML = xhr.responseText;
+        if (onload) onload();
+        jQuery.active--;
+    };
+    xhr.send(body);
+}
+function showGrade(link, grade, school) {
+    var tabs = document.querySelectorAll('#pills-tab a');
+    for (var i = 0; i < tabs.length; i++) tabs[i].classList.remove('active');
+    link.classList.add('active');
+    var view = document.getElementById('classes_view');
+    view.innerHTML = '';
+    mockLoad('GET', 'ajax/classes.php?id_mektep=' + school + '&grade=' + grade, null, view);
+    return false;
+}
+function showSapa(classId, school) {
+    var modal = document.getElementById('classSapa');
+    var body = modal.querySelector('.modal-body');
+    body.innerHTML = '';
+    modal.style.display = 'block';
+    modal.classList.add('show');
+    var backdrop = document.createElement('div');
+    backdrop.className = 'modal-backdrop fade show';
+    document.body.appendChild(backdrop);
+    mockLoad('POST', 'ajax/sapa.php', 'id_class=' + classId + '&id_mektep=' + school, body);
+}
+function closeSapa() {
+    var modal = document.getElementById('classSapa');
+    modal.classList.remove('show');
+    modal.style.display = 'none';
+    var backdrops = document.querySelectorAll('.modal-backdrop');
+    for (var i = 0; i < backdrops.length; i++) backdrops[i].remove();
+}
+"""
+
+
+def page(title, body):
+    """HTML-страница макета"""
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f'<script>{PAGE_SCRIPT}</script></head><body>{body}</body></html>')
+
+
+def sapa_table_html(table_data):
+    """HTML таблицы "Сапа" в разметке сайта (двухуровневый thead и служебные строки в конце tbody)"""
+    headers = table_data['headers']
+    subjects = headers['first_row']
+    parts = ['<table class="table table-hover table-responsive table-bordered"><thead><tr>',
+             '<th rowspan="2"></th><th rowspan="2">Аты-жөні</th>']
+    parts.extend(f'<th colspan="{len(SITE_QUARTERS)}">{html.escape(subject["text"])}</th>' for subject in subjects)
+    parts.append('</tr><tr>')
+    parts.extend(f'<th>{quarter}</th>' for _ in subjects for quarter in SITE_QUARTERS)
+    parts.append('</tr></thead><tbody>')
+    for row in table_data['data']:
+        parts.append('<tr>' + ''.join(f'<td>{html.escape(value)}</td>' for value in row) + '</tr>')
+    # Итоговые строки сайта, которые скрапер пропускает
+    columns = 2 + len(subjects) * len(SITE_QUARTERS)
+    for grade, badge in (('5', 'success'), ('4', 'info'), ('3', 'warning'), ('2', 'danger')):
+        parts.append(f'<tr class="badge-{badge}"><td><b>{grade}</b></td>' + '<td>0</td>' * (columns - 1) + '</tr>')
+    for label in ('үлгерімі', 'сапасы'):
+        parts.append(f'<tr><td>{label}</td>' + '<td>0%</td>' * (columns - 1) + '</tr>')
+    parts.append('</tbody></table>')
+    return ''.join(parts)
+
+
+class MockSite:
+    """Данные макета: школы, параллели, классы и их таблицы "Сапа" (создаются при первом запросе)"""
+
+    def __init__(self, schools=2, grades=(11, 10, 9), classes_per_grade=3, subjects=20, students=30,
+                 latency=0.0, modal_latency=0.0, login='bench', password='bench', seed=0):
+        self.schools = [{'id': 100 + idx, 'name': f'Школа-гимназия № {idx + 1}'} for idx in range(schools)]
+        self.grades = list(grades)
+        self.classes_per_grade = classes_per_grade
+        self.subjects = subjects
+        self.students = students
+        self.latency = latency
+        self.modal_latency = modal_latency
+        self.login = login
+        self.password = password
+        self.seed = seed
+        self.sessions = set()
+        self.requests = {}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def class_id(self, school_id, grade, idx):
+        return school_id * 100000 + grade * 100 + idx
+
+    def classes(self, school_id, grade):
+        return [{'id': self.class_id(school_id, grade, idx), 'name': f'{grade} «{LETTERS[idx % len(LETTERS)]}»'}
+                for idx in range(self.classes_per_grade)]
+
+    def table(self, class_id):
+        with self._lock:
+            if class_id not in self._tables:
+                self._tables[class_id] = make_table(subjects=self.subjects, students=self.students,
+                                                    seed=self.seed + class_id)
+            return self._tables[class_id]
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+
+def create_mock_app(site):
+    """Flask-приложение макета для данных MockSite"""
+    app = Flask(__name__)
+
+    def delay(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def authorized():
+        return request.cookies.get(SESSION_COOKIE) in site.sessions
+
+    @app.route('/_monitor/index.php', methods=['GET', 'POST'])
+    def index():
+        site.count('index')
+        delay(site.latency)
+        if request.method == 'POST':
+            if request.form.get('login') == site.login and request.form.get('password') == site.password:
+                session_id = uuid.uuid4().hex
+                site.sessions.add(session_id)
+                response = redirect('/_monitor/index.php?page=main')
+                response.set_cookie(SESSION_COOKIE, session_id, path='/')
+                return response
+            error = '<div class="alert alert-danger">Неверный логин или пароль</div>'
+        elif authorized():
+            return page('Мониторинг', '<nav><a href="pg_reports.php">Отчеты</a></nav><h3>Главная</h3>')
+        else:
+            error = ''
+        return page('Вход', error + (
+            '<form method="post" action="index.php">'
+            '<input type="text" name="login" placeholder="Логин">'
+            '<input type="password" name="password" placeholder="Пароль">'
+            '<button type="submit">Войти</button></form>'
+        ))
+
+    @app.route('/_monitor/pg_reports.php')
+    def reports():
+        if not authorized():
+            return redirect('/_monitor/index.php')
+        school_id = request.args.get('id_mektep', type=int)
+        if school_id is None:
+            site.count('schools')
+            delay(site.latency)
+            rows = ''.join(
+                f'<tr><td>{idx + 1}</td><td><a href="pg_reports.php?id_mektep={school["id"]}">'
+                f'{html.escape(school["name"])}</a></td><td>{len(site.grades) * site.classes_per_grade}</td></tr>'
+                for idx, school in enumerate(site.schools)
+            )
+            return page('Отчеты', '<table class="table"><thead><tr><th>№</th><th>Районы/города/школы</th>'
+                                  f'<th>Классов</th></tr></thead><tbody>{rows}</tbody></table>')
+
+        site.count('school')
+        delay(site.latency)
+        if school_id not in {school['id'] for school in site.schools}:
+            abort(404)
+        tabs = ''.join(
+            f'<li class="nav-item"><a class="nav-link" href="#" '
+            f'onclick="return showGrade(this, {grade}, {school_id})">{grade}  класс</a></li>'
+            for grade in site.grades
+        )
+        modal = ('<div class="modal fade" id="classSapa" style="display: none"><div class="modal-dialog">'
+                 '<div class="modal-content"><div class="modal-header">'
+                 '<button type="button" class="close" data-dismiss="modal" onclick="closeSapa()">×</button>'
+                 '</div><div class="modal-body"></div></div></div></div>')
+        return page('Отчет', f'<div class="card"><div class="card-body"><h3>Отчет</h3>'
+                             f'<ul class="nav nav-pills" id="pills-tab">{tabs}</ul>'
+                             f'<div id="sapa_view"><div id="classes_view"></div></div></div></div>{modal}')
+
+    @app.route('/_monitor/ajax/classes.php')
+    def classes():
+        if not authorized():
+            abort(403)
+        site.count('classes')
+        delay(site.latency)
+        school_id = request.args.get('id_mektep', type=int)
+        grade = request.args.get('grade', type=int)
+        rows = ''.join(
+            f'<tr><td>{html.escape(cls["name"])}</td><td>Общеобразовательный</td><td>русский</td><td>1</td>'
+            f'<td>Учитель {cls["id"]}</td><td>{site.students}</td>'
+            f'<td><button type="button" class="btn btn-sm btn-info" data-id="{cls["id"]}" '
+            f'onclick="showSapa({cls["id"]}, {school_id})">Успеваемость</button></td></tr>'
+            for cls in site.classes(school_id, grade)
+        )
+        return ('<table class="table table-striped table-bordered"><thead><tr><th>Класс</th><th>Тип класса</th>'
+                '<th>Язык обучения</th><th>Смена</th><th>Классный руководитель</th><th>Учащиеся</th>'
+                f'<th>Действия</th></tr></thead><tbody>{rows}</tbody></table>')
+
+    @app.route('/_monitor/ajax/sapa.php', methods=['POST'])
+    def sapa():
+        if not authorized():
+            abort(403)
+        site.count('sapa')
+        delay(site.modal_latency)
+        class_id = request.form.get('id_class', type=int)
+        if class_id is None:
+            abort(400)
+        response = make_response(sapa_table_html(site.table(class_id)))
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        return response
+
+    return app
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Обработчик без строки лога на каждый запрос (не мешает выводу бенчмарка)"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class MockMektepServer:
+    """Макет в фоновом потоке: with MockMektepServer(site) as server: server.base_url"""
+
+    def __init__(self, site=None, host='127.0.0.1', port=0, quiet=True):
+        self.site = site or MockSite()
+        self._server = make_server(host, port, create_mock_app(self.site), threaded=True,
+                                   request_handler=_QuietRequestHandler if quiet else None)
+        self.base_url = f'http://{host}:{self._server.server_port}'
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-mektep', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_site_arguments(parser):
+    """Параметры макета (общие для запуска отдельно и бенчмарка скрапера)"""
+    parser.add_argument('--schools', type=int, default=2)
+    parser.add_argument('--grades', type=int, nargs='+', default=[11, 10, 9])
+    parser.add_argument('--classes', type=int, default=3, help='классов в параллели')
+    parser.add_argument('--subjects', type=int, default=20)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка страниц и списков, с')
+    parser.add_argument('--modal-latency', type=float, default=0.0, help='задержка таблицы "Сапа", с')
+
+
+def site_from_args(args):
+    return MockSite(schools=args.schools, grades=args.grades, classes_per_grade=args.classes,
+                    subjects=args.subjects, students=args.students, latency=args.latency,
+                    modal_latency=args.modal_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    site = site_from_args(args)
+    server = MockMektepServer(site, host=args.host, port=args.port, quiet=False)
+    print(f"Макет mektep.edu.kz: {server.base_url}/_monitor/index.php (логин {site.login}, пароль {site.password})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Генератор синтетических таблиц "Сапа" для бенчмарков.
+
+Таблицы имеют ту же структуру {"headers", "data"}, что возвращает
+MektepScraper.extract_modal_table_data(), поэтому их можно передавать
+в process_success_data(tables=...) или записывать в success_data.xlsx
+через SuccessDataWriter.
+
+Файл success_data.xlsx нужного размера (из корня репозитория):
+    python benchmarks/synthetic.py success_data.xlsx [--classes 10] [--students 30] [--subjects 22]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mektep_scraper import SuccessDataWriter  # noqa: E402
+
+SUBJECTS = [
+    'Қазақ тілі', 'Қазақ әдебиеті', 'Орыс тілі', 'Орыс әдебиеті', 'Ағылшын тілі',
+    'Алгебра', 'Геометрия', 'Информатика', 'Физика', 'Химия', 'Биология',
+    'География', 'Қазақстан тарихы', 'Дүниежүзі тарихы', 'Құқық негіздері',
+    'Дене шынықтыру', 'Алғашқы әскери дайындық', 'Графика және жобалау',
+    'Көркем еңбек', 'Өзін-өзі тану', 'Музыка', 'Экономика негіздері'
+]
+QUARTERS = ['I', 'II', 'III', 'IV', 'Ж']
+LAST_NAMES = ['Ахметов', 'Серикова', 'Иванов', 'Нурланов', 'Ким', 'Жумабаева', 'Петрова', 'Касымов']
+FIRST_NAMES = ['Айдар', 'Алия', 'Дмитрий', 'Асель', 'Тимур', 'Мадина', 'Ерлан', 'Дана']
+
+
+def make_table(subjects=20, students=30, subgroups=2, empty_ratio=0.1, absent_ratio=0.0, seed=None):
+    """Таблица одного класса: subjects предметов по 5 четвертей, subgroups из них
+    повторяются (подгруппы), часть оценок пустая, доля absent_ratio - отметки н/а"""
+    rng = random.Random(seed)
+    names = [SUBJECTS[i % len(SUBJECTS)] + ('' if i < len(SUBJECTS) else f' {i // len(SUBJECTS) + 1}')
+             for i in range(subjects)]
+    # Подгруппы: тот же предмет еще раз (например, иностранный язык)
+    names += names[:subgroups]
+
+    first_row = [{'text': name, 'colspan': len(QUARTERS)} for name in names]
+    second_row = QUARTERS * len(names)
+
+    data = []
+    for number in range(1, students + 1):
+        row = [str(number), f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}']
+        for _ in second_row:
+            chance = rng.random()
+            if chance < empty_ratio:
+                row.append('')
+            elif chance < empty_ratio + absent_ratio:
+                row.append('н/а')
+            else:
+                row.append(str(rng.choices([5, 4, 3, 2], weights=[35, 40, 20, 5])[0]))
+        data.append(row)
+
+    return {
+        'headers': {
+            'first_col_name': '',
+            'second_col_name': 'Аты-жөні',
+            'first_row': first_row,
+            'second_row': second_row
+        },
+        'data': data
+    }
+
+
+def make_tables(classes=4, seed=0, **kwargs):
+    """Таблицы нескольких классов {имя листа: table_data}"""
+    letters = 'АБВГДЕЖЗИКЛМНОПРСТУФХ'
+    tables = {}
+    for idx in range(classes):
+        name = f'11 {letters[idx % len(letters)]}' + (str(idx // len(letters)) if idx >= len(letters) else '')
+        tables[name] = make_table(seed=seed + idx, **kwargs)
+    return tables
+
+
+def write_success_workbook(path, tables):
+    """Запись таблиц в файл формата success_data.xlsx"""
+    writer = SuccessDataWriter(path)
+    for name, table_data in tables.items():
+        writer.add(table_data, name)
+    writer.save()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--classes', type=int, default=4)
+    parser.add_argument('--subjects', type=int, default=20)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--subgroups', type=int, default=2, help='предметов с повторной колонкой (подгруппы)')
+    parser.add_argument('--empty-ratio', type=float, default=0.1, help='доля пустых ячеек')
+    parser.add_argument('--absent-ratio', type=float, default=0.0, help='доля отметок н/а')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tables = make_tables(classes=args.classes, seed=args.seed, subjects=args.subjects, students=args.students,
+                         subgroups=args.subgroups, empty_ratio=args.empty_ratio, absent_ratio=args.absent_ratio)
+    write_success_workbook(args.output, tables)
+
+
+if __name__ == '__main__':
+    main()
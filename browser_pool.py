@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Пул запущенных и авторизованных браузеров.
+
+Запуск Chrome и авторизация - самая долгая постоянная часть каждого запуска.
+Задания берут из пула уже авторизованный браузер (по логину) и возвращают
+его после работы; простаивающие браузеры закрываются по таймауту
+"""
+import hmac
+import threading
+import time
+
+import config
+from mektep_scraper import MektepScraper
+
+
+class BrowserPool:
+    """Пул экземпляров MektepScraper с запущенным браузером, сгруппированных по логину"""
+
+    def __init__(self, max_size=None, idle_timeout=None, checkout_timeout=300, factory=MektepScraper):
+        self.max_size = max_size or config.BROWSER_MAX_INSTANCES
+        self.idle_timeout = idle_timeout if idle_timeout is not None else config.BROWSER_POOL_IDLE_SECONDS
+        self.checkout_timeout = checkout_timeout
+        self.factory = factory
+        self._idle = {}  # {login: [(scraper, время возврата), ...]}
+        self._size = 0  # Всего браузеров (свободных и выданных)
+        self._condition = threading.Condition()
+        self._reaper = None
+
+    @staticmethod
+    def _quit(scraper):
+        try:
+            if scraper.driver:
+                scraper.driver.quit()
+        except Exception:
+            pass
+        scraper.driver = None
+
+    @staticmethod
+    def _is_alive(scraper):
+        """Браузер запущен и отвечает"""
+        try:
+            return scraper.driver is not None and scraper.driver.current_url is not None
+        except Exception:
+            return False
+
+    @staticmethod
+    def _is_healthy(scraper):
+        """Браузер отвечает и сессия на сайте еще действует"""
+        if not BrowserPool._is_alive(scraper):
+            return False
+        try:
+            if not scraper.open_page(scraper.login_url):
+                return False
+            return scraper.check_authentication_quick()
+        except Exception:
+            return False
+
+    def _discard(self, scraper):
+        """Закрытие браузера и освобождение места в пуле (вызывается под блокировкой)"""
+        self._quit(scraper)
+        self._size -= 1
+        self._condition.notify_all()
+
+    def _evict_idle(self, now=None):
+        """Закрытие браузеров, простаивающих дольше idle_timeout (вызывается под блокировкой)"""
+        now = now or time.time()
+        for login in list(self._idle):
+            alive = []
+            for scraper, released_at in self._idle[login]:
+                if now - released_at > self.idle_timeout:
+                    print(f"Браузер пула для {login} закрыт по простою")
+                    self._discard(scraper)
+                else:
+                    alive.append((scraper, released_at))
+            if alive:
+                self._idle[login] = alive
+            else:
+                del self._idle[login]
+
+    def _evict_oldest_idle(self):
+        """Закрытие самого давно простаивающего браузера любого логина (под блокировкой)"""
+        oldest = None
+        for login, entries in self._idle.items():
+            for entry in entries:
+                if oldest is None or entry[1] < oldest[1][1]:
+                    oldest = (login, entry)
+        if oldest is None:
+            return False
+        login, entry = oldest
+        self._idle[login].remove(entry)
+        if not self._idle[login]:
+            del self._idle[login]
+        self._discard(entry[0])
+        return True
+
+    def _take_idle(self, login, password):
+        """Свободный браузер с теми же учетными данными (под блокировкой)"""
+        entries = self._idle.get(login) or []
+        for entry in reversed(entries):
+            scraper = entry[0]
+            # Сессию выдаем только при совпадении пароля, иначе это чужая авторизация
+            if hmac.compare_digest(str(scraper.password_credential), str(password)):
+                entries.remove(entry)
+                if not entries:
+                    del self._idle[login]
+                return scraper
+        return None
+
+    def checkout(self, login, password, timeout=None):
+        """Получение авторизованного браузера.
+
+        Возвращает MektepScraper с запущенным браузером после успешной авторизации,
+        при неудачной авторизации - RuntimeError
+        """
+        deadline = time.time() + (timeout or self.checkout_timeout)
+        with self._condition:
+            while True:
+                self._evict_idle()
+                scraper = self._take_idle(login, password)
+                if scraper is not None:
+                    break
+                if self._size < self.max_size or self._evict_oldest_idle():
+                    self._size += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError('Нет свободного браузера в пуле')
+                self._condition.wait(remaining)
+
+        if scraper is not None:
+            # Отчет о времени относится к одному заданию
+            scraper.reset_timings()
+            with scraper.timed('pool_health_check'):
+                healthy = self._is_healthy(scraper)
+            if healthy:
+                print(f"✓ Используется браузер из пула для {login}")
+                return scraper
+            print(f"⚠ Сессия браузера из пула для {login} недействительна, повторная авторизация")
+            if self._is_alive(scraper) and scraper.login():
+                return scraper
+            self._quit(scraper)
+
+        # Место в пуле уже занято за этим вызовом - запускаем новый браузер
+        scraper = self.factory(login=login, password=password)
+        try:
+            scraper.setup_driver()
+            if not scraper.login():
+                raise RuntimeError('Не удалось авторизоваться. Проверьте правильность логина и пароля.')
+        except Exception:
+            with self._condition:
+                self._discard(scraper)
+            raise
+        return scraper
+
+    def checkin(self, scraper, healthy=True):
+        """Возврат браузера в пул; неисправный (или после остановки задания) закрывается"""
+        with self._condition:
+            if healthy and self.idle_timeout > 0 and self._is_alive(scraper):
+                self._idle.setdefault(scraper.login_credential, []).append((scraper, time.time()))
+                self._condition.notify_all()
+                self._start_reaper()
+            else:
+                self._discard(scraper)
+
+    def close(self):
+        """Закрытие всех свободных браузеров"""
+        with self._condition:
+            for entries in self._idle.values():
+                for scraper, _ in entries:
+                    self._discard(scraper)
+            self._idle.clear()
+
+    def stats(self):
+        with self._condition:
+            idle = sum(len(entries) for entries in self._idle.values())
+            return {'size': self._size, 'idle': idle, 'in_use': self._size - idle, 'max_size': self.max_size}
+
+    def _start_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name='browser-pool-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1, min(60, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            with self._condition:
+                self._evict_idle()
+                if not self._idle:
+                    self._reaper = None
+                    return
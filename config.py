@@ -1,16 +1,16 @@
 # Конфигурация для mektep_scraper.py
+import os
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения из .env файла (если есть)
+load_dotenv()
 
 # URL платформы
-BASE_URL = "https://mektep.edu.kz"
+BASE_URL = os.getenv("MEKTEP_BASE_URL", "https://mektep.edu.kz").rstrip("/")  # Другой адрес - например, локальный макет для бенчмарков
 LOGIN_URL = f"{BASE_URL}/_monitor/index.php"
 REPORTS_URL = f"{BASE_URL}/_monitor/pg_reports.php"
 
 # Учетные данные (используйте переменные окружения для безопасности)
-import os
-from dotenv import load_dotenv
-
-# Загружаем переменные окружения из .env файла (если есть)
-load_dotenv()
 
 LOGIN = os.getenv("EDUS_LOGIN", "")  # Логин из переменной окружения EDUS_LOGIN
 PASSWORD = os.getenv("EDUS_PASSWORD", "")  # Пароль из переменной окружения EDUS_PASSWORD
@@ -24,4 +24,43 @@ PAGE_LOAD_TIMEOUT = int(os.getenv("PAGE_LOAD_TIMEOUT", "30"))  # Таймаут
 # Настройки для извлечения данных
 MIN_TABLE_ROWS = int(os.getenv("MIN_TABLE_ROWS", "60"))  # Минимальное количество строк в таблице школ
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "success_data.xlsx")  # Имя выходного Excel файла
+KEEP_INTERMEDIATE_XLSX = os.getenv("KEEP_INTERMEDIATE_XLSX", "false").lower() == "true"  # Сохранять промежуточный success_data.xlsx (для отладки)
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", "1"))  # Процессов для обработки классов по четвертям (1 - последовательно, 0 - по числу ядер)
+
+
+# Движок извлечения таблиц "Сапа": browser (клики в Selenium) или http (прямые AJAX-запросы)
+SCRAPER_ENGINE = os.getenv("SCRAPER_ENGINE", "browser").lower()
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))  # Таймаут HTTP-запроса (секунды)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))  # Размер пула HTTP-соединений
+SCRAPER_CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", "4"))  # Одновременных запросов классов параллели
+SCRAPER_RATE_LIMIT = float(os.getenv("SCRAPER_RATE_LIMIT", "3"))  # Не более N запросов в секунду к mektep.edu.kz (0 - без ограничения)
+
+# Задания и планировщик
+JOBS_DB = os.getenv("JOBS_DB", "data/jobs.sqlite3")  # SQLite-хранилище заданий (общее для воркеров gunicorn)
+JOBS_MAX_CONCURRENT = int(os.getenv("JOBS_MAX_CONCURRENT", "2"))  # Одновременно выполняемых заданий (на все воркеры)
+BROWSER_MAX_INSTANCES = int(os.getenv("BROWSER_MAX_INSTANCES", "2"))  # Экземпляров Chrome в одном процессе
+JOBS_STALE_SECONDS = int(os.getenv("JOBS_STALE_SECONDS", "120"))  # Через сколько секунд без heartbeat задание считается упавшим
+COMMAND_POLL_INTERVAL = float(os.getenv("COMMAND_POLL_INTERVAL", "1.0"))  # Как часто задание, ожидающее выбора школы/класса, проверяет очередь команд из других воркеров (секунды)
+SELECTION_TIMEOUT = int(os.getenv("SELECTION_TIMEOUT", "300"))  # Сколько секунд задание ждет выбора школы или класса пользователем
+JOB_LOGS_MAX = int(os.getenv("JOB_LOGS_MAX", "1000"))  # Сколько последних записей лога хранится для каждого задания (0 - все)
+LOG_FILE = os.getenv("LOG_FILE", "")  # Копия логов заданий в файл с ротацией, например data/logs/app.log (пустая строка - не писать)
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(5 * 1024 * 1024)))  # Размер файла лога до ротации (байты)
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))  # Сколько старых файлов лога хранить
+BROWSER_POOL_IDLE_SECONDS = int(os.getenv("BROWSER_POOL_IDLE_SECONDS", "300"))  # Простаивающий авторизованный браузер закрывается через N секунд (0 - не хранить)
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))  # Как часто поток событий /api/events проверяет статус и новые логи (секунды)
+EVENTS_STREAM_SECONDS = int(os.getenv("EVENTS_STREAM_SECONDS", "60"))  # Длительность одного подключения /api/events, затем браузер переподключается сам
+SPANS_KEEP_DAYS = int(os.getenv("SPANS_KEEP_DAYS", "14"))  # Сколько дней хранятся спаны шагов заданий для /api/runs/<id>/timings (0 - без ограничения); метрики /metrics не удаляются
+METRICS_BUCKETS = [float(value) for value in os.getenv("METRICS_BUCKETS", "0.1,0.25,0.5,1,2.5,5,10,30,60,120,300").split(",") if value.strip()]  # Границы гистограмм длительности шагов в /metrics (секунды)
+
+# Сохранение авторизованных сессий (cookies шифруются, по файлу на логин)
+SESSION_STORE_DIR = os.getenv("SESSION_STORE_DIR", "data/sessions")  # Пустая строка - не сохранять сессии
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")  # Секрет шифрования; если не задан, создается файл data/sessions/.key
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", "43200"))  # Сохраненная сессия не используется дольше N секунд
+
+# Инкрементальное обновление (хэши таблиц классов и отчеты прошлых запусков)
+SCRAPE_CACHE_DIR = os.getenv("SCRAPE_CACHE_DIR", "data/cache")  # Пустая строка - всегда загружать и обрабатывать заново
+SCRAPE_PROBE_MAX_AGE = int(os.getenv("SCRAPE_PROBE_MAX_AGE", "0"))  # Не загружать таблицу класса, если его строка в списке не изменилась и таблице меньше N секунд (0 - всегда загружать)
 
+# Хранилище оценок (нормализованные таблицы "Сапа" для запросов без скрапинга)
+GRADES_DB = os.getenv("GRADES_DB", "data/grades.sqlite3")  # Пустая строка - не сохранять оценки
+GRADES_KEEP_SNAPSHOTS = int(os.getenv("GRADES_KEEP_SNAPSHOTS", "10"))  # Сколько последних измененных версий таблицы каждого класса хранится (0 - все)
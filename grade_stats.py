@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Подсчет статистики оценок для таблиц по четвертям.
+
+Оценки класса разбираются один раз в массив counts[ученик, предмет, четверть, оценка]
+(в ячейке может быть несколько оценок через запятую - подгруппы), после чего
+количество "5"/"4"/"3", качество и успеваемость по ученикам, предметам и классу
+считаются векторными операциями NumPy. Оформление Excel только раскладывает
+готовые значения по ячейкам
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Индекс последней оси counts - сама оценка (0 не используется)
+GRADE_LEVELS = 6
+
+# Оценки, которые выводятся в таблицах, в порядке столбцов/строк
+REPORT_GRADES = [5, 4, 3]
+
+# Все, кроме цифр, в тексте оценки
+NON_DIGITS = re.compile(r'[^\d]')
+
+
+def parse_grade(value):
+    """Преобразует значение в оценку (число 1-5)"""
+    if isinstance(value, str):
+        return _parse_grade_text(value)
+    if value is None or pd.isna(value):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return int(value) if value == int(value) and 1 <= int(value) <= 5 else None
+        return _parse_grade_text(str(value))
+    except:
+        pass
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parse_grade_text(value):
+    # Различных значений ячеек немного ("5", "4", "н/а", "5, 4"...), поэтому результат кэшируется
+    value_str = NON_DIGITS.sub('', value.strip())
+    if value_str:
+        grade = int(value_str)
+        if 1 <= grade <= 5:
+            return grade
+    return None
+
+
+def parse_cell_grades(value):
+    """Оценки из ячейки; несколько оценок (подгруппы) записаны через запятую"""
+    if not value:
+        return ()
+    return _parse_cell_text(str(value))
+
+
+@lru_cache(maxsize=1024)
+def _parse_cell_text(value):
+    grades = []
+    for part in value.split(','):
+        grade = _parse_grade_text(part.strip())
+        if grade:
+            grades.append(grade)
+    return tuple(grades)
+
+
+def percent(part, total):
+    """Доля в процентах с округлением до 2 знаков (0, если оценок нет)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = part / total * 100
+    # round() Python, а не np.round: результат совпадает с прежним построчным подсчетом
+    return [round(float(v), 2) if t > 0 else 0 for v, t in zip(np.atleast_1d(values), np.atleast_1d(total))]
+
+
+class QuarterStats:
+    """Статистика одной четверти: значения для строк и столбцов таблицы"""
+
+    def __init__(self, quarter, subjects, values, counts):
+        self.quarter = quarter
+        self.subjects = subjects
+        self.values = values  # {предмет: исходные значения ячеек}
+        report = counts[..., REPORT_GRADES]
+
+        # Столбцы "5", "4", "3" по ученикам
+        self.student_counts = report.sum(axis=1).tolist()
+
+        # Строки "5", "4", "3" по предметам
+        by_subject = counts.sum(axis=0)
+        self.subject_counts = {grade: by_subject[:, grade].tolist() for grade in REPORT_GRADES}
+
+        # Качество (5 и 4) и успеваемость (5, 4 и 3) по предметам
+        totals = by_subject[:, 1:].sum(axis=1)
+        good = by_subject[:, 5] + by_subject[:, 4]
+        self.quality = percent(good, totals)
+        self.performance = percent(good + by_subject[:, 3], totals)
+
+        # Итог по классу
+        by_grade = by_subject.sum(axis=0)
+        class_total = by_grade[1:].sum()
+        class_good = by_grade[5] + by_grade[4]
+        self.class_quality = percent(class_good, class_total)[0]
+        self.class_performance = percent(class_good + by_grade[3], class_total)[0]
+
+    def student_grade_counts(self, student_idx):
+        """Количество "5", "4", "3" у ученика (нули, если у ученика нет оценок)"""
+        if student_idx < len(self.student_counts):
+            return self.student_counts[student_idx]
+        return [0] * len(REPORT_GRADES)
+
+
+class GradeStats:
+    """Оценки класса по всем четвертям
+
+    quarters_data - {четверть: {предмет: значения ячеек по ученикам}}
+    """
+
+    def __init__(self, quarters_data):
+        self.quarters = list(quarters_data)
+        self._quarters_data = quarters_data
+
+        subject_index = {}
+        for data in quarters_data.values():
+            for subject in data:
+                subject_index.setdefault(subject, len(subject_index))
+        self.subjects = list(subject_index)
+        self._subject_index = subject_index
+        self.num_students = max((len(values) for data in quarters_data.values() for values in data.values()),
+                                default=0)
+
+        # Каждое различное значение ячейки разбирается один раз: codes хранит номер значения,
+        # rows - количество каждой оценки для него (код 0 - пустая ячейка)
+        rows = [np.zeros(GRADE_LEVELS, dtype=np.int32)]
+        codes_by_value = {}
+        codes = np.zeros((self.num_students, len(self.subjects), len(self.quarters)), dtype=np.intp)
+        for quarter_idx, data in enumerate(quarters_data.values()):
+            for subject, values in data.items():
+                column = []
+                for value in values:
+                    code = codes_by_value.get(value)
+                    if code is None:
+                        code = codes_by_value[value] = len(rows)
+                        rows.append(np.bincount(parse_cell_grades(value), minlength=GRADE_LEVELS).astype(np.int32))
+                    column.append(code)
+                codes[:len(column), subject_index[subject], quarter_idx] = column
+
+        self.counts = np.stack(rows)[codes]
+
+    def quarter(self, quarter):
+        """Статистика четверти (предметы в порядке столбцов исходной таблицы)"""
+        data = self._quarters_data.get(quarter, {})
+        subjects = list(data)
+        if quarter in self.quarters:
+            columns = [self._subject_index[subject] for subject in subjects]
+            counts = self.counts[:, columns, self.quarters.index(quarter), :]
+        else:
+            counts = np.zeros((self.num_students, 0, GRADE_LEVELS), dtype=np.int32)
+        return QuarterStats(quarter, subjects, data, counts)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное хранилище оценок, извлеченных из таблиц "Сапа".
+
+Каждая загруженная таблица класса сохраняется в SQLite в нормализованном виде
+(школа, класс, ученик, предмет, четверть, оценка, время загрузки), поэтому
+качество и успеваемость по классам, предметам и четвертям можно получить
+запросом, не запуская браузер и не читая файлы из uploads/
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import config
+from grade_stats import parse_cell_grades
+from process_quarters_final import normalize_quarter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    school TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    job_id TEXT,
+    first_scraped_at REAL NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_class ON snapshots (school, class_name, id);
+CREATE TABLE IF NOT EXISTS grades (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    student_no INTEGER NOT NULL,
+    student TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    quarter TEXT,
+    grade INTEGER,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_grades_snapshot ON grades (snapshot_id);
+CREATE VIEW IF NOT EXISTS latest_grades AS
+    SELECT s.school, s.class_name, s.scraped_at, g.student_no, g.student, g.subject, g.quarter, g.grade, g.raw
+    FROM grades g
+    JOIN snapshots s ON s.id = g.snapshot_id
+    WHERE s.id = (SELECT MAX(id) FROM snapshots l WHERE l.school = s.school AND l.class_name = s.class_name);
+"""
+
+# Поля, по которым можно группировать и фильтровать сводку (имя в API -> колонка)
+SUMMARY_FIELDS = {
+    'school': 'school',
+    'class': 'class_name',
+    'student': 'student',
+    'subject': 'subject',
+    'quarter': 'quarter'
+}
+
+
+def table_grades(table_data):
+    """Строки оценок таблицы класса: (№, ученик, предмет, четверть, оценка, исходное значение).
+
+    Колонки одного предмета и четверти (подгруппы) объединяются так же, как в
+    merge_duplicate_columns отчета: непустые значения без повторов через ", ".
+    Объединенная ячейка с несколькими оценками дает строку на каждую оценку,
+    непустая ячейка без оценки (например, "н/а") - строку с оценкой None.
+    Как и при обработке по четвертям, данные заканчиваются на первой строке,
+    где нарушена нумерация учеников
+    """
+    headers = table_data.get('headers') or {}
+    subjects = []
+    for subject in headers.get('first_row') or []:
+        subjects.extend([subject.get('text') or ''] * subject.get('colspan', 1))
+    quarters = [normalize_quarter(quarter) for quarter in headers.get('second_row') or []]
+
+    rows = []
+    expected_no = 1
+    for row in table_data.get('data') or []:
+        try:
+            student_no = int(float(str(row[0]).strip()))
+        except (ValueError, TypeError, IndexError):
+            break
+        if student_no != expected_no:
+            break
+        expected_no += 1
+
+        student = str(row[1]).strip() if len(row) > 1 and row[1] is not None else ''
+        if not student:
+            continue
+        cells = {}  # {(предмет, четверть): [значения без повторов]}
+        for col_idx, value in enumerate(row[2:]):
+            raw = str(value).strip() if value is not None else ''
+            subject = subjects[col_idx] if col_idx < len(subjects) else ''
+            if not raw or raw in ('nan', 'None') or not subject:
+                continue
+            quarter = quarters[col_idx] if col_idx < len(quarters) else None
+            values = cells.setdefault((subject, quarter), [])
+            if raw not in values:
+                values.append(raw)
+        for (subject, quarter), values in cells.items():
+            raw = ', '.join(values)
+            grades = parse_cell_grades(raw) or [None]
+            for grade in grades:
+                rows.append((student_no, student, subject, quarter, grade, raw))
+    return rows
+
+
+def percent(part, total):
+    """Доля в процентах, как в отчете по четвертям (0, если оценок нет)"""
+    return round(part / total * 100, 2) if total > 0 else 0
+
+
+class GradesStore:
+    """Снимки таблиц классов и оценки в SQLite (одно соединение на поток)"""
+
+    def __init__(self, db_path, keep_snapshots=None):
+        self.db_path = str(db_path)
+        # Сколько последних снимков хранится для каждого класса (0 - все)
+        self.keep_snapshots = keep_snapshots if keep_snapshots is not None else config.GRADES_KEEP_SNAPSHOTS
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def save_table(self, school, class_name, table_data, job_id=None, scraped_at=None):
+        """Сохранение таблицы класса. Если содержимое не изменилось с последнего снимка,
+        у него обновляется только время загрузки. Снимки класса старше keep_snapshots
+        последних удаляются вместе с оценками. Возвращает id снимка
+        """
+        scraped_at = scraped_at or time.time()
+        content_hash = hashlib.sha256(
+            json.dumps(table_data, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        with self._transaction() as conn:
+            latest = conn.execute(
+                'SELECT id, content_hash FROM snapshots WHERE school = ? AND class_name = ? ORDER BY id DESC LIMIT 1',
+                (school, class_name)
+            ).fetchone()
+            if latest and latest['content_hash'] == content_hash:
+                conn.execute('UPDATE snapshots SET scraped_at = ?, job_id = ? WHERE id = ?',
+                             (scraped_at, job_id, latest['id']))
+                return latest['id']
+
+            snapshot_id = conn.execute(
+                'INSERT INTO snapshots (school, class_name, content_hash, job_id, first_scraped_at, scraped_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (school, class_name, content_hash, job_id, scraped_at, scraped_at)
+            ).lastrowid
+            conn.executemany(
+                'INSERT INTO grades (snapshot_id, student_no, student, subject, quarter, grade, raw) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(snapshot_id,) + row for row in table_grades(table_data)]
+            )
+            if self.keep_snapshots > 0:
+                conn.execute(
+                    'DELETE FROM snapshots WHERE school = ? AND class_name = ? AND id <= ('
+                    'SELECT id FROM snapshots WHERE school = ? AND class_name = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                    (school, class_name, school, class_name, self.keep_snapshots)
+                )
+            return snapshot_id
+
+    def snapshots(self, school=None):
+        """Последние снимки классов (по одному на класс)"""
+        query = '''
+            SELECT s.id, s.school, s.class_name, s.first_scraped_at, s.scraped_at, s.job_id,
+                   (SELECT COUNT(DISTINCT student_no) FROM grades g WHERE g.snapshot_id = s.id) AS students
+            FROM snapshots s
+            WHERE s.id = (SELECT MAX(id) FROM snapshots l WHERE l.school = s.school AND l.class_name = s.class_name)
+        '''
+        params = []
+        if school:
+            query += ' AND s.school = ?'
+            params.append(school)
+        query += ' ORDER BY s.school, s.class_name'
+        return [dict(row) for row in self._conn().execute(query, params)]
+
+    def summary(self, group_by=('class', 'subject', 'quarter'), filters=None):
+        """Количество оценок, качество и успеваемость по последним снимкам классов.
+
+        group_by - поля из SUMMARY_FIELDS, filters - {поле: значение}.
+        Качество и успеваемость считаются так же, как в отчете по четвертям:
+        доля оценок 5 и 4 (5, 4 и 3) среди всех оценок
+        """
+        unknown = [field for field in list(group_by) + list(filters or {}) if field not in SUMMARY_FIELDS]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+
+        columns = [SUMMARY_FIELDS[field] for field in group_by]
+        select = ''.join(f'{column} AS "{field}", ' for field, column in zip(group_by, columns))
+        query = f'''
+            SELECT {select}
+                   SUM(grade = 5) AS count_5, SUM(grade = 4) AS count_4,
+                   SUM(grade = 3) AS count_3, SUM(grade = 2) AS count_2,
+                   COUNT(grade) AS total, MAX(scraped_at) AS scraped_at
+            FROM latest_grades
+        '''
+        params = []
+        if filters:
+            query += ' WHERE ' + ' AND '.join(f'{SUMMARY_FIELDS[field]} = ?' for field in filters)
+            params.extend(filters.values())
+        if columns:
+            query += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+
+        result = []
+        for row in self._conn().execute(query, params):
+            item = dict(row)
+            for key in ('count_5', 'count_4', 'count_3', 'count_2'):
+                item[key] = item[key] or 0
+            good = item['count_5'] + item['count_4']
+            item['quality'] = percent(good, item['total'])
+            item['performance'] = percent(good + item['count_3'], item['total'])
+            result.append(item)
+        return result
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_grades_store():
+    """Хранилище оценок по настройкам config (None, если сохранение отключено)"""
+    global _default_store
+    if not config.GRADES_DB:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = GradesStore(Path(__file__).parent / config.GRADES_DB)
+        return _default_store
@@ -0,0 +1,624 @@
+# -*- coding: utf-8 -*-
+"""
+Подсистема заданий скрапинга.
+Задания (состояние, логи, команды) хранятся в SQLite, поэтому их видят все воркеры
+gunicorn. Планировщик каждого процесса выполняет свои задания, соблюдая общий
+лимит одновременно выполняемых заданий и лимит экземпляров Chrome
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import config
+
+# Статусы, после которых задание больше не выполняется
+FINISHED_STATUSES = ('done', 'error', 'stopped')
+
+# Начальное состояние задания (то, что видит веб-интерфейс)
+DEFAULT_JOB_STATE = {
+    'progress': 0,
+    'current_step': None,
+    'message': 'Задание в очереди',
+    'error': None,
+    'waiting_for_school': False,
+    'waiting_for_class': False,
+    'schools': [],
+    'classes': [],
+    'selected_school': None,
+    'selected_class': None,
+    'auth_start_time': None,  # Время начала ожидания авторизации
+    'files': []
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    stop_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    source TEXT NOT NULL,
+    message TEXT NOT NULL,
+    level TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_logs_job ON job_logs (job_id, id);
+CREATE TABLE IF NOT EXISTS job_spans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    step TEXT NOT NULL,
+    class_name TEXT,
+    school TEXT,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    duration REAL NOT NULL,
+    retries INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_job_spans_job ON job_spans (job_id, start);
+CREATE INDEX IF NOT EXISTS idx_job_spans_start ON job_spans (start);
+CREATE TABLE IF NOT EXISTS step_metrics (
+    step TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum REAL NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS step_metric_buckets (
+    step TEXT NOT NULL,
+    le REAL NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (step, le)
+);
+CREATE TABLE IF NOT EXISTS job_commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_commands_job ON job_commands (job_id, id);
+"""
+
+# Уровни логов заданий для копии в файл
+LOG_LEVELS = {
+    'info': logging.INFO,
+    'success': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR
+}
+
+# Копия логов заданий в файл (обработчик добавляет configure_log_file)
+log_mirror = logging.getLogger('edus2.job_logs')
+log_mirror.propagate = False
+
+# Задание текущего потока (для логов из вспомогательных функций)
+_thread_local = threading.local()
+
+
+def configure_log_file(path, max_bytes, backups):
+    """Копирование логов заданий в файл с ротацией (переживает сброс задания).
+    {pid} в пути заменяется номером процесса - у каждого воркера gunicorn свой файл
+    """
+    if not path or log_mirror.handlers:
+        return
+    path = path.replace('{pid}', str(os.getpid()))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    log_mirror.addHandler(handler)
+    log_mirror.setLevel(logging.INFO)
+
+
+def current_owner():
+    """Идентификатор процесса-владельца заданий"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def current_job():
+    """Задание, которое выполняется в текущем потоке (или None)"""
+    return getattr(_thread_local, 'job', None)
+
+
+class JobStore:
+    """Хранилище заданий в SQLite (одно соединение на поток)"""
+
+    # Как часто (через сколько записей задания) удаляются логи сверх max_logs
+    LOG_TRIM_EVERY = 50
+
+    def __init__(self, db_path, max_logs=None):
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.max_logs = max_logs if max_logs is not None else config.JOB_LOGS_MAX
+        self._local = threading.local()
+        self._log_counts = {}
+        self._log_counts_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой записи (атомарна между процессами)"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['state'] = json.loads(job['state'])
+        job['stop_requested'] = bool(job['stop_requested'])
+        return job
+
+    def create_job(self, kind, params, owner=None):
+        """Создание задания в статусе queued; возвращает id"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        state = dict(DEFAULT_JOB_STATE)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, owner, params, state, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, owner or current_owner(), json.dumps(params, ensure_ascii=False),
+                 json.dumps(state, ensure_ascii=False), now, now)
+            )
+        return job_id
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def latest_job(self, kind=None):
+        if kind:
+            row = self._conn().execute(
+                "SELECT * FROM jobs WHERE kind = ? ORDER BY created_at DESC LIMIT 1", (kind,)).fetchone()
+        else:
+            row = self._conn().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT 1").fetchone()
+        return self._row_to_job(row)
+
+    def list_jobs(self, limit=50):
+        rows = self._conn().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def update_state(self, job_id, **fields):
+        """Атомарное обновление полей состояния задания"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            state = json.loads(row['state'])
+            state.update(fields)
+            conn.execute("UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                         (json.dumps(state, ensure_ascii=False), time.time(), job_id))
+        return state
+
+    def set_status(self, job_id, status):
+        now = time.time()
+        finished_at = now if status in FINISHED_STATUSES else None
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = COALESCE(?, finished_at), updated_at = ? "
+                         "WHERE id = ?", (status, finished_at, now, job_id))
+        if finished_at:
+            self._forget_log_count(job_id)
+
+    def request_stop(self, job_id):
+        """Запрос остановки: задание в очереди останавливается сразу, выполняющееся - при следующей проверке"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET stop_requested = 1, updated_at = ? WHERE id = ?", (now, job_id))
+            conn.execute("UPDATE jobs SET status = 'stopped', finished_at = ? WHERE id = ? AND status = 'queued'",
+                         (now, job_id))
+        self._forget_log_count(job_id)
+
+    def is_stop_requested(self, job_id):
+        row = self._conn().execute("SELECT stop_requested, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row['stop_requested']) or row['status'] in FINISHED_STATUSES
+
+    def claim_next(self, owner, max_running, stale_after):
+        """Атомарный захват следующего задания владельца, если не превышен общий лимит"""
+        now = time.time()
+        row = None
+        with self._transaction() as conn:
+            # Задания процессов, которые перестали обновлять heartbeat, считаем упавшими. Задание в
+            # очереди может захватить только создавший его процесс (учетные данные - в его памяти),
+            # поэтому без heartbeat владельца оно осталось бы в очереди навсегда. updated_at нового
+            # задания равен created_at, так что задание, которое владелец ни разу не отметил, тоже
+            # считается брошенным через stale_after после создания
+            stale = conn.execute("SELECT id, status, state FROM jobs WHERE status IN ('running', 'queued') "
+                                 "AND updated_at < ?", (now - stale_after,)).fetchall()
+            for stale_row in stale:
+                state = json.loads(stale_row['state'])
+                if stale_row['status'] == 'queued':
+                    state['error'] = 'Процесс, создавший задание, завершился до его запуска'
+                else:
+                    state['error'] = 'Процесс обработчика задания завершился'
+                conn.execute("UPDATE jobs SET status = 'error', state = ?, finished_at = ?, updated_at = ? "
+                             "WHERE id = ?", (json.dumps(state, ensure_ascii=False), now, now, stale_row['id']))
+                conn.execute("DELETE FROM job_commands WHERE job_id = ?", (stale_row['id'],))
+
+            running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            if running < max_running:
+                row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' AND owner = ? "
+                                   "ORDER BY created_at LIMIT 1", (owner,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE jobs SET status = 'running', started_at = ?, updated_at = ? WHERE id = ?",
+                                 (now, now, row['id']))
+
+        for stale_row in stale:
+            self._forget_log_count(stale_row['id'])
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        job['status'] = 'running'
+        return job
+
+    def heartbeat(self, owner, job_ids):
+        """Отметка живости процесса: выполняющиеся задания и задания владельца в очереди"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany("UPDATE jobs SET updated_at = ? WHERE id = ?", [(now, job_id) for job_id in job_ids])
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE status = 'queued' AND owner = ?", (now, owner))
+
+    def _forget_log_count(self, job_id):
+        """Счетчик записей для обрезки лога завершенного задания больше не нужен"""
+        with self._log_counts_lock:
+            self._log_counts.pop(job_id, None)
+
+    def add_log(self, job_id, source, message, level='info'):
+        """Добавление лога (job_id='' - системный лог, не привязанный к заданию)"""
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        conn = self._conn()
+        seq = conn.execute(
+            "INSERT INTO job_logs (job_id, timestamp, source, message, level) VALUES (?, ?, ?, ?, ?)",
+            (job_id or '', timestamp, source, str(message), level)
+        ).lastrowid
+        if log_mirror.handlers:
+            log_mirror.log(LOG_LEVELS.get(level, logging.INFO), '%s [%s] %s', job_id or '-', source, message)
+
+        # Лог задания - кольцевой буфер: хранятся последние max_logs записей. Лишние
+        # удаляются пачкой раз в LOG_TRIM_EVERY записей, а не при каждой вставке
+        with self._log_counts_lock:
+            count = self._log_counts.get(job_id or '', 0) + 1
+            self._log_counts[job_id or ''] = count % self.LOG_TRIM_EVERY
+        if self.max_logs > 0 and count >= self.LOG_TRIM_EVERY:
+            conn.execute(
+                "DELETE FROM job_logs WHERE job_id = ? AND id <= (SELECT id FROM job_logs WHERE job_id = ? "
+                "ORDER BY id DESC LIMIT 1 OFFSET ?)", (job_id or '', job_id or '', self.max_logs)
+            )
+        return seq
+
+    def get_logs(self, job_id, limit=1000, include_system=True, after=None):
+        """Последние логи задания (вместе с системными) в хронологическом порядке.
+        seq - номер записи (растет монотонно); after - только записи с seq больше указанного
+        """
+        job_ids = (job_id or '', '') if include_system else (job_id or '', job_id or '')
+        if after is not None:
+            rows = self._conn().execute(
+                "SELECT id AS seq, timestamp, source, message, level FROM job_logs "
+                "WHERE job_id IN (?, ?) AND id > ? ORDER BY id LIMIT ?", (*job_ids, after, limit)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        rows = self._conn().execute(
+            "SELECT id AS seq, timestamp, source, message, level FROM job_logs WHERE job_id IN (?, ?) "
+            "ORDER BY id DESC LIMIT ?", (*job_ids, limit)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def clear_logs(self, job_id):
+        self._conn().execute("DELETE FROM job_logs WHERE job_id = ?", (job_id or '',))
+
+    def send_command(self, job_id, command, payload=None, waiting_for=None):
+        """Атомарная постановка команды выполняющемуся заданию (его обработчик может быть в другом воркере).
+
+        waiting_for - флаг состояния (например, waiting_for_school), который должен быть установлен;
+        он сбрасывается в той же транзакции, поэтому повторный выбор не проходит.
+        Возвращает False, если задание не выполняется или не ждет этой команды
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status, state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row['status'] != 'running':
+                return False
+            if waiting_for:
+                state = json.loads(row['state'])
+                if not state.get(waiting_for):
+                    return False
+                state[waiting_for] = False
+                conn.execute("UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                             (json.dumps(state, ensure_ascii=False), now, job_id))
+            conn.execute("INSERT INTO job_commands (job_id, command, payload, created_at) VALUES (?, ?, ?, ?)",
+                         (job_id, command, json.dumps(payload, ensure_ascii=False), now))
+        return True
+
+    def has_command(self, job_id, command):
+        """Есть ли команда в очереди задания (только чтение, без блокировки записи)"""
+        row = self._conn().execute("SELECT 1 FROM job_commands WHERE job_id = ? AND command = ? LIMIT 1",
+                                   (job_id, command)).fetchone()
+        return row is not None
+
+    def take_commands(self, job_id, commands=None):
+        """Извлечение (с удалением) команд задания в порядке поступления: [(команда, данные)].
+        commands - только команды из этого списка, остальные остаются в очереди
+        """
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT id, command, payload FROM job_commands WHERE job_id = ? ORDER BY id",
+                                (job_id,)).fetchall()
+            rows = [row for row in rows if commands is None or row['command'] in commands]
+            conn.executemany("DELETE FROM job_commands WHERE id = ?", [(row['id'],) for row in rows])
+        return [(row['command'], json.loads(row['payload'])) for row in rows]
+
+    def add_spans(self, job_id, spans):
+        """Сохранение спанов шагов задания (MektepScraper.timed) и накопительных метрик шагов.
+
+        Спаны нужны для /api/runs/<id>/timings и удаляются через config.SPANS_KEEP_DAYS;
+        метрики /metrics (step_metrics, step_metric_buckets) только растут, иначе Prometheus
+        принимал бы каждое удаление старых спанов за сброс счетчиков
+        """
+        if not spans:
+            return
+        totals = {}
+        buckets = {}
+        for span in spans:
+            item = totals.setdefault(span['step'], [0, 0.0, 0])
+            item[0] += 1
+            item[1] += span['duration']
+            item[2] += span.get('retries') or 0
+            # Строка есть для каждой границы (и с нулем), поэтому ее отсутствие означает только,
+            # что граница добавлена в METRICS_BUCKETS позже
+            for bound in config.METRICS_BUCKETS:
+                key = (span['step'], float(bound))
+                buckets[key] = buckets.get(key, 0) + (span['duration'] <= bound)
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO job_spans (job_id, step, class_name, school, start, end, duration, retries) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, span['step'], span.get('class_name'), span.get('school'), span['start'], span['end'],
+                  span['duration'], span.get('retries') or 0) for span in spans]
+            )
+            conn.executemany(
+                "INSERT INTO step_metrics (step, count, sum, retries) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (step) DO UPDATE SET count = count + excluded.count, sum = sum + excluded.sum, "
+                "retries = retries + excluded.retries",
+                [(step, count, total, retries) for step, (count, total, retries) in totals.items()]
+            )
+            conn.executemany(
+                "INSERT INTO step_metric_buckets (step, le, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (step, le) DO UPDATE SET count = count + excluded.count",
+                [(step, le, count) for (step, le), count in buckets.items()]
+            )
+            if config.SPANS_KEEP_DAYS > 0:
+                conn.execute("DELETE FROM job_spans WHERE start < ?", (time.time() - config.SPANS_KEEP_DAYS * 86400,))
+
+    def get_spans(self, job_id):
+        """Спаны задания в порядке начала"""
+        rows = self._conn().execute(
+            "SELECT step, class_name, school, start, end, duration, retries FROM job_spans "
+            "WHERE job_id = ? ORDER BY start, id", (job_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def step_histograms(self):
+        """Накопительные гистограммы длительности шагов за все время:
+        {шаг: {'buckets': [(граница, число спанов <= границы)], 'sum', 'count', 'retries'}}
+        """
+        conn = self._conn()
+        histograms = {row['step']: {'count': row['count'], 'sum': row['sum'], 'retries': row['retries'],
+                                    'buckets': []}
+                      for row in conn.execute("SELECT step, count, sum, retries FROM step_metrics ORDER BY step")}
+        for row in conn.execute("SELECT step, le, count FROM step_metric_buckets ORDER BY step, le"):
+            if row['step'] in histograms:
+                histograms[row['step']]['buckets'].append((row['le'], row['count']))
+        return histograms
+
+    def job_counts(self):
+        """Число заданий по типу и статусу: {(kind, status): количество}"""
+        rows = self._conn().execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        return {(row[0], row[1]): row[2] for row in rows}
+
+
+class JobContext:
+    """Выполняющееся задание: доступ к параметрам, состоянию, логам и браузеру"""
+
+    def __init__(self, store, job, secrets=None):
+        self.store = store
+        self.id = job['id']
+        self.kind = job['kind']
+        self.params = job['params']
+        self.secrets = secrets or {}
+        self.scraper = None
+        # Пробуждение wait_command: команда или остановка пришли через этот процесс
+        self._wakeup = threading.Event()
+
+    @property
+    def state(self):
+        job = self.store.get_job(self.id)
+        return job['state'] if job else {}
+
+    def update(self, **fields):
+        self.store.update_state(self.id, **fields)
+
+    def log(self, source, message, level='info'):
+        self.store.add_log(self.id, source, message, level)
+
+    def should_stop(self):
+        return self.store.is_stop_requested(self.id)
+
+    def notify(self):
+        """Разбудить wait_command (после send_command или запроса остановки)"""
+        self._wakeup.set()
+
+    def wait_command(self, command, timeout, poll_interval=None):
+        """Ожидание команды (например, выбора школы); возвращает ее данные.
+        None - задание остановлено; TimeoutError - команда не пришла за timeout секунд.
+        Другие команды остаются в очереди.
+
+        Команды и остановка из этого процесса будят ожидание сразу (notify); пришедшие
+        через другой воркер gunicorn замечаются при проверке очереди раз в poll_interval
+        """
+        poll_interval = poll_interval or config.COMMAND_POLL_INTERVAL
+        deadline = time.monotonic() + timeout
+        while True:
+            # Сброс до проверки: notify после проверки не теряется
+            self._wakeup.clear()
+            # Транзакция записи (BEGIN IMMEDIATE) - только когда команда уже пришла
+            if self.store.has_command(self.id, command):
+                commands = self.store.take_commands(self.id, (command,))
+                if commands:
+                    return commands[0][1]
+            if self.should_stop():
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(command)
+            self._wakeup.wait(min(poll_interval, remaining))
+
+
+class JobScheduler:
+    """Планировщик заданий процесса.
+
+    Выполняет задания, созданные в этом процессе (учетные данные хранятся только
+    в его памяти), не более max_jobs одновременно на все процессы и не более
+    max_browsers экземпляров Chrome в процессе
+    """
+
+    def __init__(self, store, runners, max_jobs=None, max_browsers=None, poll_interval=1.0, stale_after=None,
+                 finalizers=None):
+        self.store = store
+        self.runners = runners  # {kind: функция(JobContext)}
+        # {команда: функция(job_id)} - выполняется после завершения задания, если команда пришла
+        # во время выполнения (например, удаление файлов, в которые обработчик еще мог писать)
+        self.finalizers = finalizers or {}
+        self.max_jobs = max_jobs or config.JOBS_MAX_CONCURRENT
+        self.browser_slots = threading.BoundedSemaphore(max_browsers or config.BROWSER_MAX_INSTANCES)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after or config.JOBS_STALE_SECONDS
+        self.owner = current_owner()
+        self._secrets = {}
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def submit(self, kind, params, secrets=None):
+        """Постановка задания в очередь; возвращает id"""
+        if kind not in self.runners:
+            raise ValueError(f'Неизвестный тип задания: {kind}')
+        job_id = self.store.create_job(kind, params, owner=self.owner)
+        with self._lock:
+            self._secrets[job_id] = secrets or {}
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return job_id
+
+    def get_context(self, job_id):
+        """Контекст задания, если оно выполняется в этом процессе"""
+        with self._lock:
+            return self._contexts.get(job_id)
+
+    def notify(self, job_id):
+        """Разбудить ожидание команды задания, если оно выполняется в этом процессе"""
+        context = self.get_context(job_id)
+        if context:
+            context.notify()
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                with self._lock:
+                    running_ids = list(self._contexts)
+                self.store.heartbeat(self.owner, running_ids)
+
+                while True:
+                    # Не захватываем задание, если в процессе нет свободного слота браузера
+                    if not self.browser_slots.acquire(blocking=False):
+                        break
+                    job = self.store.claim_next(self.owner, self.max_jobs, self.stale_after)
+                    if job is None:
+                        self.browser_slots.release()
+                        break
+                    threading.Thread(target=self._run, args=(job,), name=f"job-{job['id']}", daemon=True).start()
+            except Exception as e:
+                print(f"✗ Ошибка планировщика заданий: {e}")
+
+    def _run(self, job):
+        with self._lock:
+            context = JobContext(self.store, job, self._secrets.pop(job['id'], None))
+            self._contexts[job['id']] = context
+        _thread_local.job = context
+        try:
+            self.runners[job['kind']](context)
+        except Exception as e:
+            context.update(error=str(e))
+            context.log('SYSTEM', f'Ошибка задания: {str(e)}', 'error')
+            import traceback
+            traceback.print_exc()
+        finally:
+            # Итоговый статус определяется по состоянию, которое оставил обработчик
+            final = self.store.get_job(job['id'])
+            if final and final['status'] == 'running':
+                if final['state'].get('error'):
+                    status = 'error'
+                elif final['stop_requested']:
+                    status = 'stopped'
+                else:
+                    status = 'done'
+                self.store.set_status(job['id'], status)
+
+            # Команды, не полученные обработчиком. send_command принимает команды только у
+            # выполняющегося задания, поэтому после смены статуса новых команд уже не будет
+            for command in dict.fromkeys(command for command, _ in self.store.take_commands(job['id'])):
+                if command in self.finalizers:
+                    try:
+                        self.finalizers[command](job['id'])
+                    except Exception as e:
+                        print(f"✗ Ошибка завершения задания {job['id']} ({command}): {e}")
+
+            try:
+                if context.scraper and context.scraper.driver:
+                    context.scraper.driver.quit()
+            except Exception:
+                pass
+
+            _thread_local.job = None
+            with self._lock:
+                self._contexts.pop(job['id'], None)
+            self.browser_slots.release()
+            self._wakeup.set()
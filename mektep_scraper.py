@@ -6,6 +6,8 @@
 import time
 import os
 import re
+import functools
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -14,24 +16,65 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.cell_range import CellRange
 from dotenv import load_dotenv
+import requests
+
+import config
+from session_store import get_session_store
 
 # Загружаем переменные окружения
 load_dotenv()
 
+def timed_step(step):
+    """Декоратор: замер длительности метода MektepScraper для отчета о времени"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.timed(step):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarize_spans(spans):
+    """Сводка спанов по шагам: количество, повторы, суммарное, среднее и максимальное время
+    (по убыванию суммы)
+    """
+    summary = {}
+    for span in spans:
+        step, seconds = span['step'], span['duration']
+        item = summary.setdefault(step, {'step': step, 'count': 0, 'retries': 0, 'total': 0.0, 'max': 0.0})
+        item['count'] += 1
+        item['retries'] += span.get('retries') or 0
+        item['total'] += seconds
+        item['max'] = max(item['max'], seconds)
+    report = sorted(summary.values(), key=lambda item: item['total'], reverse=True)
+    for item in report:
+        item['avg'] = item['total'] / item['count']
+    return report
+
+
 class MektepScraper:
-    def __init__(self, login=None, password=None):
-        """Инициализация парсера"""
-        self.base_url = "https://mektep.edu.kz/_monitor/"
+    def __init__(self, login=None, password=None, site_url=None):
+        """Инициализация парсера (site_url - адрес платформы, по умолчанию config.BASE_URL)"""
+        self.site_url = (site_url or config.BASE_URL).rstrip("/")
+        self.base_url = f"{self.site_url}/_monitor/"
         self.login_url = f"{self.base_url}index.php"
         self.driver = None
         self.wait = None
         self.data = {}  # {parallel: {class_name: table_data}}
         self.login_credential = login  # Логин для авторизации
         self.password_credential = password  # Пароль для авторизации
+        self.timings = []  # Спаны шагов и ожиданий: {step, start, end, duration, class_name, school, retries}
+        self.span_attrs = {}  # Атрибуты, которые получают все спаны внутри span_scope()
+        self.spans_taken = 0  # Сколько спанов уже отдано take_new_spans()
         
+    @timed_step('setup_driver')
     def setup_driver(self):
         """Настройка браузера Chrome"""
         chrome_options = Options()
@@ -65,6 +108,105 @@ class MektepScraper:
         self.driver.set_page_load_timeout(30)
         print("✓ Браузер запущен")
     
+    @contextmanager
+    def timed(self, step, **attrs):
+        """Спан шага для отчета timing_report(): время начала и конца, класс, школа, повторы.
+        Возвращает словарь спана, в который можно дописать атрибуты (например, retries)
+        """
+        span = {'step': step, 'start': time.time(), 'end': None, 'duration': None,
+                'class_name': None, 'school': None, 'retries': 0}
+        span.update(self.span_attrs)
+        span.update(attrs)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span['duration'] = time.perf_counter() - start
+            span['end'] = span['start'] + span['duration']
+            self.timings.append(span)
+    
+    @contextmanager
+    def span_scope(self, **attrs):
+        """Атрибуты (class_name, school) для всех спанов внутри блока, включая вложенные ожидания"""
+        previous = self.span_attrs
+        self.span_attrs = {**previous, **attrs}
+        try:
+            yield
+        finally:
+            self.span_attrs = previous
+    
+    def reset_timings(self):
+        self.timings = []
+        self.span_attrs = {}
+        self.spans_taken = 0
+    
+    def take_new_spans(self):
+        """Спаны, завершившиеся после прошлого вызова (для сохранения в хранилище заданий)"""
+        spans = self.timings[self.spans_taken:]
+        self.spans_taken = len(self.timings)
+        return spans
+    
+    def timing_report(self):
+        """Сводка по шагам: количество, суммарное, среднее и максимальное время (по убыванию суммы)"""
+        return summarize_spans(self.timings)
+    
+    def print_timing_report(self):
+        print(f"\n{'='*60}")
+        print("ВРЕМЯ ПО ШАГАМ")
+        print(f"{'='*60}")
+        for item in self.timing_report():
+            print(f"{item['step']:<32} {item['count']:>4}x  всего {item['total']:7.2f} с  "
+                  f"среднее {item['avg']:6.2f} с  макс {item['max']:6.2f} с")
+    
+    def wait_for_ajax(self, timeout=10):
+        """Ожидание загрузки документа и завершения AJAX-запросов jQuery"""
+        with self.timed('wait:ajax'):
+            try:
+                WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(
+                    lambda d: d.execute_script(
+                        "return document.readyState === 'complete' && "
+                        "(typeof jQuery === 'undefined' || jQuery.active === 0)"
+                    )
+                )
+                return True
+            except TimeoutException:
+                return False
+    
+    def wait_for_rows_stable(self, css_selector, min_rows=1, stable_for=0.3, timeout=10, step='rows'):
+        """Ожидание, пока число строк по селектору достигнет min_rows и перестанет меняться.
+        
+        Таблицы дорисовываются скриптами страницы, поэтому одного появления первой строки мало
+        """
+        with self.timed(f'wait:{step}'):
+            deadline = time.time() + timeout
+            last_count = -1
+            stable_since = time.time()
+            while time.time() < deadline:
+                try:
+                    count = self.driver.execute_script(
+                        "return document.querySelectorAll(arguments[0]).length", css_selector
+                    )
+                except Exception:
+                    count = -1
+                now = time.time()
+                if count != last_count:
+                    last_count = count
+                    stable_since = now
+                elif count >= min_rows and now - stable_since >= stable_for:
+                    return True
+                time.sleep(0.05)
+            return last_count >= min_rows
+    
+    def wait_modal_closed(self, timeout=3):
+        """Ожидание закрытия модального окна 'Сапа'"""
+        with self.timed('wait:modal_closed'):
+            try:
+                WebDriverWait(self.driver, timeout, poll_frequency=0.05).until(lambda d: self.is_modal_closed())
+                return True
+            except TimeoutException:
+                return False
+    
+    @timed_step('open_page')
     def open_page(self, url):
         """Открытие страницы с умным ожиданием полной загрузки"""
         try:
@@ -110,8 +252,8 @@ class MektepScraper:
                 # Если не нашли специфичные элементы, продолжаем
                 print("⚠ Некоторые элементы не найдены, но продолжаем...")
             
-            # 4. Дополнительная пауза для полной загрузки динамического контента
-            time.sleep(2)
+            # 4. Ждем, пока динамический контент (строки таблиц) перестанет догружаться
+            self.wait_for_rows_stable("table tr", min_rows=0, timeout=5, step='page_rows')
             
             # 5. Проверяем, что URL изменился на ожидаемый
             current_url = self.driver.current_url
@@ -137,6 +279,7 @@ class MektepScraper:
             print(f"✗ Ошибка при открытии страницы: {e}")
             return False
     
+    @timed_step('login')
     def login(self):
         """Автоматическая авторизация с использованием логина и пароля"""
         try:
@@ -145,6 +288,10 @@ class MektepScraper:
                 print("✗ Логин и пароль не указаны")
                 return False
             
+            # Сначала пробуем восстановить сохраненную сессию, форма - только если она истекла
+            if self.restore_session():
+                return True
+            
             # Открываем страницу авторизации
             if not self.open_page(self.login_url):
                 return False
@@ -153,9 +300,6 @@ class MektepScraper:
             print("Выполняется автоматическая авторизация...")
             print(f"{'='*60}\n")
             
-            # Ждем загрузки страницы
-            time.sleep(2)
-            
             # Ищем поля для ввода логина и пароля
             # Пробуем разные варианты селекторов
             login_selectors = [
@@ -254,11 +398,9 @@ class MektepScraper:
             print("Заполнение формы авторизации...")
             login_field.clear()
             login_field.send_keys(self.login_credential)
-            time.sleep(0.5)
             
             password_field.clear()
             password_field.send_keys(self.password_credential)
-            time.sleep(0.5)
             
             # Нажимаем кнопку отправки
             print("Отправка формы...")
@@ -268,21 +410,26 @@ class MektepScraper:
                 # Если клик не сработал, пробуем через JavaScript
                 self.driver.execute_script("arguments[0].click();", submit_button)
             
-            # Ждем авторизации (проверяем каждые 2 секунды)
-            max_attempts = 60  # Максимум 2 минуты ожидания
-            attempt = 0
+            # Ждем авторизации (проверяем после завершения запросов страницы, не реже раза в 0.5 секунды)
+            start_time = time.time()
+            max_wait = 120  # Максимум 2 минуты ожидания
+            next_report = 10
             
-            while attempt < max_attempts:
-                time.sleep(2)
-                
-                # Проверяем авторизацию
-                if self.check_authentication_quick():
-                    print("✓ Авторизация успешна!")
-                    return True
-                
-                attempt += 1
-                if attempt % 5 == 0:  # Каждые 10 секунд выводим сообщение
-                    print(f"Ожидание завершения авторизации... ({attempt * 2} сек)")
+            with self.timed('wait:login'):
+                while time.time() - start_time < max_wait:
+                    self.wait_for_ajax(timeout=0.5)
+                    
+                    # Проверяем авторизацию
+                    if self.check_authentication_quick():
+                        print("✓ Авторизация успешна!")
+                        self.save_session()
+                        return True
+                    
+                    time.sleep(0.5)
+                    elapsed = time.time() - start_time
+                    if elapsed >= next_report:  # Каждые 10 секунд выводим сообщение
+                        print(f"Ожидание завершения авторизации... ({int(elapsed)} сек)")
+                        next_report += 10
             
             print("✗ Превышено время ожидания авторизации")
             return False
@@ -293,6 +440,65 @@ class MektepScraper:
             traceback.print_exc()
             return False
     
+    def _is_session_valid(self, cookies):
+        """Проверка сохраненных cookies одним HTTP-запросом (без браузера)"""
+        try:
+            response = requests.get(
+                self.login_url,
+                cookies={c['name']: c['value'] for c in cookies},
+                headers={'User-Agent': self.driver.execute_script("return navigator.userAgent")},
+                timeout=10
+            )
+        except requests.RequestException:
+            return False
+        if response.status_code != 200 or 'login' in response.url.lower():
+            return False
+        html = response.text
+        # На странице входа есть поле пароля, на страницах после входа - ссылки pg_*
+        has_password_field = re.search(r'type\s*=\s*["\']?password', html, re.IGNORECASE)
+        return not has_password_field and 'pg_' in html
+
+    def restore_session(self):
+        """Восстановление сохраненной сессии в браузер без заполнения формы авторизации"""
+        store = get_session_store()
+        if store is None:
+            return False
+        try:
+            cookies = store.load(self.login_credential, self.password_credential)
+            if not cookies:
+                return False
+            
+            if not self._is_session_valid(cookies):
+                print("⚠ Сохраненная сессия истекла, выполняется вход через форму")
+                store.delete(self.login_credential)
+                return False
+            
+            # Cookies можно добавить только для открытого домена
+            self.driver.get(self.login_url)
+            self.driver.delete_all_cookies()
+            for cookie in cookies:
+                try:
+                    self.driver.add_cookie(cookie)
+                except Exception:
+                    # Cookie другого домена/пути - пропускаем
+                    pass
+            
+            print("✓ Авторизация восстановлена из сохраненной сессии")
+            return True
+        except Exception as e:
+            print(f"⚠ Не удалось восстановить сессию: {e}")
+            return False
+
+    def save_session(self):
+        """Сохранение cookies после успешной авторизации"""
+        store = get_session_store()
+        if store is None:
+            return
+        try:
+            store.save(self.login_credential, self.password_credential, self.driver.get_cookies())
+        except Exception as e:
+            print(f"⚠ Не удалось сохранить сессию: {e}")
+    
     def check_authentication_quick(self):
         """Быстрая проверка успешности авторизации (без долгих ожиданий)"""
         try:
@@ -342,7 +548,7 @@ class MektepScraper:
         """Проверка успешности авторизации"""
         try:
             # Ждем изменения URL или появления элементов, указывающих на успешную авторизацию
-            time.sleep(2)
+            self.wait_for_ajax()
             current_url = self.driver.current_url
             
             # Проверяем, что мы не на странице логина
@@ -389,6 +595,7 @@ class MektepScraper:
             print(f"⚠ Ошибка при проверке авторизации: {e}")
             return False
     
+    @timed_step('navigate_to_reports')
     def navigate_to_reports(self):
         """Переход на страницу отчетов"""
         try:
@@ -405,7 +612,8 @@ class MektepScraper:
                 self.wait.until(
                     EC.presence_of_element_located((By.TAG_NAME, "table"))
                 )
-                time.sleep(2)  # Дополнительная пауза для полной загрузки таблицы
+                # Ждем, пока таблица школ полностью загрузится
+                self.wait_for_rows_stable("table tbody tr", step='schools_rows')
                 print("✓ Таблица школ загружена")
                 return True
             except TimeoutException:
@@ -416,6 +624,7 @@ class MektepScraper:
             print(f"✗ Ошибка при переходе на страницу отчетов: {e}")
             return False
     
+    @timed_step('get_schools_list')
     def get_schools_list(self):
         """Получение списка школ из таблицы на странице pg_reports.php"""
         try:
@@ -426,10 +635,17 @@ class MektepScraper:
                 self.wait.until(
                     EC.presence_of_element_located((By.TAG_NAME, "table"))
                 )
-                time.sleep(2)  # Дополнительная пауза для полной загрузки таблицы
+                self.wait_for_rows_stable("table tbody tr", step='schools_rows')
             except TimeoutException:
                 print("⚠ Таблица не найдена")
             
+            # Быстрый путь: весь список одним запросом к браузеру
+            schools = self._get_schools_list_fast()
+            if schools:
+                print(f"✓ Найдено школ: {len(schools)}")
+                return schools
+            print("⚠ Быстрое извлечение списка школ не сработало, используем поэлементный обход")
+            
             # Ищем все таблицы на странице
             tables = self.driver.find_elements(By.TAG_NAME, "table")
             
@@ -481,7 +697,7 @@ class MektepScraper:
                                             # Нормализуем URL (может быть относительным)
                                             if not school_url.startswith("http"):
                                                 if school_url.startswith("/"):
-                                                    school_url = f"https://mektep.edu.kz{school_url}"
+                                                    school_url = f"{self.site_url}{school_url}"
                                                 else:
                                                     school_url = f"{self.base_url}{school_url}"
                                             
@@ -514,7 +730,7 @@ class MektepScraper:
                                 # Нормализуем URL
                                 if not href.startswith("http"):
                                     if href.startswith("/"):
-                                        href = f"https://mektep.edu.kz{href}"
+                                        href = f"{self.site_url}{href}"
                                     else:
                                         href = f"{self.base_url}{href}"
                                 
@@ -535,6 +751,90 @@ class MektepScraper:
             print(f"✗ Ошибка при получении списка школ: {e}")
             return []
     
+    def _normalize_url(self, url):
+        """Абсолютный URL для ссылки со страницы мониторинга"""
+        if url.startswith("http"):
+            return url
+        if url.startswith("/"):
+            return f"{self.site_url}{url}"
+        return f"{self.base_url}{url}"
+    
+    def _get_schools_list_fast(self):
+        """Извлечение списка школ одним execute_script (вместо запросов на каждую строку и ячейку).
+        
+        Повторяет логику поэлементного обхода: таблица с заголовком "Районы/города/школы",
+        ссылка в столбце школ; если такой таблицы нет - все ссылки на школы из таблиц.
+        Возвращает список школ или None при ошибке
+        """
+        script = """
+            function isSchoolHeader(text) {
+                return text.indexOf('Районы') !== -1 || text.indexOf('города') !== -1 ||
+                       text.indexOf('школы') !== -1 || text.indexOf('Школа') !== -1;
+            }
+            var tables = document.querySelectorAll('table');
+            var schools = [];
+            for (var t = 0; t < tables.length; t++) {
+                var headers = Array.prototype.map.call(
+                    tables[t].querySelectorAll('th'), function(th) { return th.innerText.trim(); }
+                );
+                if (!headers.some(isSchoolHeader)) continue;
+                var col = headers.findIndex(isSchoolHeader);
+                if (col < 0) col = 0;
+                var rows = tables[t].querySelectorAll('tr');
+                for (var r = 1; r < rows.length; r++) {
+                    var cells = rows[r].querySelectorAll('td');
+                    if (cells.length <= col) continue;
+                    var link = cells[col].querySelector('a');
+                    if (!link) continue;
+                    var name = link.innerText.trim();
+                    var url = link.href || link.getAttribute('href');
+                    if (name && url) schools.push({name: name, url: url});
+                }
+                return {schools: schools, byHeader: true};
+            }
+            // Таблица не найдена по заголовкам - собираем все ссылки на школы
+            var seen = {};
+            for (var t = 0; t < tables.length; t++) {
+                var links = tables[t].querySelectorAll('a');
+                for (var i = 0; i < links.length; i++) {
+                    var href = links[i].href || links[i].getAttribute('href');
+                    var text = links[i].innerText.trim();
+                    if (href && (href.indexOf('id_mektep=') !== -1 || href.indexOf('pg_reports') !== -1) && text && !seen[href]) {
+                        seen[href] = true;
+                        schools.push({name: text, url: href});
+                    }
+                }
+            }
+            return {schools: schools, byHeader: false};
+        """
+        try:
+            result = self.driver.execute_script(script)
+        except Exception as e:
+            print(f"⚠ Ошибка быстрого извлечения списка школ: {e}")
+            return None
+        if not result:
+            return None
+        
+        if result.get('byHeader'):
+            print("✓ Найдена таблица со школами")
+        else:
+            print("Поиск школ альтернативным методом...")
+        
+        schools = []
+        seen_urls = set()
+        for item in result.get('schools') or []:
+            url = self._normalize_url(item['url'])
+            if not result.get('byHeader') and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            schools.append({
+                "index": len(schools) + 1,
+                "name": item['name'],
+                "url": url
+            })
+        return schools
+    
+    @timed_step('select_school')
     def select_school(self, school_index=None):
         """Выбор школы из списка и переход по ссылке"""
         try:
@@ -607,6 +907,7 @@ class MektepScraper:
             print(f"✗ Ошибка при выборе школы: {e}")
             return False
     
+    @timed_step('get_classes_list')
     def get_classes_list(self):
         """Получение списка классов из навигационных вкладок (pills)"""
         try:
@@ -621,7 +922,7 @@ class MektepScraper:
                         EC.presence_of_element_located((By.CSS_SELECTOR, "ul.nav.nav-pills"))
                     )
                 )
-                time.sleep(1)  # Дополнительная пауза
+                self.wait_for_ajax()
             except TimeoutException:
                 print("⚠ Навигационные вкладки не найдены")
             
@@ -690,14 +991,16 @@ class MektepScraper:
             traceback.print_exc()
             return []
     
+    @timed_step('select_class_tab')
     def select_class_tab(self, class_number):
         """Выбор вкладки класса (клик по вкладке с номером класса)"""
         try:
             print(f"\nВыбор вкладки класса: {class_number}")
             
             # Ищем вкладку с нужным номером класса
-            # Ищем ссылку, которая содержит номер класса
-            link_xpath = f"//ul[@id='pills-tab']//a[contains(text(), '{class_number}')] | //ul[contains(@class, 'nav-pills')]//a[contains(text(), '{class_number}')]"
+            # Текст вкладки начинается с номера ("11  класс"), поэтому "1" не должен совпадать с "11"
+            text_match = f"[normalize-space(text())='{class_number}' or starts-with(normalize-space(text()), '{class_number} ')]"
+            link_xpath = f"//ul[@id='pills-tab']//a{text_match} | //ul[contains(@class, 'nav-pills')]//a{text_match}"
             
             try:
                 class_link = self.wait.until(
@@ -706,20 +1009,20 @@ class MektepScraper:
                 
                 # Прокручиваем к элементу
                 self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", class_link)
-                time.sleep(0.5)
                 
                 # Используем JavaScript для клика, чтобы обойти проблему с перекрытием
                 self.driver.execute_script("arguments[0].click();", class_link)
                 print(f"✓ Клик по вкладке '{class_number} класс' выполнен (через JavaScript)")
                 
-                # Ждем загрузки таблицы с классами
-                time.sleep(2)
+                # Ждем загрузки таблицы с классами (AJAX вкладки)
+                self.wait_for_ajax()
                 
                 # Ждем появления таблицы с классами
                 try:
                     self.wait.until(
                         EC.presence_of_element_located((By.CSS_SELECTOR, "table.table-striped, table.table-bordered"))
                     )
+                    self.wait_for_rows_stable("table.table-striped tbody tr, table.table-bordered tbody tr", step='class_rows')
                     print("✓ Таблица с классами загружена")
                 except TimeoutException:
                     print("⚠ Таблица не найдена, но продолжаем...")
@@ -734,6 +1037,7 @@ class MektepScraper:
             print(f"✗ Ошибка при выборе вкладки класса: {e}")
             return False
     
+    @timed_step('get_class_groups_from_table')
     def get_class_groups_from_table(self):
         """Получение списка классов (групп) из таблицы после выбора вкладки класса"""
         try:
@@ -744,10 +1048,17 @@ class MektepScraper:
                 self.wait.until(
                     EC.presence_of_element_located((By.CSS_SELECTOR, "table.table-striped, table.table-bordered"))
                 )
-                time.sleep(1)
+                self.wait_for_rows_stable("table.table-striped tbody tr, table.table-bordered tbody tr", step='class_rows')
             except TimeoutException:
                 print("⚠ Таблица не найдена")
             
+            # Быстрый путь: вся таблица, кнопки и их атрибуты одним запросом к браузеру
+            class_groups = self._get_class_groups_fast()
+            if class_groups:
+                print(f"✓ Найдено классов в таблице: {len(class_groups)}")
+                return class_groups
+            print("⚠ Быстрое извлечение таблицы классов не сработало, используем поэлементный обход")
+            
             class_groups = []
             
             # Ищем таблицу с классами
@@ -785,37 +1096,8 @@ class MektepScraper:
                         print(f"  Заголовки: {header_texts}")
                         
                         # Находим индексы столбцов
-                        class_col_idx = None
-                        type_col_idx = None
-                        language_col_idx = None
-                        shift_col_idx = None
-                        teacher_col_idx = None
-                        students_col_idx = None
-                        actions_col_idx = None
-                        
-                        for idx, header_text in enumerate(header_texts):
-                            header_lower = header_text.lower()
-                            if "класс" in header_lower and "тип" not in header_lower and class_col_idx is None:
-                                class_col_idx = idx
-                            elif "тип" in header_lower and "класс" in header_lower:
-                                type_col_idx = idx
-                            elif "язык" in header_lower:
-                                language_col_idx = idx
-                            elif "смена" in header_lower:
-                                shift_col_idx = idx
-                            elif "руководитель" in header_lower or "классный" in header_lower:
-                                teacher_col_idx = idx
-                            elif "учащиеся" in header_lower:
-                                students_col_idx = idx
-                            elif "действия" in header_lower:
-                                actions_col_idx = idx
-                        
-                        # Если не нашли индекс класса, используем первый столбец
-                        if class_col_idx is None:
-                            class_col_idx = 0
-                        
-                        print(f"  Индексы столбцов: Класс={class_col_idx}, Тип={type_col_idx}, Язык={language_col_idx}, "
-                              f"Смена={shift_col_idx}, Руководитель={teacher_col_idx}, Учащиеся={students_col_idx}, Действия={actions_col_idx}")
+                        columns = self._find_class_columns(header_texts)
+                        actions_col_idx = columns['actions']
                         
                         # Получаем все строки таблицы
                         rows = table.find_elements(By.TAG_NAME, "tr")
@@ -831,63 +1113,26 @@ class MektepScraper:
                                     continue
                                 
                                 # Извлекаем данные из ячеек
-                                class_name = ""
-                                if class_col_idx is not None and len(cells) > class_col_idx:
-                                    class_name = cells[class_col_idx].text.strip()
-                                
-                                class_type = ""
-                                if type_col_idx is not None and len(cells) > type_col_idx:
-                                    class_type = cells[type_col_idx].text.strip()
-                                
-                                language = ""
-                                if language_col_idx is not None and len(cells) > language_col_idx:
-                                    language = cells[language_col_idx].text.strip()
-                                
-                                shift = ""
-                                if shift_col_idx is not None and len(cells) > shift_col_idx:
-                                    shift = cells[shift_col_idx].text.strip()
-                                
-                                teacher = ""
-                                if teacher_col_idx is not None and len(cells) > teacher_col_idx:
-                                    teacher = cells[teacher_col_idx].text.strip()
-                                
-                                students = ""
-                                if students_col_idx is not None and len(cells) > students_col_idx:
-                                    students = cells[students_col_idx].text.strip()
-                                
-                                # Извлекаем литера класса из названия (например, "11 «А»" -> "А")
-                                class_letter = ""
-                                if class_name:
-                                    letter_match = re.search(r'[«"]?([А-ЯЁA-Z])[«"]?', class_name)
-                                    if letter_match:
-                                        class_letter = letter_match.group(1)
+                                cell_texts = [cell.text.strip() for cell in cells]
                                 
                                 # Ищем кнопку в столбце "Действия"
                                 button = None
+                                button_attrs = {}
                                 if actions_col_idx is not None and len(cells) > actions_col_idx:
                                     try:
                                         button = cells[actions_col_idx].find_element(By.TAG_NAME, "button")
+                                        button_attrs = self._get_element_attributes(button)
                                     except NoSuchElementException:
                                         pass
                                 
                                 # Добавляем класс, если есть название
-                                if class_name:
-                                    class_groups.append({
-                                        "index": len(class_groups) + 1,
-                                        "name": class_name,
-                                        "letter": class_letter,
-                                        "type": class_type,
-                                        "language": language,
-                                        "shift": shift,
-                                        "teacher": teacher,
-                                        "students": students,
-                                        "button": button
-                                    })
-                                    print(f"  Найден класс: {class_name} (Литера: {class_letter})")
+                                group = self._make_class_group(cell_texts, columns, button, button_attrs, len(class_groups) + 1)
+                                if group:
+                                    class_groups.append(group)
+                                    print(f"  Найден класс: {group['name']} (Литера: {group['letter']})")
                                 else:
                                     # Отладочная информация
                                     if row_idx < 5:  # Выводим только для первых строк
-                                        cell_texts = [cell.text.strip() for cell in cells]
                                         print(f"  Строка {row_idx}: {cell_texts} (нет названия класса)")
                                         
                             except Exception as e:
@@ -913,6 +1158,199 @@ class MektepScraper:
             traceback.print_exc()
             return []
     
+    @staticmethod
+    def _find_class_columns(header_texts):
+        """Индексы столбцов таблицы классов по заголовкам"""
+        columns = {'class': None, 'type': None, 'language': None, 'shift': None,
+                   'teacher': None, 'students': None, 'actions': None}
+        for idx, header_text in enumerate(header_texts):
+            header_lower = header_text.lower()
+            if "класс" in header_lower and "тип" not in header_lower and columns['class'] is None:
+                columns['class'] = idx
+            elif "тип" in header_lower and "класс" in header_lower:
+                columns['type'] = idx
+            elif "язык" in header_lower:
+                columns['language'] = idx
+            elif "смена" in header_lower:
+                columns['shift'] = idx
+            elif "руководитель" in header_lower or "классный" in header_lower:
+                columns['teacher'] = idx
+            elif "учащиеся" in header_lower:
+                columns['students'] = idx
+            elif "действия" in header_lower:
+                columns['actions'] = idx
+        
+        # Если не нашли индекс класса, используем первый столбец
+        if columns['class'] is None:
+            columns['class'] = 0
+        
+        print(f"  Индексы столбцов: Класс={columns['class']}, Тип={columns['type']}, Язык={columns['language']}, "
+              f"Смена={columns['shift']}, Руководитель={columns['teacher']}, Учащиеся={columns['students']}, "
+              f"Действия={columns['actions']}")
+        return columns
+    
+    @staticmethod
+    def _make_class_group(cell_texts, columns, button, button_attrs, index):
+        """Описание класса по текстам ячеек строки; None, если в строке нет названия класса"""
+        def cell(key):
+            idx = columns[key]
+            if idx is not None and len(cell_texts) > idx:
+                return cell_texts[idx]
+            return ""
+        
+        class_name = cell('class')
+        if not class_name:
+            return None
+        
+        # Извлекаем литера класса из названия (например, "11 «А»" -> "А")
+        class_letter = ""
+        letter_match = re.search(r'[«"]?([А-ЯЁA-Z])[«"]?', class_name)
+        if letter_match:
+            class_letter = letter_match.group(1)
+        
+        return {
+            "index": index,
+            "name": class_name,
+            "letter": class_letter,
+            "type": cell('type'),
+            "language": cell('language'),
+            "shift": cell('shift'),
+            "teacher": cell('teacher'),
+            "students": cell('students'),
+            "button": button,
+            "button_attrs": button_attrs  # Атрибуты кнопки (для HTTP-движка)
+        }
+    
+    def _get_class_groups_fast(self):
+        """Извлечение таблицы классов одним execute_script.
+        
+        Возвращает тексты ячеек, кнопки "Успеваемость" (WebElement) и их атрибуты
+        для всех строк сразу. None при ошибке или если таблица не найдена
+        """
+        script = """
+            function texts(cells) {
+                return Array.prototype.map.call(cells, function(c) { return c.innerText.trim(); });
+            }
+            function rowHeaders(row) {
+                var cells = row.querySelectorAll('td');
+                return cells.length ? cells : row.querySelectorAll('th');
+            }
+            var tables = document.querySelectorAll('table.table-striped, table.table-bordered');
+            for (var t = 0; t < tables.length; t++) {
+                var table = tables[t];
+                // Заголовки - сначала в thead, потом в первой строке таблицы
+                var headers = [];
+                var thead = table.querySelector('thead');
+                if (thead && thead.querySelector('tr')) {
+                    headers = texts(rowHeaders(thead.querySelector('tr')));
+                }
+                var rows = table.querySelectorAll('tr');
+                if (!headers.length && rows.length) {
+                    headers = texts(rowHeaders(rows[0]));
+                }
+                if (!headers.length) continue;
+                if (headers.indexOf('Класс') === -1 && headers.join(' ').toLowerCase().indexOf('класс') === -1) continue;
+                
+                var result = [];
+                for (var r = (rows.length > 1 ? 1 : 0); r < rows.length; r++) {
+                    var cells = rows[r].querySelectorAll('td');
+                    if (!cells.length) continue;
+                    // Кнопка и ее атрибуты для каждой ячейки: столбец "Действия" определяется в Python
+                    var buttons = [];
+                    var attrs = [];
+                    for (var c = 0; c < cells.length; c++) {
+                        var button = cells[c].querySelector('button');
+                        var buttonAttrs = {};
+                        if (button) {
+                            for (var i = 0; i < button.attributes.length; i++) {
+                                buttonAttrs[button.attributes[i].name] = button.attributes[i].value;
+                            }
+                        }
+                        buttons.push(button);
+                        attrs.push(buttonAttrs);
+                    }
+                    result.push({cells: texts(cells), buttons: buttons, attrs: attrs});
+                }
+                return {headers: headers, rows: result};
+            }
+            return null;
+        """
+        try:
+            result = self.driver.execute_script(script)
+        except Exception as e:
+            print(f"⚠ Ошибка быстрого извлечения таблицы классов: {e}")
+            return None
+        if not result:
+            return None
+        
+        header_texts = result['headers']
+        print(f"✓ Найдена таблица с классами (столбцов: {len(header_texts)})")
+        print(f"  Заголовки: {header_texts}")
+        columns = self._find_class_columns(header_texts)
+        
+        actions_col_idx = columns['actions']
+        class_groups = []
+        for row in result['rows']:
+            button = None
+            button_attrs = {}
+            if actions_col_idx is not None and len(row['buttons']) > actions_col_idx:
+                button = row['buttons'][actions_col_idx]
+                button_attrs = row['attrs'][actions_col_idx] if button else {}
+            group = self._make_class_group(row['cells'], columns, button, button_attrs, len(class_groups) + 1)
+            if group:
+                class_groups.append(group)
+                print(f"  Найден класс: {group['name']} (Литера: {group['letter']})")
+        return class_groups
+    
+    def _get_element_attributes(self, element):
+        """Получение всех атрибутов элемента за один запрос"""
+        try:
+            return self.driver.execute_script("""
+                var attrs = {};
+                for (var i = 0; i < arguments[0].attributes.length; i++) {
+                    var attr = arguments[0].attributes[i];
+                    attrs[attr.name] = attr.value;
+                }
+                return attrs;
+            """, element) or {}
+        except Exception:
+            return {}
+    
+    def capture_sapa_request(self, button):
+        """Перехват AJAX-запроса, который загружает таблицу 'Сапа' в модальное окно.
+        
+        Устанавливает перехватчик XHR, кликает по кнопке 'Успеваемость' и
+        возвращает последний запрос {method, url, body} или None.
+        Модальное окно после перехвата закрывается.
+        """
+        from sapa_http import XHR_RECORDER_JS
+        
+        try:
+            self.driver.execute_script(XHR_RECORDER_JS)
+            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
+            self.driver.execute_script("arguments[0].click();", button)
+            
+            # Ждем, пока запрос будет отправлен и таблица появится в модальном окне
+            self.wait.until(lambda d: d.execute_script("return window.__sapaRequests.length") > 0)
+            self.wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, "#classSapa table tbody tr")) > 0)
+            
+            captured = self.driver.execute_script("return window.__sapaRequests")
+            if not captured:
+                return None
+            
+            sapa_request = captured[-1]
+            print(f"✓ Перехвачен запрос таблицы 'Сапа': {sapa_request['method']} {sapa_request['url']}")
+            return sapa_request
+        except TimeoutException:
+            print("⚠ AJAX-запрос таблицы 'Сапа' не перехвачен (таблица загружается без AJAX?)")
+            return None
+        except Exception as e:
+            print(f"⚠ Ошибка при перехвате запроса таблицы 'Сапа': {e}")
+            return None
+        finally:
+            if self.is_modal_open():
+                self.close_modal()
+    
     def select_class_group(self, class_groups, class_group_index=None):
         """Выбор конкретного класса из списка и клик по кнопке 'Успеваемость'"""
         try:
@@ -959,15 +1397,11 @@ class MektepScraper:
                 try:
                     # Прокручиваем к кнопке
                     self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", selected_group['button'])
-                    time.sleep(0.5)
                     
                     # Используем JavaScript для клика, чтобы обойти проблемы с перекрытием
                     self.driver.execute_script("arguments[0].click();", selected_group['button'])
                     print("✓ Клик по кнопке 'Успеваемость' выполнен")
                     
-                    # Ждем открытия модального окна
-                    time.sleep(1)
-                    
                     # Ждем появления и открытия модального окна
                     try:
                         # Ждем, пока модальное окно станет видимым (Bootstrap добавляет класс "show")
@@ -979,14 +1413,12 @@ class MektepScraper:
                             )
                         )
                         
-                        # Дополнительно ждем загрузки содержимого (таблица может загружаться через AJAX)
-                        time.sleep(2)
-                        
-                        # Ждем появления таблицы внутри модального окна
+                        # Ждем появления таблицы внутри модального окна (таблица загружается через AJAX)
                         try:
                             self.wait.until(
                                 EC.presence_of_element_located((By.CSS_SELECTOR, "#classSapa table"))
                             )
+                            self.wait_for_rows_stable("#classSapa table tbody tr", step='modal_rows')
                             print("✓ Модальное окно 'Сапа' открыто и таблица загружена")
                         except TimeoutException:
                             print("⚠ Таблица не появилась в модальном окне, но продолжаем...")
@@ -1063,9 +1495,8 @@ class MektepScraper:
                 if close_button:
                     # Используем JavaScript для клика
                     self.driver.execute_script("arguments[0].click();", close_button)
-                    time.sleep(0.2)  # Уменьшена пауза
-                    # Проверяем, что закрылось
-                    if self.is_modal_closed():
+                    # Проверяем, что закрылось (анимация Bootstrap)
+                    if self.wait_modal_closed(timeout=1):
                         print("✓ Модальное окно закрыто")
                         return True
             except NoSuchElementException:
@@ -1077,8 +1508,7 @@ class MektepScraper:
                 backdrop = self.driver.find_element(By.CSS_SELECTOR, ".modal-backdrop")
                 if backdrop:
                     self.driver.execute_script("arguments[0].click();", backdrop)
-                    time.sleep(0.2)  # Уменьшена пауза
-                    if self.is_modal_closed():
+                    if self.wait_modal_closed(timeout=1):
                         print("✓ Модальное окно закрыто (клик по backdrop)")
                         return True
             except NoSuchElementException:
@@ -1087,10 +1517,9 @@ class MektepScraper:
             # Последняя попытка - через JavaScript закрыть модальное окно
             try:
                 self.driver.execute_script("$('#classSapa').modal('hide');")
-                time.sleep(0.3)  # Уменьшена пауза
                 # Ждем, пока модальное окно закроется (с таймаутом)
-                wait = WebDriverWait(self.driver, 3)  # Уменьшен таймаут
-                wait.until(lambda d: self.is_modal_closed())
+                if not self.wait_modal_closed(timeout=3):
+                    raise TimeoutException()
                 print("✓ Модальное окно закрыто (JavaScript)")
                 return True
             except TimeoutException:
@@ -1109,7 +1538,6 @@ class MektepScraper:
                         }
                         document.body.classList.remove('modal-open');
                     """)
-                    time.sleep(0.2)  # Уменьшена пауза
                     if self.is_modal_closed():
                         print("✓ Модальное окно закрыто (принудительно)")
                         return True
@@ -1148,12 +1576,10 @@ class MektepScraper:
                             EC.presence_of_element_located((By.CSS_SELECTOR, "#classSapa .modal-content table"))
                         )
                     )
-                    # Ждем, пока таблица полностью загрузится (проверяем наличие строк)
-                    self.wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, "#classSapa table tbody tr")) > 0)
-                    time.sleep(0.3)  # Минимальная пауза для стабильности
+                    # Ждем, пока таблица полностью загрузится (строки перестанут добавляться)
+                    self.wait_for_rows_stable("#classSapa table tbody tr", step='modal_rows')
                 except TimeoutException:
                     print("⚠ Таблица не появилась в модальном окне, ищем альтернативным способом...")
-                    time.sleep(0.5)  # Небольшая пауза перед альтернативным поиском
                 
             except TimeoutException:
                 print("✗ Модальное окно не найдено")
@@ -1626,7 +2052,9 @@ class MektepScraper:
     
     def save_to_excel(self, table_data, class_name, output_file="success_data.xlsx"):
         """Сохранение данных в Excel с сохранением структуры таблицы
-        Добавляет новый лист в существующий файл или создает новый файл
+        Добавляет новый лист в существующий файл или создает новый файл.
+        Файл перечитывается и перезаписывается целиком, поэтому для всех классов
+        параллели используйте SuccessDataWriter (одна потоковая запись)
         """
         try:
             print(f"\nСохранение данных в Excel: {output_file}")
@@ -1665,16 +2093,9 @@ class MektepScraper:
             headers = table_data["headers"]
             data = table_data["data"]
             
-            # Стили для заголовков
-            header_font = Font(bold=True, size=11)
-            header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
+            # Оформление - общие именованные стили книги (как в SuccessDataWriter)
+            SuccessDataWriter.register_styles(wb)
+            header_style = SuccessDataWriter.HEADER_STYLE
             
             # Записываем заголовки
             current_row = 1
@@ -1684,19 +2105,11 @@ class MektepScraper:
             # Первая строка заголовков
             col = 1
             # Первая колонка - пустая (будет объединена с rowspan=2)
-            ws.cell(row=current_row, column=col, value=first_col_name)
-            ws.cell(row=current_row, column=col).font = header_font
-            ws.cell(row=current_row, column=col).fill = header_fill
-            ws.cell(row=current_row, column=col).alignment = header_alignment
-            ws.cell(row=current_row, column=col).border = border
+            ws.cell(row=current_row, column=col, value=first_col_name).style = header_style
             col += 1
             
             # Вторая колонка - "Аты-жөні" (будет объединена с rowspan=2)
-            ws.cell(row=current_row, column=col, value=second_col_name)
-            ws.cell(row=current_row, column=col).font = header_font
-            ws.cell(row=current_row, column=col).fill = header_fill
-            ws.cell(row=current_row, column=col).alignment = header_alignment
-            ws.cell(row=current_row, column=col).border = border
+            ws.cell(row=current_row, column=col, value=second_col_name).style = header_style
             col += 1
             
             # Предметы с colspan (включая пустые!)
@@ -1712,10 +2125,7 @@ class MektepScraper:
                     
                     # Записываем текст предмета (может быть пустым)
                     cell = ws.cell(row=current_row, column=start_col, value=header["text"] if header["text"] else "")
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = header_alignment
-                    cell.border = border
+                    cell.style = header_style
                     
                     col = end_col + 1
             
@@ -1737,29 +2147,20 @@ class MektepScraper:
             
             for quarter in all_quarters:
                 cell = ws.cell(row=current_row, column=col, value=quarter)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-                cell.border = border
+                cell.style = header_style
                 col += 1
             
             # Объединяем первую колонку для двух строк заголовков (пустая)
             ws.merge_cells(start_row=1, start_column=1, end_row=2, end_column=1)
             first_cell = ws.cell(row=1, column=1)
             first_cell.value = first_col_name
-            first_cell.font = header_font
-            first_cell.fill = header_fill
-            first_cell.alignment = header_alignment
-            first_cell.border = border
+            first_cell.style = header_style
             
             # Объединяем вторую колонку для двух строк заголовков ("Аты-жөні")
             ws.merge_cells(start_row=1, start_column=2, end_row=2, end_column=2)
             second_cell = ws.cell(row=1, column=2)
             second_cell.value = second_col_name
-            second_cell.font = header_font
-            second_cell.fill = header_fill
-            second_cell.alignment = header_alignment
-            second_cell.border = border
+            second_cell.style = header_style
             
             # Записываем данные
             current_row = 3
@@ -1771,8 +2172,7 @@ class MektepScraper:
                 if len(row_data) > 0:
                     num_value = row_data[0]
                     cell = ws.cell(row=current_row, column=col, value=num_value)
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                    cell.border = border
+                    cell.style = SuccessDataWriter.CENTER_STYLE
                     col += 1
                 else:
                     col += 1
@@ -1781,8 +2181,7 @@ class MektepScraper:
                 if len(row_data) > 1:
                     fio_value = row_data[1]
                     cell = ws.cell(row=current_row, column=col, value=fio_value)
-                    cell.alignment = Alignment(horizontal="left", vertical="center")
-                    cell.border = border
+                    cell.style = SuccessDataWriter.LEFT_STYLE
                     col += 1
                 else:
                     col += 1
@@ -1791,8 +2190,7 @@ class MektepScraper:
                 for data_idx in range(2, len(row_data)):
                     cell_value = row_data[data_idx]
                     cell = ws.cell(row=current_row, column=col, value=cell_value)
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                    cell.border = border
+                    cell.style = SuccessDataWriter.CENTER_STYLE
                     col += 1
                 
                 current_row += 1
@@ -1827,6 +2225,163 @@ class MektepScraper:
             return False
 
 
+def _excel_sheet_name(class_name):
+    """Имя листа для класса (без кавычек и "/", не длиннее 31 символа - ограничение Excel)"""
+    sheet_name = class_name.replace("«", "").replace("»", "").replace('"', "").replace("/", "_")
+    return sheet_name[:31]
+
+
+class SuccessDataWriter:
+    """Накопление таблиц "Сапа" классов в памяти и запись success_data.xlsx одним проходом.
+    
+    Вместо перечитывания и перезаписи файла для каждого класса (как save_to_excel)
+    книга создается в режиме write-only при save(): строки пишутся потоком,
+    оформление задается общими именованными стилями, а ширина колонок считается
+    по данным в памяти. Структура листов совпадает с save_to_excel
+    """
+    
+    HEADER_STYLE = 'success_header'
+    CENTER_STYLE = 'success_center'
+    LEFT_STYLE = 'success_left'
+    
+    def __init__(self, output_file="success_data.xlsx"):
+        self.output_file = output_file
+        self.sheets = {}  # {имя листа: table_data} в порядке добавления
+    
+    def __len__(self):
+        return len(self.sheets)
+    
+    def add(self, table_data, class_name):
+        """Добавление таблицы класса (лист с тем же именем перезаписывается)"""
+        if not table_data or not table_data.get("headers") or not table_data.get("data"):
+            print("✗ Нет данных для сохранения")
+            return False
+        
+        sheet_name = _excel_sheet_name(class_name)
+        if sheet_name in self.sheets:
+            print(f"⚠ Лист '{sheet_name}' уже существует, будет перезаписан")
+            # Как и при перезаписи листа в файле, новый лист оказывается последним
+            del self.sheets[sheet_name]
+        self.sheets[sheet_name] = table_data
+        return True
+    
+    @classmethod
+    def register_styles(cls, wb):
+        """Добавление стилей листа "Сапа" в книгу (если их там еще нет)"""
+        for style in cls._named_styles():
+            if style.name not in wb.named_styles:
+                wb.add_named_style(style)
+    
+    @classmethod
+    def _named_styles(cls):
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        return [
+            NamedStyle(
+                name=cls.HEADER_STYLE,
+                font=Font(bold=True, size=11),
+                fill=PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"),
+                alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+                border=border
+            ),
+            NamedStyle(name=cls.CENTER_STYLE, font=DEFAULT_FONT, alignment=Alignment(horizontal="center", vertical="center"),
+                       border=border),
+            NamedStyle(name=cls.LEFT_STYLE, font=DEFAULT_FONT, alignment=Alignment(horizontal="left", vertical="center"),
+                       border=border),
+        ]
+    
+    @staticmethod
+    def _sheet_rows(table_data):
+        """Строки листа как списки (значение, стиль) и диапазоны объединения"""
+        headers = table_data["headers"]
+        header = SuccessDataWriter.HEADER_STYLE
+        first_col_name = headers.get("first_col_name", "")  # Первая колонка без заголовка
+        second_col_name = headers.get("second_col_name", "Аты-жөні")  # Вторая колонка - ФИО
+        
+        # Первая колонка и "Аты-жөні" объединяются на две строки заголовков
+        merges = [(1, 1, 2, 1), (1, 2, 2, 2)]  # (start_row, start_col, end_row, end_col)
+        
+        # Первая строка заголовков: предметы с colspan (включая пустые!)
+        first_row = [(first_col_name, header), (second_col_name, header)]
+        for subject in headers.get("first_row") or []:
+            start_col = len(first_row) + 1
+            first_row.append((subject["text"] if subject["text"] else "", header))
+            if subject["colspan"] > 1:
+                merges.append((1, start_col, 1, start_col + subject["colspan"] - 1))
+                first_row.extend([(None, None)] * (subject["colspan"] - 1))
+        
+        # Вторая строка заголовков: четверти для каждого предмета
+        all_quarters = headers.get("second_row", [])
+        total_subject_cols = sum(h.get("colspan", 1) for h in headers.get("first_row", []))
+        if len(all_quarters) != total_subject_cols:
+            print(f"⚠ Несоответствие: предметов (с учетом colspan): {total_subject_cols}, четвертей: {len(all_quarters)}")
+        second_row = [(None, None), (None, None)] + [(quarter, header) for quarter in all_quarters]
+        
+        rows = [first_row, second_row]
+        
+        # Данные: № и оценки по центру, ФИО по левому краю
+        center = SuccessDataWriter.CENTER_STYLE
+        for row_data in table_data["data"]:
+            row = []
+            for data_idx, value in enumerate(row_data):
+                row.append((value, SuccessDataWriter.LEFT_STYLE if data_idx == 1 else center))
+            rows.append(row)
+        
+        return rows, merges
+    
+    def save(self):
+        """Запись всех накопленных листов в файл"""
+        if not self.sheets:
+            print("✗ Нет данных для сохранения")
+            return False
+        try:
+            print(f"\nСохранение данных в Excel: {self.output_file}")
+            wb = Workbook(write_only=True)
+            self.register_styles(wb)
+            
+            for sheet_name, table_data in self.sheets.items():
+                rows, merges = self._sheet_rows(table_data)
+                ws = wb.create_sheet(title=sheet_name)
+                
+                # Ширина колонок и объединения задаются до записи строк
+                widths = {}
+                for row in rows:
+                    for col_idx, (value, _) in enumerate(row, 1):
+                        if value:
+                            widths[col_idx] = max(widths.get(col_idx, 0), len(str(value)))
+                max_column = max(len(row) for row in rows)
+                for col_idx in range(1, max_column + 1):
+                    ws.column_dimensions[get_column_letter(col_idx)].width = min(widths.get(col_idx, 0) + 2, 50)
+                for start_row, start_col, end_row, end_col in merges:
+                    ws.merged_cells.add(CellRange(min_col=start_col, min_row=start_row, max_col=end_col, max_row=end_row))
+                
+                for row in rows:
+                    cells = []
+                    for value, style in row:
+                        if style is None:
+                            cells.append(None)
+                            continue
+                        cell = WriteOnlyCell(ws, value=value)
+                        cell.style = style
+                        cells.append(cell)
+                    ws.append(cells)
+                
+                print(f"  Лист: {sheet_name}, строк данных: {len(table_data['data'])}")
+            
+            wb.save(self.output_file)
+            print(f"✓ Данные сохранены в файл: {self.output_file} (листов: {len(self.sheets)})")
+            return True
+        except Exception as e:
+            print(f"✗ Ошибка при сохранении в Excel: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+
 def main():
     """Основная функция для запуска парсера"""
     scraper = MektepScraper()
@@ -1939,6 +2494,9 @@ def main():
         print(f"ОБРАБОТКА ВСЕХ КЛАССОВ {selected_class['number']} КЛАССА")
         print(f"{'='*60}\n")
         
+        # Таблицы накапливаются в памяти, файл записывается один раз в конце
+        writer = SuccessDataWriter(output_file)
+        
         for group in class_groups:
             print(f"\n{'='*60}")
             print(f"Обработка класса: {group['name']}")
@@ -1952,15 +2510,11 @@ def main():
             try:
                 # Прокручиваем к кнопке
                 scraper.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", group['button'])
-                time.sleep(0.5)
                 
                 # Используем JavaScript для клика
                 scraper.driver.execute_script("arguments[0].click();", group['button'])
                 print(f"✓ Клик по кнопке 'Успеваемость' для {group['name']}")
                 
-                # Ждем открытия модального окна
-                time.sleep(1)
-                
                 # Ждем появления и открытия модального окна
                 try:
                     scraper.wait.until(
@@ -1970,7 +2524,6 @@ def main():
                             EC.presence_of_element_located((By.ID, "classSapa"))
                         )
                     )
-                    time.sleep(2)
                     
                     # Ждем появления таблицы
                     try:
@@ -1991,16 +2544,15 @@ def main():
                     scraper.close_modal()
                     continue
                 
-                # Сохранение данных в Excel
+                # Добавление данных в Excel
                 class_name = group['name']
-                if scraper.save_to_excel(table_data, class_name, output_file):
-                    print(f"✓ Данные для {class_name} сохранены в файл: {output_file}")
+                if writer.add(table_data, class_name):
+                    print(f"✓ Данные для {class_name} подготовлены к сохранению")
                 else:
                     print(f"✗ Не удалось сохранить данные для {class_name}")
                 
                 # Закрываем модальное окно
                 scraper.close_modal()
-                time.sleep(0.5)  # Небольшая пауза перед следующим классом
                 
             except Exception as e:
                 print(f"✗ Ошибка при обработке {group['name']}: {e}")
@@ -2010,7 +2562,13 @@ def main():
         print(f"\n{'='*60}")
         print(f"ОБРАБОТКА ЗАВЕРШЕНА")
         print(f"{'='*60}")
-        print(f"✓ Все данные сохранены в файл: {output_file}")
+        with scraper.timed('save_excel'):
+            saved = writer.save()
+        if saved:
+            print(f"✓ Все данные сохранены в файл: {output_file}")
+        else:
+            print("✗ Не удалось сохранить данные в Excel")
+        scraper.print_timing_report()
         
     else:
         # Обрабатываем только один выбранный класс
@@ -12,10 +12,23 @@
 """
 import pandas as pd
 from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+import io
+import multiprocessing
+import os
 import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from functools import lru_cache
+
+from grade_stats import GradeStats, parse_grade  # noqa: F401 (parse_grade реэкспортируется для старых вызовов)
+
+# Версия формата итогового отчета: увеличивается при любом изменении разметки, стилей или
+# расчетов отчета, чтобы кэш scrape_cache не отдавал отчеты, сформированные прежним кодом
+REPORT_FORMAT_VERSION = 1
 
 # Цветовая палитра
 COLORS = {
@@ -24,6 +37,7 @@ COLORS = {
     'quarter_bg': 'D9E1F2',  # Светло-синий для названия четверти
     'quarter_text': '203864',  # Темно-синий текст
     'data_bg': 'FFFFFF',  # Белый для данных
+    'data_alt_bg': 'F9F9F9',  # Светло-серый для чередующихся строк данных
     'stats_5_bg': 'E2EFDA',  # Светло-зеленый для строки "5"
     'stats_4_bg': 'FFF2CC',  # Светло-желтый для строки "4"
     'stats_3_bg': 'FCE4D6',  # Светло-оранжевый для строки "3"
@@ -47,68 +61,66 @@ QUARTER_NAMES = {
 QUARTERS_ORDER = ['I', 'II', 'III', 'IV', 'Ж']
 
 
+# Варианты записи четверти в заголовках таблицы (в нижнем регистре)
+QUARTER_ALIASES = {
+    'і': 'I', '1': 'I', 'i': 'I',
+    'іі': 'II', '2': 'II', 'ii': 'II',
+    'ііі': 'III', '3': 'III', 'iii': 'III',
+    'іv': 'IV', 'iv': 'IV', '4': 'IV',
+    'ж': 'Ж', '5': 'Ж', 'год': 'Ж', 'годовая': 'Ж'
+}
+
+# Точные обозначения (латиница и кириллическая "І")
+QUARTER_EXACT = {
+    'I': 'I', 'І': 'I',
+    'II': 'II', 'ІІ': 'II',
+    'III': 'III', 'ІІІ': 'III',
+    'IV': 'IV', 'ІV': 'IV',
+    'Ж': 'Ж'
+}
+
+
 def normalize_quarter(quarter):
     """Нормализует четверть к стандартному формату"""
     if not quarter:
         return None
-    q = str(quarter).strip()
-    mapping = {
-        'і': 'I', '1': 'I', 'i': 'I',
-        'іі': 'II', '2': 'II', 'ii': 'II',
-        'ііі': 'III', '3': 'III', 'iii': 'III',
-        'іv': 'IV', 'iv': 'IV', '4': 'IV',
-        'ж': 'Ж', '5': 'Ж', 'год': 'Ж', 'годовая': 'Ж'
-    }
-    if q in ['I', 'II', 'III', 'IV', 'Ж', 'І', 'ІІ', 'ІІІ', 'ІV']:
-        if q in ['І', 'I', 'i', 'і']:
-            return 'I'
-        elif q in ['ІІ', 'II', 'ii', 'іі']:
-            return 'II'
-        elif q in ['ІІІ', 'III', 'iii', 'ііі']:
-            return 'III'
-        elif q in ['ІV', 'IV', 'iv', 'іv']:
-            return 'IV'
-        elif q == 'Ж':
-            return 'Ж'
-    if q.lower() in mapping:
-        return mapping[q.lower()]
-    return q
-
-
-def parse_grade(value):
-    """Преобразует значение в оценку (число 1-5)"""
-    if pd.isna(value) or value == '' or value is None:
-        return None
-    try:
-        if isinstance(value, (int, float)):
-            return int(value) if value == int(value) and 1 <= int(value) <= 5 else None
-        value_str = re.sub(r'[^\d]', '', str(value).strip())
-        if value_str:
-            grade = int(value_str)
-            if 1 <= grade <= 5:
-                return grade
-    except:
-        pass
-    return None
-
-
-def get_cell_value_safe(ws, row, col):
+    return _normalize_quarter_text(str(quarter).strip())
+
+
+@lru_cache(maxsize=256)
+def _normalize_quarter_text(q):
+    # Заголовков четвертей несколько вариантов, поэтому результат кэшируется
+    if q in QUARTER_EXACT:
+        return QUARTER_EXACT[q]
+    return QUARTER_ALIASES.get(q.lower(), q)
+
+
+def build_merged_index(ws):
+    """Индекс объединенных ячеек листа: {(строка, колонка): (строка, колонка) левой верхней ячейки}.
+    Строится один раз на лист, чтобы не перебирать все диапазоны для каждой ячейки
+    """
+    index = {}
+    for merged_range in ws.merged_cells.ranges:
+        anchor = (merged_range.min_row, merged_range.min_col)
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for col in range(merged_range.min_col, merged_range.max_col + 1):
+                index[(row, col)] = anchor
+    return index
+
+
+def get_cell_value_safe(ws, row, col, merged_index=None):
     """Безопасное получение значения ячейки с учетом объединенных ячеек"""
     # Проверяем объединенные ячейки
-    for merged_range in ws.merged_cells.ranges:
-        if merged_range.min_row <= row <= merged_range.max_row and \
-           merged_range.min_col <= col <= merged_range.max_col:
-            return ws.cell(merged_range.min_row, merged_range.min_col).value
+    if merged_index is None:
+        merged_index = build_merged_index(ws)
+    row, col = merged_index.get((row, col), (row, col))
     return ws.cell(row, col).value
 
 
-def read_data_with_two_level_headers(input_file, sheet_name):
-    """Читает данные с двухуровневой структурой заголовков"""
-    wb = load_workbook(input_file, data_only=True)
-    ws = wb[sheet_name]
-    
-    # Читаем первые 2 строки для заголовков
-    max_col = ws.max_column
+def parse_two_level_headers(row1, row2, max_col):
+    """Разбор двух строк заголовков (предметы и четверти) с уже раскрытыми объединенными ячейками.
+    Возвращает (headers, subjects_map)
+    """
     headers = []
     subjects_map = {}  # {col_index: (subject_name, quarter)}
     
@@ -117,8 +129,8 @@ def read_data_with_two_level_headers(input_file, sheet_name):
     current_subject = None
     
     while col <= max_col:
-        val1 = get_cell_value_safe(ws, 1, col)
-        val2 = get_cell_value_safe(ws, 2, col)
+        val1 = row1[col - 1] if col <= len(row1) else None
+        val2 = row2[col - 1] if col <= len(row2) else None
         
         val1_str = str(val1).strip() if val1 else ''
         val2_str = str(val2).strip() if val2 else ''
@@ -170,18 +182,20 @@ def read_data_with_two_level_headers(input_file, sheet_name):
             # Не создаем колонки с названием "Column_X" - это лишние колонки
             col += 1
     
-    # Читаем данные начиная с 3-й строки
+    return headers, subjects_map
+
+
+def build_data_frame(headers, rows):
+    """DataFrame из строк данных (значения по колонкам, начиная с первой) по заголовкам"""
     data_rows = []
     num_headers = len(headers)
     
-    for row in range(3, ws.max_row + 1):
+    for values in rows:
         row_data = []
         # Читаем только столько колонок, сколько заголовков
         for col_idx in range(num_headers):
-            col = col_idx + 1  # Колонки начинаются с 1
-            if col <= max_col:
-                val = get_cell_value_safe(ws, row, col)
-                row_data.append(val if val is not None else '')
+            if col_idx < len(values) and values[col_idx] is not None:
+                row_data.append(values[col_idx])
             else:
                 row_data.append('')
         
@@ -211,8 +225,6 @@ def read_data_with_two_level_headers(input_file, sheet_name):
         if has_data:
             data_rows.append(row_data)
     
-    wb.close()
-    
     # Создаем DataFrame с точным соответствием количества колонок
     if data_rows:
         # Убеждаемся, что все строки имеют одинаковую длину
@@ -234,7 +246,70 @@ def read_data_with_two_level_headers(input_file, sheet_name):
     else:
         df = pd.DataFrame(columns=headers)
     
-    return df, subjects_map
+    return df
+
+
+def read_data_with_two_level_headers(input_file, sheet_name):
+    """Читает данные с двухуровневой структурой заголовков"""
+    wb = load_workbook(input_file, data_only=True)
+    try:
+        return read_data_from_worksheet(wb[sheet_name])
+    finally:
+        wb.close()
+
+
+def read_data_from_worksheet(ws):
+    """Читает данные с двухуровневой структурой заголовков из уже открытого листа"""
+    return read_data_from_grid(*worksheet_grid(ws))
+
+
+def worksheet_grid(ws):
+    """Значения листа (grid, max_col), объединенные ячейки раскрыты во все их клетки"""
+    # Значения листа читаем одним проходом, объединенные ячейки раскрываем по индексу
+    max_col = ws.max_column
+    grid = [list(row) for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=max_col, values_only=True)]
+    merged_index = build_merged_index(ws)
+    for (row, col), (anchor_row, anchor_col) in merged_index.items():
+        if row <= len(grid) and col <= max_col:
+            grid[row - 1][col - 1] = grid[anchor_row - 1][anchor_col - 1]
+    return grid, max_col
+
+
+def read_data_from_grid(grid, max_col):
+    """Данные с двухуровневой структурой заголовков из значений листа (worksheet_grid)"""
+    # Читаем первые 2 строки для заголовков
+    empty_row = [None] * max_col
+    row1 = grid[0] if len(grid) > 0 else empty_row
+    row2 = grid[1] if len(grid) > 1 else empty_row
+    headers, subjects_map = parse_two_level_headers(row1, row2, max_col)
+    
+    # Данные начиная с 3-й строки (build_data_frame берет столько колонок, сколько заголовков)
+    rows = grid[2:]
+    
+    return build_data_frame(headers, rows), subjects_map
+
+
+def read_data_from_table(table_data):
+    """Данные таблицы "Сапа" из памяти ({"headers", "data"} от extract_modal_table_data).
+    
+    Строки заголовков собираются так, как их увидел бы read_data_with_two_level_headers
+    в листе success_data.xlsx (значение объединенной ячейки - во всех ее колонках),
+    поэтому результат тот же, но без записи и чтения Excel
+    """
+    table_headers = table_data["headers"]
+    first_col_name = table_headers.get("first_col_name", "")
+    second_col_name = table_headers.get("second_col_name", "Аты-жөні")
+    
+    row1 = [first_col_name, second_col_name]
+    for subject in table_headers.get("first_row") or []:
+        row1.extend([subject["text"] if subject["text"] else ""] * subject["colspan"])
+    row2 = [first_col_name, second_col_name] + list(table_headers.get("second_row", []))
+    
+    data = table_data["data"]
+    max_col = max([len(row1), len(row2)] + [len(row) for row in data])
+    headers, subjects_map = parse_two_level_headers(row1, row2, max_col)
+    
+    return build_data_frame(headers, data), subjects_map
 
 
 def merge_duplicate_columns(df):
@@ -335,11 +410,8 @@ def merge_duplicate_columns(df):
     return merged_data
 
 
-def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_data):
-    """Создает таблицу для одной четверти с сохранением дизайна"""
-    current_row = start_row
-    
-    # Фильтруем данные по четверти, исключая служебные колонки
+def select_quarter_data(merged_data, quarter_name):
+    """Предметы четверти {предмет: значения} без служебных колонок"""
     quarter_data = {}
     service_subjects = ['Параллель', 'Номер_строки', 'Аты-жөні', 'Фио', 'FIO']
     
@@ -361,6 +433,97 @@ def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_da
         if quarter == quarter_name:
             quarter_data[subject] = values
     
+    return quarter_data
+
+
+def build_grade_stats(merged_data):
+    """Статистика оценок класса по всем четвертям (оценки разбираются один раз)"""
+    quarters = [normalize_quarter(quarter) for quarter in QUARTERS_ORDER]
+    return GradeStats({quarter: select_quarter_data(merged_data, quarter) for quarter in quarters})
+
+
+def report_style(kind, color):
+    """Имя именованного стиля ячейки отчета по виду и цвету заливки"""
+    return f'report_{kind}_{color}'
+
+
+def report_named_styles():
+    """Именованные стили отчета по четвертям.
+    
+    Создаются один раз на книгу и назначаются ячейкам по имени, поэтому число
+    объектов стилей не зависит от размера отчета
+    """
+    side = Side(style='thin', color=COLORS['border'])
+    border = Border(left=side, right=side, top=side, bottom=side)
+    center = Alignment(horizontal="center", vertical="center")
+    
+    def fill(color):
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+    
+    styles = [
+        NamedStyle(name='report_quarter', font=Font(bold=True, size=14, color=COLORS['quarter_text']),
+                   fill=fill(COLORS['quarter_bg']), border=border,
+                   alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)),
+        NamedStyle(name='report_header', font=Font(bold=True, color=COLORS['header_text'], size=10),
+                   fill=fill(COLORS['header_bg']), border=border,
+                   alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)),
+        NamedStyle(name='report_class_label', font=Font(bold=True, size=11), fill=fill(COLORS['class_stats_bg']),
+                   alignment=Alignment(horizontal="left", vertical="center"), border=border),
+        NamedStyle(name='report_class_value', font=Font(bold=True, size=11), fill=fill(COLORS['class_stats_bg']),
+                   alignment=center, border=border, number_format='0.00'),
+    ]
+    
+    # Строки учеников (чередование заливки): номер и оценки по центру, ФИО по левому краю
+    for color in (COLORS['data_bg'], COLORS['data_alt_bg']):
+        styles.append(NamedStyle(name=report_style('row', color), font=DEFAULT_FONT, fill=fill(color),
+                                 alignment=center, border=border))
+        styles.append(NamedStyle(name=report_style('name', color), font=DEFAULT_FONT, fill=fill(color), border=border,
+                                 alignment=Alignment(horizontal="left", vertical="center")))
+    
+    stats_colors = [COLORS['stats_5_bg'], COLORS['stats_4_bg'], COLORS['stats_3_bg']]
+    percent_colors = [COLORS['quality_bg'], COLORS['performance_bg']]
+    fill_colors = list(dict.fromkeys(stats_colors + percent_colors + [COLORS['class_stats_bg']]))
+    for color in fill_colors:
+        # Пустые ячейки строк статистики
+        styles.append(NamedStyle(name=report_style('fill', color), font=DEFAULT_FONT, fill=fill(color), border=border))
+    for color in dict.fromkeys(stats_colors + percent_colors):
+        # Названия строк "5", "4", "3", "Качество", "Успеваемость"
+        styles.append(NamedStyle(name=report_style('label', color), font=Font(bold=True, size=11),
+                                 fill=fill(color), alignment=center, border=border))
+    for color in stats_colors:
+        # Количество оценок по ученику и по предмету
+        styles.append(NamedStyle(name=report_style('count', color), font=Font(bold=True),
+                                 fill=fill(color), alignment=center, border=border))
+        styles.append(NamedStyle(name=report_style('value', color), font=Font(bold=True, size=10),
+                                 fill=fill(color), alignment=center, border=border))
+    for color in dict.fromkeys(percent_colors):
+        # Качество и успеваемость по предметам
+        styles.append(NamedStyle(name=report_style('percent', color), font=Font(bold=True, size=10),
+                                 fill=fill(color), alignment=center, border=border, number_format='0.00'))
+    return styles
+
+
+def register_report_styles(wb):
+    """Добавление стилей отчета в книгу (один раз)"""
+    if 'report_header' in wb.named_styles:
+        return
+    for style in report_named_styles():
+        wb.add_named_style(style)
+
+
+def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_data, grade_stats=None):
+    """Создает таблицу для одной четверти с сохранением дизайна
+    
+    grade_stats - GradeStats класса (build_grade_stats), чтобы не разбирать оценки
+    заново для каждой четверти; если не передан, строится из merged_data
+    """
+    current_row = start_row
+    
+    if grade_stats is None:
+        grade_stats = build_grade_stats(merged_data)
+    stats = grade_stats.quarter(quarter_name)
+    quarter_data = stats.values
+    
     # Отладочный вывод
     if quarter_data:
         print(f"    Найдено предметов для четверти {quarter_name}: {len(quarter_data)}")
@@ -377,62 +540,23 @@ def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_da
     stats_col_start = len(subjects) + 3
     total_cols = stats_col_start + 3  # +3: столбцы "5", "4", "3"
     
-    # Границы
-    thin_border = Border(
-        left=Side(style='thin', color=COLORS['border']),
-        right=Side(style='thin', color=COLORS['border']),
-        top=Side(style='thin', color=COLORS['border']),
-        bottom=Side(style='thin', color=COLORS['border'])
-    )
+    register_report_styles(ws.parent)
     
     # 1. Строка с названием четверти
     quarter_display = QUARTER_NAMES.get(quarter_name, quarter_name)
     ws.merge_cells(f'A{current_row}:{get_column_letter(total_cols)}{current_row}')
     cell = ws.cell(current_row, 1)
     cell.value = quarter_display
-    cell.font = Font(bold=True, size=14, color=COLORS['quarter_text'])
-    cell.fill = PatternFill(start_color=COLORS['quarter_bg'], end_color=COLORS['quarter_bg'], fill_type="solid")
-    cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    cell.border = thin_border
+    cell.style = 'report_quarter'
     current_row += 1
     
     # 2. Строка заголовков
-    col_idx = 1
-    # Первая колонка - порядковые номера (без названия)
-    cell = ws.cell(current_row, col_idx)
-    cell.value = ''  # Пустое название
-    cell.font = Font(bold=True, color=COLORS['header_text'], size=10)
-    cell.fill = PatternFill(start_color=COLORS['header_bg'], end_color=COLORS['header_bg'], fill_type="solid")
-    cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    cell.border = thin_border
-    col_idx += 1
-    
-    # Вторая колонка - ФИО
-    cell = ws.cell(current_row, col_idx)
-    cell.value = 'Аты-жөні'
-    cell.font = Font(bold=True, color=COLORS['header_text'], size=10)
-    cell.fill = PatternFill(start_color=COLORS['header_bg'], end_color=COLORS['header_bg'], fill_type="solid")
-    cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    cell.border = thin_border
-    col_idx += 1
-    
-    for subject in subjects:
+    # Первая колонка - порядковые номера (без названия), вторая - ФИО
+    header_values = ['', 'Аты-жөні'] + subjects + ['5', '4', '3']
+    for col_idx, value in enumerate(header_values, 1):
         cell = ws.cell(current_row, col_idx)
-        cell.value = subject
-        cell.font = Font(bold=True, color=COLORS['header_text'], size=10)
-        cell.fill = PatternFill(start_color=COLORS['header_bg'], end_color=COLORS['header_bg'], fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        cell.border = thin_border
-        col_idx += 1
-    
-    for grade in ['5', '4', '3']:
-        cell = ws.cell(current_row, col_idx)
-        cell.value = grade
-        cell.font = Font(bold=True, color=COLORS['header_text'], size=10)
-        cell.fill = PatternFill(start_color=COLORS['header_bg'], end_color=COLORS['header_bg'], fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        cell.border = thin_border
-        col_idx += 1
+        cell.value = value
+        cell.style = 'report_header'
     
     ws.row_dimensions[current_row].height = 40
     current_row += 1
@@ -449,64 +573,37 @@ def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_da
         
         col_idx = 1
         actual_student_count += 1
+        zebra_color = COLORS['data_bg'] if actual_student_count % 2 == 0 else COLORS['data_alt_bg']
+        row_style = report_style('row', zebra_color)
         
         # Первая колонка - порядковый номер (1, 2, 3...)
         cell = ws.cell(current_row, col_idx)
         cell.value = actual_student_count  # Номер начинается с 1
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = thin_border
-        cell.fill = PatternFill(start_color=COLORS['data_bg'] if actual_student_count % 2 == 0 else 'F9F9F9', 
-                               end_color=COLORS['data_bg'] if actual_student_count % 2 == 0 else 'F9F9F9', 
-                               fill_type="solid")
+        cell.style = row_style
         col_idx += 1
         
         # Вторая колонка - ФИО
         cell = ws.cell(current_row, col_idx)
         cell.value = fio_value
-        cell.alignment = Alignment(horizontal="left", vertical="center")
-        cell.border = thin_border
-        cell.fill = PatternFill(start_color=COLORS['data_bg'] if actual_student_count % 2 == 0 else 'F9F9F9', 
-                               end_color=COLORS['data_bg'] if actual_student_count % 2 == 0 else 'F9F9F9', 
-                               fill_type="solid")
+        cell.style = report_style('name', zebra_color)
         col_idx += 1
         
         # Оценки по предметам
-        student_grades = []
         for subject in subjects:
             values = quarter_data[subject]
             value = values[student_idx] if student_idx < len(values) else ''
             cell = ws.cell(current_row, col_idx)
             cell.value = value
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin_border
-            cell.fill = PatternFill(start_color=COLORS['data_bg'] if actual_student_count % 2 == 0 else 'F9F9F9', 
-                                   end_color=COLORS['data_bg'] if actual_student_count % 2 == 0 else 'F9F9F9', 
-                                   fill_type="solid")
-            
-            # Обновляем логику для подсчета оценок, если значение содержит несколько оценок (через запятую)
-            if value:
-                # Разбиваем строку на части по запятой и пробелу
-                parts = str(value).split(',')
-                for part in parts:
-                    grade = parse_grade(part.strip())
-                    if grade:
-                        student_grades.append(grade)
+            cell.style = row_style
             col_idx += 1
         
         # Статистика по ученику
-        count_5 = sum(1 for g in student_grades if g == 5)
-        count_4 = sum(1 for g in student_grades if g == 4)
-        count_3 = sum(1 for g in student_grades if g == 3)
+        count_5, count_4, count_3 = stats.student_grade_counts(student_idx)
         
-        for count, grade_color in [(count_5, 'E2EFDA'), (count_4, 'FFF2CC'), (count_3, 'FCE4D6')]:
+        for count, grade_color in [(count_5, COLORS['stats_5_bg']), (count_4, COLORS['stats_4_bg']), (count_3, COLORS['stats_3_bg'])]:
             cell = ws.cell(current_row, col_idx)
             cell.value = count
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin_border
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color=grade_color, 
-                                   end_color=grade_color, 
-                                   fill_type="solid")
+            cell.style = report_style('count', grade_color)
             col_idx += 1
         
         current_row += 1
@@ -515,160 +612,69 @@ def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_da
     grade_colors = {'5': COLORS['stats_5_bg'], '4': COLORS['stats_4_bg'], '3': COLORS['stats_3_bg']}
     
     for grade in ['5', '4', '3']:
-        col_idx = 1
-        # Первая колонка - пустая (для номеров)
-        cell = ws.cell(current_row, col_idx)
+        # Первая колонка - оценка, вторая - пустая (для ФИО)
+        cell = ws.cell(current_row, 1)
         cell.value = grade
-        cell.font = Font(bold=True, size=11)
-        cell.fill = PatternFill(start_color=grade_colors[grade], end_color=grade_colors[grade], fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = thin_border
-        col_idx += 1
+        cell.style = report_style('label', grade_colors[grade])
+        ws.cell(current_row, 2).style = report_style('fill', grade_colors[grade])
+        col_idx = 3
         
-        # Вторая колонка - пустая (для ФИО)
-        cell = ws.cell(current_row, col_idx)
-        cell.fill = PatternFill(start_color=grade_colors[grade], end_color=grade_colors[grade], fill_type="solid")
-        cell.border = thin_border
-        col_idx += 1
-        
-        for subject in subjects:
-            values = quarter_data[subject]
-            subject_grades = []
-            for val in values:
-                if val:
-                     parts = str(val).split(',')
-                     for part in parts:
-                         parsed_g = parse_grade(part.strip())
-                         if parsed_g:
-                             subject_grades.append(parsed_g)
-            
-            if grade == '5':
-                count = sum(1 for g in subject_grades if g == 5)
-            elif grade == '4':
-                count = sum(1 for g in subject_grades if g == 4)
-            else:
-                count = sum(1 for g in subject_grades if g == 3)
-            
+        for count in stats.subject_counts[int(grade)]:
             cell = ws.cell(current_row, col_idx)
             cell.value = count
-            cell.font = Font(bold=True, size=10)
-            cell.fill = PatternFill(start_color=grade_colors[grade], end_color=grade_colors[grade], fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin_border
+            cell.style = report_style('value', grade_colors[grade])
             col_idx += 1
         
         # Пустые столбцы статистики
         for _ in range(3):
-            cell = ws.cell(current_row, col_idx)
-            cell.fill = PatternFill(start_color=grade_colors[grade], end_color=grade_colors[grade], fill_type="solid")
-            cell.border = thin_border
+            ws.cell(current_row, col_idx).style = report_style('fill', grade_colors[grade])
             col_idx += 1
         
         current_row += 1
     
     # 5. Строки "Качество" и "Успеваемость"
     for row_name, bg_color in [('Качество', COLORS['quality_bg']), ('Успеваемость', COLORS['performance_bg'])]:
-        col_idx = 1
-        # Первая колонка - название строки
-        cell = ws.cell(current_row, col_idx)
+        # Первая колонка - название строки, вторая - пустая (для ФИО)
+        cell = ws.cell(current_row, 1)
         cell.value = row_name
-        cell.font = Font(bold=True, size=11)
-        cell.fill = PatternFill(start_color=bg_color, end_color=bg_color, fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = thin_border
-        col_idx += 1
+        cell.style = report_style('label', bg_color)
+        ws.cell(current_row, 2).style = report_style('fill', bg_color)
+        col_idx = 3
         
-        # Вторая колонка - пустая (для ФИО)
-        cell = ws.cell(current_row, col_idx)
-        cell.fill = PatternFill(start_color=bg_color, end_color=bg_color, fill_type="solid")
-        cell.border = thin_border
-        col_idx += 1
-        
-        for subject in subjects:
-            values = quarter_data[subject]
-            subject_grades = []
-            for val in values:
-                if val:
-                     parts = str(val).split(',')
-                     for part in parts:
-                         parsed_g = parse_grade(part.strip())
-                         if parsed_g:
-                             subject_grades.append(parsed_g)
-            
-            total = len(subject_grades)
-            count_5 = sum(1 for g in subject_grades if g == 5)
-            count_4 = sum(1 for g in subject_grades if g == 4)
-            count_3 = sum(1 for g in subject_grades if g == 3)
-            
-            if row_name == 'Качество':
-                value = round((count_5 + count_4) / total * 100, 2) if total > 0 else 0
-            else:
-                value = round((count_5 + count_4 + count_3) / total * 100, 2) if total > 0 else 0
-            
+        for value in (stats.quality if row_name == 'Качество' else stats.performance):
             cell = ws.cell(current_row, col_idx)
             cell.value = value
-            cell.font = Font(bold=True, size=10)
-            cell.fill = PatternFill(start_color=bg_color, end_color=bg_color, fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.number_format = '0.00'
-            cell.border = thin_border
+            cell.style = report_style('percent', bg_color)
             col_idx += 1
         
         # Пустые столбцы статистики
         for _ in range(3):
-            cell = ws.cell(current_row, col_idx)
-            cell.fill = PatternFill(start_color=bg_color, end_color=bg_color, fill_type="solid")
-            cell.border = thin_border
+            ws.cell(current_row, col_idx).style = report_style('fill', bg_color)
             col_idx += 1
         
         current_row += 1
     
     # 6. Строки "Качество по классу" и "Успеваемость по классу"
-    all_grades = []
-    for subject in subjects:
-        values = quarter_data[subject]
-        for val in values:
-            if val:
-                 parts = str(val).split(',')
-                 for part in parts:
-                     parsed_g = parse_grade(part.strip())
-                     if parsed_g:
-                         all_grades.append(parsed_g)
-    
-    total_class = len(all_grades)
-    count_5 = sum(1 for g in all_grades if g == 5)
-    count_4 = sum(1 for g in all_grades if g == 4)
-    count_3 = sum(1 for g in all_grades if g == 3)
-    
-    class_quality = round((count_5 + count_4) / total_class * 100, 2) if total_class > 0 else 0
-    class_performance = round((count_5 + count_4 + count_3) / total_class * 100, 2) if total_class > 0 else 0
+    class_quality = stats.class_quality
+    class_performance = stats.class_performance
     
     for row_name, value in [('Качество по классу', class_quality), ('Успеваемость по классу', class_performance)]:
         col_idx = 1
         # Первая колонка - название строки
         cell = ws.cell(current_row, col_idx)
         cell.value = row_name
-        cell.font = Font(bold=True, size=11)
-        cell.fill = PatternFill(start_color=COLORS['class_stats_bg'], end_color=COLORS['class_stats_bg'], fill_type="solid")
-        cell.alignment = Alignment(horizontal="left", vertical="center")
-        cell.border = thin_border
+        cell.style = 'report_class_label'
         
         # Вторая колонка - значение
         cell = ws.cell(current_row, col_idx + 1)
         cell.value = value
-        cell.font = Font(bold=True, size=11)
-        cell.fill = PatternFill(start_color=COLORS['class_stats_bg'], end_color=COLORS['class_stats_bg'], fill_type="solid")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.number_format = '0.00'
-        cell.border = thin_border
+        cell.style = 'report_class_value'
         
         # Объединяем оставшиеся ячейки (начиная с 3-й колонки)
         if len(subjects) > 0:
             last_col = get_column_letter(stats_col_start + 2)
             ws.merge_cells(f'{get_column_letter(col_idx + 2)}{current_row}:{last_col}{current_row}')
-            merged_cell = ws[f'{get_column_letter(col_idx + 2)}{current_row}']
-            merged_cell.fill = PatternFill(start_color=COLORS['class_stats_bg'], end_color=COLORS['class_stats_bg'], fill_type="solid")
-            merged_cell.border = thin_border
+            ws[f'{get_column_letter(col_idx + 2)}{current_row}'].style = report_style('fill', COLORS['class_stats_bg'])
         
         current_row += 1
     
@@ -676,176 +682,267 @@ def create_quarter_table(ws, start_row, quarter_name, merged_data, fio_column_da
     return current_row + 2
 
 
-def process_success_data(input_file='success_data.xlsx', output_file='processed_final.xlsx', class_name=None, output_dir=None):
-    """Основная функция обработки данных"""
+def prepare_sheet(sheet_name, reader, args):
+    """Чтение листа и подсчет статистики (без записи в Excel).
+    
+    reader(*args) возвращает (df, subjects_map) - read_data_from_table, read_data_from_grid
+    или read_data_from_worksheet. Результат - данные для render_sheet или None,
+    если лист пропускается
+    """
+    print(f"\n{'='*70}")
+    print(f"Обработка параллели: {sheet_name}")
+    print(f"{'='*70}")
+    
+    try:
+        # Читаем данные
+        df, subjects_map = reader(*args)
+        print(f"Загружено записей: {len(df)}")
+        print(f"Колонок: {len(df.columns)}")
+        
+        if len(df) == 0:
+            print("⚠ Нет данных для этой параллели")
+            return None
+        
+        # Находим столбец ФИО
+        fio_column = None
+        for col in df.columns:
+            if any(x in str(col).lower() for x in ['аты-жөні', 'фио', 'fio', 'аты']):
+                fio_column = col
+                break
+        
+        if fio_column is None and len(df.columns) > 1:
+            fio_column = df.columns[1]
+        
+        print(f"Столбец ФИО: {fio_column}")
+        
+        # Фильтруем строки с пустым ФИО
+        if fio_column:
+            # Удаляем строки, где ФИО пустое или содержит только пробелы
+            before_filter = len(df)
+            df = df[df[fio_column].notna() & (df[fio_column].astype(str).str.strip() != '')].copy()
+            after_filter = len(df)
+            if before_filter != after_filter:
+                print(f"  Отфильтровано пустых строк: {before_filter - after_filter} (было {before_filter}, стало {after_filter})")
+        
+        if len(df) == 0:
+            print("⚠ Нет данных после фильтрации пустых строк")
+            return None
+        
+        # Обрезаем данные, если последовательность прервалась (проверяем по первой колонке с числами)
+        # Ищем первую колонку, которая может содержать номера
+        num_col = None
+        for col in df.columns:
+            col_str = str(col).lower()
+            if 'параллель' in col_str or 'номер_строки' in col_str or 'аты-жөні' in col_str or 'фио' in col_str:
+                return None
+            # Берем первую колонку, которая может содержать числа
+            num_col = col
+            break
+        
+        if num_col is not None:
+            cut_row_idx = None
+            expected_num = 1
+            
+            for i, idx in enumerate(df.index):
+                value = df.loc[idx, num_col]
+                try:
+                    if pd.isna(value) or str(value).strip() == '':
+                        cut_row_idx = i
+                        break
+                    num_value = int(float(str(value).strip()))
+                    if num_value != expected_num:
+                        cut_row_idx = i
+                        break
+                    expected_num += 1
+                except (ValueError, TypeError):
+                    cut_row_idx = i
+                    break
+            
+            if cut_row_idx is not None:
+                original_len = len(df)
+                df = df.iloc[:cut_row_idx].copy()
+                print(f"  Данные обрезаны: {original_len} -> {len(df)} строк (последовательность прервалась)")
+        
+        # Извлекаем данные ФИО после фильтрации
+        fio_data = df[fio_column].tolist() if fio_column else [''] * len(df)
+        
+        # Объединяем дублирующиеся столбцы
+        print("Объединение дублирующихся столбцов...")
+        print(f"  Всего колонок в DataFrame: {len(df.columns)}")
+        print(f"  Первые 10 колонок: {list(df.columns[:10])}")
+        
+        # Проверяем наличие колонок с "Column" или "Колонка"
+        column_cols = [col for col in df.columns if 'column' in str(col).lower() or 'колонка' in str(col).lower()]
+        if column_cols:
+            print(f"  ⚠ Найдены колонки с 'Column'/'Колонка': {column_cols}")
+        
+        merged_data = merge_duplicate_columns(df)
+        print(f"  Объединено предметов: {len(merged_data)}")
+        print(f"  Предметы: {list(merged_data.keys())[:10]}")
+        
+        # Проверяем, не попали ли колонки с "Column" в merged_data
+        column_subjects = [(s, q) for (s, q) in merged_data.keys() if s and ('column' in str(s).lower() or 'колонка' in str(s).lower())]
+        if column_subjects:
+            print(f"  ⚠ ВНИМАНИЕ: В merged_data попали колонки с 'Column'/'Колонка': {column_subjects}")
+        
+        # Создаем лист
+        clean_sheet_name = sheet_name.replace('/', '_').replace('\\', '_').replace('?', '_')
+        clean_sheet_name = clean_sheet_name.replace('*', '_').replace('[', '_').replace(']', '_').replace(':', '_')
+        if len(clean_sheet_name) > 31:
+            clean_sheet_name = clean_sheet_name[:31]
+        
+        # Проверяем, есть ли данные для хотя бы одной четверти
+        has_data = False
+        for quarter in QUARTERS_ORDER:
+            quarter_normalized = normalize_quarter(quarter)
+            # Проверяем, есть ли данные для этой четверти
+            for (subject, quarter_key), values in merged_data.items():
+                if quarter_key == quarter_normalized and any(v for v in values if v and str(v).strip()):
+                    has_data = True
+                    break
+            if has_data:
+                break
+        
+        if not has_data:
+            print(f"⚠ Нет данных для параллели {sheet_name}, пропускаем...")
+            return None
+        
+        # Оценки разбираются один раз для всех четвертей
+        grade_stats = build_grade_stats(merged_data)
+        
+        return {
+            'sheet_name': sheet_name,
+            'clean_sheet_name': clean_sheet_name,
+            'merged_data': merged_data,
+            'fio_data': fio_data,
+            'grade_stats': grade_stats
+        }
+        
+    except Exception as e:
+        print(f"✗ Ошибка при обработке параллели {sheet_name}: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def prepare_sheet_captured(task):
+    """prepare_sheet в процессе пула: вывод собирается и печатается родителем в порядке листов"""
+    output = io.StringIO()
+    with redirect_stdout(output), redirect_stderr(output):
+        prepared = prepare_sheet(*task)
+    return prepared, output.getvalue()
+
+
+def prepare_sheets(sheets, workers=1):
+    """Подготовка листов по порядку; при workers > 1 - в пуле процессов.
+    
+    sheets - список (имя листа, reader, args). Разбор и подсчет статистики
+    выполняются в процессах пула, а результаты отдаются в исходном порядке листов,
+    чтобы книга собиралась в родителе так же, как при последовательной обработке
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers or 1, len(sheets))
+    if workers <= 1:
+        for task in sheets:
+            yield prepare_sheet(*task)
+        return
+    
+    print(f"\nПодготовка листов в {workers} процессах")
+    # spawn: процесс веб-приложения многопоточный, fork в нем небезопасен
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for prepared, output in executor.map(prepare_sheet_captured, sheets):
+            print(output, end='')
+            yield prepared
+
+
+def render_sheet(output_wb, prepared):
+    """Запись подготовленного листа (prepare_sheet) в итоговую книгу"""
+    sheet_name = prepared['sheet_name']
+    merged_data = prepared['merged_data']
+    fio_data = prepared['fio_data']
+    grade_stats = prepared['grade_stats']
+    
+    try:
+        output_ws = output_wb.create_sheet(title=prepared['clean_sheet_name'])
+        
+        # Обрабатываем каждую четверть
+        current_row = 1
+        for quarter in QUARTERS_ORDER:
+            quarter_normalized = normalize_quarter(quarter)
+            print(f"  Обработка четверти: {quarter} (нормализовано: {quarter_normalized})")
+            current_row = create_quarter_table(output_ws, current_row, quarter_normalized, merged_data, fio_data,
+                                               grade_stats)
+            print(f"    ✓ Данные для четверти {quarter_normalized} обработаны")
+        
+        # Проверяем, что лист не пустой
+        if output_ws.max_row == 0 or output_ws.max_column == 0:
+            print(f"⚠ Лист для {sheet_name} оказался пустым, удаляем...")
+            output_wb.remove(output_ws)
+            return False
+        
+        # Настройка ширины колонок
+        for col_idx in range(1, output_ws.max_column + 1):
+            col_letter = get_column_letter(col_idx)
+            if col_idx == 1:
+                output_ws.column_dimensions[col_letter].width = 25
+            else:
+                max_length = 0
+                for row_idx in range(1, min(output_ws.max_row + 1, 100)):
+                    cell_value = output_ws.cell(row_idx, col_idx).value
+                    if cell_value:
+                        max_length = max(max_length, len(str(cell_value)))
+                width = min(max_length + 2, 15) if max_length > 15 else min(max_length + 2, 12)
+                output_ws.column_dimensions[col_letter].width = width
+        
+        print(f"✓ Параллель {sheet_name} обработана")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Ошибка при обработке параллели {sheet_name}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def process_success_data(input_file='success_data.xlsx', output_file='processed_final.xlsx', class_name=None, output_dir=None,
+                         tables=None, workers=1):
+    """Основная функция обработки данных
+    
+    tables - таблицы классов в памяти ({имя листа: {"headers", "data"}} или список пар),
+    как их вернул extract_modal_table_data; если указаны, input_file не читается
+    workers - число процессов для разбора листов и подсчета статистики
+    (1 - последовательно, 0 - по числу ядер); книга собирается в текущем процессе
+    """
     print("="*70)
     print("ОБРАБОТКА ДАННЫХ ПО ЧЕТВЕРТЯМ")
     print("="*70)
     
     try:
-        wb = load_workbook(input_file)
-        print(f"\nЗагрузка файла: {input_file}")
-        print(f"Найдено листов: {len(wb.sheetnames)}")
+        if tables is not None:
+            table_items = list(tables.items()) if isinstance(tables, dict) else list(tables)
+            print(f"\nДанные переданы из памяти")
+            print(f"Найдено листов: {len(table_items)}")
+            sheets = [(sheet_name, read_data_from_table, (table_data,)) for sheet_name, table_data in table_items]
+        else:
+            # Книга разбирается один раз, листы передаются читателю уже открытыми.
+            # Режим read_only не подходит: в нем нет сведений об объединенных ячейках
+            wb = load_workbook(input_file, data_only=True)
+            print(f"\nЗагрузка файла: {input_file}")
+            print(f"Найдено листов: {len(wb.sheetnames)}")
+            if workers == 1:
+                sheets = [(sheet_name, read_data_from_worksheet, (wb[sheet_name],)) for sheet_name in wb.sheetnames]
+            else:
+                # Листы openpyxl не передаются в другие процессы - передаем значения ячеек
+                sheets = [(sheet_name, read_data_from_grid, worksheet_grid(wb[sheet_name])) for sheet_name in wb.sheetnames]
         
         output_wb = Workbook()
         output_wb.remove(output_wb.active)
+        register_report_styles(output_wb)
         
-        for sheet_name in wb.sheetnames:
-            print(f"\n{'='*70}")
-            print(f"Обработка параллели: {sheet_name}")
-            print(f"{'='*70}")
-            
-            try:
-                # Читаем данные
-                df, subjects_map = read_data_with_two_level_headers(input_file, sheet_name)
-                print(f"Загружено записей: {len(df)}")
-                print(f"Колонок: {len(df.columns)}")
-                
-                if len(df) == 0:
-                    print("⚠ Нет данных для этой параллели")
-                    continue
-                
-                # Находим столбец ФИО
-                fio_column = None
-                for col in df.columns:
-                    if any(x in str(col).lower() for x in ['аты-жөні', 'фио', 'fio', 'аты']):
-                        fio_column = col
-                        break
-                
-                if fio_column is None and len(df.columns) > 1:
-                    fio_column = df.columns[1]
-                
-                print(f"Столбец ФИО: {fio_column}")
-                
-                # Фильтруем строки с пустым ФИО
-                if fio_column:
-                    # Удаляем строки, где ФИО пустое или содержит только пробелы
-                    before_filter = len(df)
-                    df = df[df[fio_column].notna() & (df[fio_column].astype(str).str.strip() != '')].copy()
-                    after_filter = len(df)
-                    if before_filter != after_filter:
-                        print(f"  Отфильтровано пустых строк: {before_filter - after_filter} (было {before_filter}, стало {after_filter})")
-                
-                if len(df) == 0:
-                    print("⚠ Нет данных после фильтрации пустых строк")
-                    continue
-                
-                # Обрезаем данные, если последовательность прервалась (проверяем по первой колонке с числами)
-                # Ищем первую колонку, которая может содержать номера
-                num_col = None
-                for col in df.columns:
-                    col_str = str(col).lower()
-                    if 'параллель' in col_str or 'номер_строки' in col_str or 'аты-жөні' in col_str or 'фио' in col_str:
-                        continue
-                    # Берем первую колонку, которая может содержать числа
-                    num_col = col
-                    break
-                
-                if num_col is not None:
-                    cut_row_idx = None
-                    expected_num = 1
-                    
-                    for i, idx in enumerate(df.index):
-                        value = df.loc[idx, num_col]
-                        try:
-                            if pd.isna(value) or str(value).strip() == '':
-                                cut_row_idx = i
-                                break
-                            num_value = int(float(str(value).strip()))
-                            if num_value != expected_num:
-                                cut_row_idx = i
-                                break
-                            expected_num += 1
-                        except (ValueError, TypeError):
-                            cut_row_idx = i
-                            break
-                    
-                    if cut_row_idx is not None:
-                        original_len = len(df)
-                        df = df.iloc[:cut_row_idx].copy()
-                        print(f"  Данные обрезаны: {original_len} -> {len(df)} строк (последовательность прервалась)")
-                
-                # Извлекаем данные ФИО после фильтрации
-                fio_data = df[fio_column].tolist() if fio_column else [''] * len(df)
-                
-                # Объединяем дублирующиеся столбцы
-                print("Объединение дублирующихся столбцов...")
-                print(f"  Всего колонок в DataFrame: {len(df.columns)}")
-                print(f"  Первые 10 колонок: {list(df.columns[:10])}")
-                
-                # Проверяем наличие колонок с "Column" или "Колонка"
-                column_cols = [col for col in df.columns if 'column' in str(col).lower() or 'колонка' in str(col).lower()]
-                if column_cols:
-                    print(f"  ⚠ Найдены колонки с 'Column'/'Колонка': {column_cols}")
-                
-                merged_data = merge_duplicate_columns(df)
-                print(f"  Объединено предметов: {len(merged_data)}")
-                print(f"  Предметы: {list(merged_data.keys())[:10]}")
-                
-                # Проверяем, не попали ли колонки с "Column" в merged_data
-                column_subjects = [(s, q) for (s, q) in merged_data.keys() if s and ('column' in str(s).lower() or 'колонка' in str(s).lower())]
-                if column_subjects:
-                    print(f"  ⚠ ВНИМАНИЕ: В merged_data попали колонки с 'Column'/'Колонка': {column_subjects}")
-                
-                # Создаем лист
-                clean_sheet_name = sheet_name.replace('/', '_').replace('\\', '_').replace('?', '_')
-                clean_sheet_name = clean_sheet_name.replace('*', '_').replace('[', '_').replace(']', '_').replace(':', '_')
-                if len(clean_sheet_name) > 31:
-                    clean_sheet_name = clean_sheet_name[:31]
-                
-                # Проверяем, есть ли данные для хотя бы одной четверти
-                has_data = False
-                for quarter in QUARTERS_ORDER:
-                    quarter_normalized = normalize_quarter(quarter)
-                    # Проверяем, есть ли данные для этой четверти
-                    for (subject, quarter_key), values in merged_data.items():
-                        if quarter_key == quarter_normalized and any(v for v in values if v and str(v).strip()):
-                            has_data = True
-                            break
-                    if has_data:
-                        break
-                
-                if not has_data:
-                    print(f"⚠ Нет данных для параллели {sheet_name}, пропускаем...")
-                    continue
-                
-                output_ws = output_wb.create_sheet(title=clean_sheet_name)
-                
-                # Обрабатываем каждую четверть
-                current_row = 1
-                for quarter in QUARTERS_ORDER:
-                    quarter_normalized = normalize_quarter(quarter)
-                    print(f"  Обработка четверти: {quarter} (нормализовано: {quarter_normalized})")
-                    current_row = create_quarter_table(output_ws, current_row, quarter_normalized, merged_data, fio_data)
-                    print(f"    ✓ Данные для четверти {quarter_normalized} обработаны")
-                
-                # Проверяем, что лист не пустой
-                if output_ws.max_row == 0 or output_ws.max_column == 0:
-                    print(f"⚠ Лист для {sheet_name} оказался пустым, удаляем...")
-                    output_wb.remove(output_ws)
-                    continue
-                
-                # Настройка ширины колонок
-                for col_idx in range(1, output_ws.max_column + 1):
-                    col_letter = get_column_letter(col_idx)
-                    if col_idx == 1:
-                        output_ws.column_dimensions[col_letter].width = 25
-                    else:
-                        max_length = 0
-                        for row_idx in range(1, min(output_ws.max_row + 1, 100)):
-                            cell_value = output_ws.cell(row_idx, col_idx).value
-                            if cell_value:
-                                max_length = max(max_length, len(str(cell_value)))
-                        width = min(max_length + 2, 15) if max_length > 15 else min(max_length + 2, 12)
-                        output_ws.column_dimensions[col_letter].width = width
-                
-                print(f"✓ Параллель {sheet_name} обработана")
-                
-            except Exception as e:
-                print(f"✗ Ошибка при обработке параллели {sheet_name}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+        for prepared in prepare_sheets(sheets, workers):
+            if prepared is not None:
+                render_sheet(output_wb, prepared)
         
         # Проверяем, есть ли листы для сохранения
         if len(output_wb.sheetnames) == 0:
@@ -863,7 +960,6 @@ def process_success_data(input_file='success_data.xlsx', output_file='processed_
         
         # Если указана папка для сохранения, добавляем её к пути
         if output_dir:
-            import os
             output_file = os.path.join(output_dir, output_file)
         
         # Сохраняем файл
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP-движок извлечения таблицы "Сапа" без Selenium.
+Использует cookies авторизованной сессии браузера и запрашивает AJAX-endpoint
+модального окна #classSapa напрямую через пул HTTP-соединений
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+
+# Атрибуты кнопки "Успеваемость", в которых может находиться идентификатор класса
+BUTTON_ID_ATTRIBUTES = ('onclick', 'data-id', 'data-class', 'data-class-id', 'data-id_class', 'value', 'id', 'href')
+
+# Стандартная последовательность четвертей (как в _extract_table_data_fast)
+DEFAULT_QUARTERS = ["І", "ІІ", "ІІІ", "ІV", "Ж"]
+
+# JavaScript-перехватчик XHR-запросов (jQuery.ajax тоже работает через XHR), которые страница делает при открытии модального окна
+XHR_RECORDER_JS = """
+if (!window.__sapaRecorderInstalled) {
+    window.__sapaRecorderInstalled = true;
+    window.__sapaRequests = [];
+    var origOpen = XMLHttpRequest.prototype.open;
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.open = function(method, url) {
+        this.__sapaRequest = {method: String(method || 'GET').toUpperCase(), url: String(url), body: null};
+        return origOpen.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.send = function(body) {
+        if (this.__sapaRequest) {
+            this.__sapaRequest.body = (typeof body === 'string') ? body : null;
+            var resolved = document.createElement('a');
+            resolved.href = this.__sapaRequest.url;
+            this.__sapaRequest.url = resolved.href;
+            window.__sapaRequests.push(this.__sapaRequest);
+        }
+        return origSend.apply(this, arguments);
+    };
+}
+window.__sapaRequests = [];
+"""
+
+
+class _Node:
+    """Узел упрощенного DOM-дерева"""
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs or [])
+        self.children = []
+        self.parent = parent
+
+    def text_content(self):
+        """Аналог textContent в браузере"""
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ''.join(parts)
+
+    def find_all(self, tag):
+        """Все потомки с указанным тегом (в порядке документа)"""
+        found = []
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                continue
+            if node.tag == tag:
+                found.append(node)
+            stack.extend(reversed(node.children))
+        return found
+
+    def find(self, tag):
+        found = self.find_all(tag)
+        return found[0] if found else None
+
+
+class _TableTreeBuilder(HTMLParser):
+    """Строит дерево из HTML-фрагмента с автозакрытием ячеек и строк таблицы"""
+    VOID_TAGS = {'br', 'img', 'input', 'hr', 'meta', 'link', 'col', 'area', 'base', 'wbr', 'source'}
+    # Какие открытые теги неявно закрываются при открытии нового тега
+    IMPLICIT_CLOSE = {
+        'td': ('td', 'th'),
+        'th': ('td', 'th'),
+        'tr': ('td', 'th', 'tr'),
+        'thead': ('td', 'th', 'tr', 'thead', 'tbody'),
+        'tbody': ('td', 'th', 'tr', 'thead', 'tbody'),
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node('#document')
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        closes = self.IMPLICIT_CLOSE.get(tag)
+        if closes:
+            while self.current.tag in closes and self.current.parent is not None:
+                self.current = self.current.parent
+        node = _Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in self.VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(_Node(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def _parse_span(value, default=1):
+    """colspan/rowspan как parseInt в браузере: ведущие цифры ("2 " -> 2), иначе default"""
+    match = re.match(r'\s*(\d+)', value or '')
+    return int(match.group(1)) if match else default
+
+
+def _select_sapa_table(root):
+    """Выбор таблицы "Сапа": предпочитаем таблицу с двухуровневым thead"""
+    tables = root.find_all('table')
+    for table in tables:
+        thead = table.find('thead')
+        if thead and len(thead.find_all('tr')) >= 2:
+            return table
+    return tables[0] if tables else None
+
+
+def parse_sapa_table_html(html):
+    """Разбор HTML модального окна "Сапа" в структуру {"headers", "data"}.
+
+    Повторяет логику MektepScraper._extract_table_data_fast, чтобы результат
+    был взаимозаменяем с данными, извлеченными через браузер.
+    """
+    if not html:
+        return None
+
+    builder = _TableTreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    table = _select_sapa_table(builder.root)
+    if table is None:
+        return None
+
+    headers = {
+        "first_row": [],
+        "second_row": [],
+        "subjects": [],
+        "first_col_name": "№",
+        "second_col_name": "Аты-жөні"
+    }
+
+    thead = table.find('thead')
+    if thead:
+        rows = thead.find_all('tr')
+        if len(rows) >= 2:
+            # Первая строка - предметы
+            for cell_index, cell in enumerate(rows[0].find_all('th')):
+                text = cell.text_content().strip()
+                colspan = _parse_span(cell.attrs.get('colspan'))
+                rowspan = _parse_span(cell.attrs.get('rowspan'))
+
+                if cell_index == 0:
+                    # Пропускаем первую пустую ячейку
+                    continue
+                if cell_index == 1 and rowspan > 1:
+                    headers["second_col_name"] = text or "Аты-жөні"
+                    continue
+
+                headers["first_row"].append({"text": text or "", "colspan": colspan})
+                headers["subjects"].extend([text or ""] * colspan)
+
+            # Вторая строка - четверти
+            base_quarters = []
+            for cell in rows[1].find_all('th'):
+                text = cell.text_content().strip()
+                if text and text not in base_quarters:
+                    base_quarters.append(text)
+            if not base_quarters:
+                base_quarters = list(DEFAULT_QUARTERS)
+
+            for _ in headers["first_row"]:
+                headers["second_row"].extend(base_quarters)
+
+            headers["unique_quarters"] = base_quarters
+            headers["quarters_per_subject"] = len(base_quarters)
+
+    # Извлекаем данные из tbody
+    table_data = []
+    tbody = table.find('tbody')
+    if tbody:
+        for row in tbody.find_all('tr'):
+            cells = row.find_all('td')
+            if len(cells) < 2:
+                continue
+
+            # Пропускаем служебные строки
+            first_cell = cells[0]
+            if _parse_span(first_cell.attrs.get('colspan')) >= 999:
+                continue
+
+            first_text = first_cell.text_content().strip()
+            row_class = row.attrs.get('class') or ''
+            if 'badge-' in row_class and first_text in ('5', '4', '3', '2') and first_cell.find('b'):
+                continue
+
+            if first_text in ('үлгерімі', 'сапасы'):
+                continue
+
+            row_data = [re.sub(r'\s+', ' ', cell.text_content().strip()) for cell in cells]
+
+            # Проверяем, что это строка с данными ученика (есть ФИО)
+            if row_data[1] and row_data[1].strip():
+                table_data.append(row_data)
+
+    return {
+        "headers": headers,
+        "data": table_data
+    }
+
+
+def _extract_html_from_response(response):
+    """Извлечение HTML из ответа сервера (HTML-фрагмент или JSON с HTML внутри)"""
+    content_type = response.headers.get('Content-Type', '')
+    if 'json' in content_type:
+        try:
+            payload = response.json()
+        except ValueError:
+            return response.text
+
+        stack = [payload]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str) and '<table' in item:
+                return item
+            if isinstance(item, dict):
+                stack.extend(item.values())
+            elif isinstance(item, list):
+                stack.extend(item)
+        return None
+    return response.text
+
+
+def _attribute_tokens(button_attrs):
+    """Числовые токены атрибутов кнопки: {(атрибут, позиция): значение}"""
+    tokens = {}
+    for attr_name in BUTTON_ID_ATTRIBUTES:
+        value = (button_attrs or {}).get(attr_name)
+        if not value:
+            continue
+        for position, token in enumerate(re.findall(r'\d+', str(value))):
+            tokens[(attr_name, position)] = token
+    return tokens
+
+
+def _replace_token(text, old, new):
+    """Замена числа целиком (без захвата соседних цифр)"""
+    if text is None:
+        return None
+    return re.sub(r'(?<!\d)' + re.escape(old) + r'(?!\d)', new, text)
+
+
+def build_class_requests(template_request, template_group, class_groups):
+    """Построение AJAX-запросов для всех классов по одному записанному образцу.
+
+    template_request - запрос {method, url, body}, перехваченный при открытии
+    модального окна для template_group. Идентификатор класса ищется среди
+    числовых токенов атрибутов кнопки, которые различаются у разных классов
+    и присутствуют в URL или теле запроса.
+
+    Возвращает список запросов в порядке class_groups (None для классов,
+    для которых запрос построить не удалось).
+    """
+    if not template_request or not template_group:
+        return [None] * len(class_groups)
+
+    template_tokens = _attribute_tokens(template_group.get('button_attrs'))
+    group_tokens = [_attribute_tokens(group.get('button_attrs')) for group in class_groups]
+
+    # Токены, которые отличаются у разных классов - кандидаты на идентификатор класса
+    request_text = f"{template_request.get('url', '')} {template_request.get('body') or ''}"
+    variable_keys = []
+    for key, value in template_tokens.items():
+        values = {tokens.get(key) for tokens in group_tokens}
+        if len(values) > 1 and re.search(r'(?<!\d)' + re.escape(value) + r'(?!\d)', request_text):
+            variable_keys.append(key)
+
+    if not variable_keys:
+        print("⚠ Не удалось определить идентификатор класса в AJAX-запросе")
+        return [None] * len(class_groups)
+
+    requests_list = []
+    for group, tokens in zip(class_groups, group_tokens):
+        if group is template_group:
+            requests_list.append(dict(template_request))
+            continue
+
+        url = template_request.get('url')
+        body = template_request.get('body')
+        complete = True
+        for key in variable_keys:
+            new_value = tokens.get(key)
+            if new_value is None:
+                complete = False
+                break
+            url = _replace_token(url, template_tokens[key], new_value)
+            body = _replace_token(body, template_tokens[key], new_value)
+
+        requests_list.append({
+            "method": template_request.get('method', 'GET'),
+            "url": url,
+            "body": body
+        } if complete else None)
+
+    return requests_list
+
+
+class RateLimiter:
+    """Ограничение частоты запросов (не чаще rate запросов в секунду на все потоки)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """Блокирует поток до момента, когда разрешен следующий запрос"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_time)
+            self._next_time = scheduled + self.interval
+        delay = scheduled - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SapaHttpClient:
+    """HTTP-клиент с пулом соединений, авторизованный cookies из Selenium"""
+
+    def __init__(self, cookies, user_agent=None, referer=None, pool_size=None, timeout=None):
+        self.timeout = timeout or config.HTTP_TIMEOUT
+        pool_size = pool_size or config.HTTP_POOL_SIZE
+
+        self.session = requests.Session()
+        # Повторяются только идемпотентные методы (по умолчанию urllib3): POST модального окна после
+        # таймаута мог быть уже обработан сервером, а повтор не учитывался бы RateLimiter.
+        # Класс, не загруженный по HTTP, загружается браузером
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.session.headers.update({
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': 'text/html, */*; q=0.01',
+        })
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        if referer:
+            self.session.headers['Referer'] = referer
+
+        for cookie in cookies or []:
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain'), path=cookie.get('path', '/')
+            )
+
+    @classmethod
+    def from_scraper(cls, scraper, **kwargs):
+        """Создание клиента из авторизованного MektepScraper"""
+        return cls(
+            cookies=scraper.driver.get_cookies(),
+            user_agent=scraper.driver.execute_script("return navigator.userAgent"),
+            referer=scraper.driver.current_url,
+            **kwargs
+        )
+
+    def fetch_class_table(self, sapa_request):
+        """Загрузка и разбор таблицы "Сапа" одного класса"""
+        method = sapa_request.get('method', 'GET')
+        body = sapa_request.get('body')
+        headers = {}
+        if method == 'POST' and body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
+
+        response = self.session.request(
+            method, sapa_request['url'],
+            data=body.encode('utf-8') if body is not None else None,
+            headers=headers,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        # Сервер не всегда указывает кодировку, а таблица содержит казахские буквы
+        if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = 'utf-8'
+
+        table_data = parse_sapa_table_html(_extract_html_from_response(response))
+        if not table_data or not table_data.get("data"):
+            return None
+        return table_data
+
+    def fetch_many(self, sapa_requests, max_workers=None, rate=None, should_stop=None):
+        """Параллельная загрузка таблиц нескольких классов.
+
+        sapa_requests - список запросов (None пропускается). Одновременно выполняется
+        не более max_workers запросов, и не чаще rate запросов в секунду.
+        Возвращает список (table_data, error) в том же порядке, что и sapa_requests,
+        поэтому дальнейшая запись результатов остается детерминированной.
+        """
+        max_workers = max(1, max_workers or config.SCRAPER_CONCURRENCY)
+        limiter = RateLimiter(config.SCRAPER_RATE_LIMIT if rate is None else rate)
+
+        def fetch(sapa_request):
+            if sapa_request is None:
+                return None, None
+            if should_stop and should_stop():
+                return None, None
+            limiter.wait()
+            try:
+                return self.fetch_class_table(sapa_request), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sapa-http') as executor:
+            # executor.map сохраняет порядок входных запросов
+            return list(executor.map(fetch, sapa_requests))
+
+    def close(self):
+        self.session.close()
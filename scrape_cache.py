@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов скрапинга для инкрементального обновления.
+
+Для каждого класса школы хранится хэш содержимого таблицы "Сапа" отдельно
+по четвертям и сама таблица. Если ни один класс отчета не изменился, итоговый
+файл не формируется заново, а копируется из кэша. Дополнительно можно не
+загружать таблицу класса, если строка класса в списке классов (проба) не
+изменилась и таблица загружалась недавно (SCRAPE_PROBE_MAX_AGE)
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import config
+from process_quarters_final import REPORT_FORMAT_VERSION, normalize_quarter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS class_hashes (
+    school TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    quarter TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (school, class_name, quarter)
+);
+CREATE TABLE IF NOT EXISTS class_tables (
+    school TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    probe TEXT,
+    table_data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (school, class_name)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    school TEXT NOT NULL,
+    report_name TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    path TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (school, report_name)
+);
+"""
+
+# Поля строки списка классов, по которым строится проба (без WebElement кнопки)
+PROBE_FIELDS = ('name', 'type', 'language', 'shift', 'teacher', 'students')
+
+# Ключ хэша для колонок без распознанной четверти
+NO_QUARTER = '-'
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+def quarter_hashes(table_data):
+    """Хэши таблицы класса по четвертям: {четверть: sha256}.
+
+    В хэш четверти входят названия ее предметов, ФИО учеников и значения
+    ее колонок, поэтому изменение оценки одной четверти не меняет хэши остальных
+    """
+    headers = table_data.get('headers') or {}
+    subjects = []
+    for subject in headers.get('first_row') or []:
+        subjects.extend([subject.get('text') or ''] * subject.get('colspan', 1))
+    quarters = [normalize_quarter(quarter) or NO_QUARTER for quarter in headers.get('second_row') or []]
+
+    columns = {}
+    for col_idx, quarter in enumerate(quarters):
+        columns.setdefault(quarter, []).append(col_idx)
+
+    rows = table_data.get('data') or []
+    hashes = {}
+    for quarter, col_indexes in columns.items():
+        content = {
+            'subjects': [subjects[idx] if idx < len(subjects) else '' for idx in col_indexes],
+            # Первые две колонки строки - № и ФИО, оценки начинаются с третьей
+            'rows': [[row[1] if len(row) > 1 else ''] + [row[idx + 2] if idx + 2 < len(row) else '' for idx in col_indexes]
+                     for row in rows]
+        }
+        hashes[quarter] = _digest(content)
+    if not hashes:
+        # Таблица без строки четвертей - хэш по всем строкам
+        hashes[NO_QUARTER] = _digest(rows)
+    return hashes
+
+
+def class_probe(group):
+    """Проба класса - хэш его строки в списке классов (без загрузки таблицы)"""
+    return _digest([group.get(field, '') for field in PROBE_FIELDS])
+
+
+class ScrapeCache:
+    """Хэши и таблицы классов, итоговые файлы отчетов (SQLite, одно соединение на поток)"""
+
+    def __init__(self, directory, probe_max_age=None):
+        self.directory = Path(directory)
+        self.outputs_dir = self.directory / 'outputs'
+        self.outputs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(self.directory / 'scrape_cache.sqlite3')
+        self.probe_max_age = probe_max_age if probe_max_age is not None else config.SCRAPE_PROBE_MAX_AGE
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def cached_table(self, school, group):
+        """Таблица класса из кэша, если проба не изменилась и таблица не старше probe_max_age"""
+        if self.probe_max_age <= 0:
+            return None
+        row = self._conn().execute(
+            'SELECT probe, table_data, fetched_at FROM class_tables WHERE school = ? AND class_name = ?',
+            (school, group['name'])
+        ).fetchone()
+        if row is None or row['probe'] != class_probe(group) or time.time() - row['fetched_at'] > self.probe_max_age:
+            return None
+        return json.loads(row['table_data'])
+
+    def update_class(self, school, group, table_data, fetched=True):
+        """Сохранение хэшей и таблицы класса. Возвращает список изменившихся четвертей
+        (все четверти для нового класса, пустой список - без изменений)
+        """
+        class_name = group['name']
+        hashes = quarter_hashes(table_data)
+        now = time.time()
+        with self._transaction() as conn:
+            previous = {row['quarter']: row['hash'] for row in conn.execute(
+                'SELECT quarter, hash FROM class_hashes WHERE school = ? AND class_name = ?', (school, class_name))}
+            changed = [quarter for quarter, digest in hashes.items() if previous.get(quarter) != digest]
+            removed = [quarter for quarter in previous if quarter not in hashes]
+            if changed or removed:
+                conn.execute('DELETE FROM class_hashes WHERE school = ? AND class_name = ?', (school, class_name))
+                conn.executemany(
+                    'INSERT INTO class_hashes (school, class_name, quarter, hash, updated_at) VALUES (?, ?, ?, ?, ?)',
+                    [(school, class_name, quarter, digest, now) for quarter, digest in hashes.items()]
+                )
+            if fetched:
+                # Время загрузки обновляется только для таблиц, полученных с сайта
+                conn.execute(
+                    'INSERT OR REPLACE INTO class_tables (school, class_name, probe, table_data, fetched_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (school, class_name, class_probe(group), json.dumps(table_data, ensure_ascii=False), now)
+                )
+        return changed + removed
+
+    @staticmethod
+    def fingerprint(tables):
+        """Отпечаток набора таблиц отчета ({имя листа: table_data}) с учетом порядка листов.
+
+        В него входят таблицы целиком (в том числе нумерация учеников, по которой обработка
+        определяет конец данных) и REPORT_FORMAT_VERSION, поэтому после изменения формата
+        отчета ранее сформированные файлы не используются
+        """
+        return hashlib.sha256(json.dumps(
+            [REPORT_FORMAT_VERSION, [[sheet_name, table_data] for sheet_name, table_data in tables.items()]],
+            ensure_ascii=False, sort_keys=True, default=str
+        ).encode('utf-8')).hexdigest()
+
+    def find_output(self, school, report_name, fingerprint):
+        """Путь к ранее сформированному отчету с тем же отпечатком (или None)"""
+        row = self._conn().execute(
+            'SELECT fingerprint, path FROM outputs WHERE school = ? AND report_name = ?', (school, report_name)
+        ).fetchone()
+        if row is None or row['fingerprint'] != fingerprint or not os.path.exists(row['path']):
+            return None
+        return row['path']
+
+    def store_output(self, school, report_name, fingerprint, file_path):
+        """Копия итогового отчета в кэше (файлы заданий удаляются при сбросе)"""
+        target_dir = self.outputs_dir / _digest([school, report_name])[:32]
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / Path(file_path).name
+        tmp_target = target.with_suffix('.tmp')
+        shutil.copyfile(file_path, tmp_target)
+        os.replace(tmp_target, target)
+        with self._transaction() as conn:
+            previous = conn.execute(
+                'SELECT path FROM outputs WHERE school = ? AND report_name = ?', (school, report_name)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO outputs (school, report_name, fingerprint, path, created_at) VALUES (?, ?, ?, ?, ?)',
+                (school, report_name, fingerprint, str(target), time.time())
+            )
+        if previous and previous['path'] != str(target):
+            try:
+                os.remove(previous['path'])
+            except OSError:
+                pass
+        return str(target)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_scrape_cache():
+    """Кэш по настройкам config (None, если инкрементальное обновление отключено)"""
+    global _default_cache
+    if not config.SCRAPE_CACHE_DIR:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ScrapeCache(Path(__file__).parent / config.SCRAPE_CACHE_DIR)
+        return _default_cache
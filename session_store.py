@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Хранилище авторизованных сессий mektep.edu.kz.
+
+Cookies после успешного входа сохраняются в зашифрованном виде (Fernet)
+отдельно для каждого логина, чтобы следующий запуск мог восстановить сессию
+без заполнения формы авторизации
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet, InvalidToken
+
+import config
+
+# Поля cookie, которые принимает Selenium add_cookie
+COOKIE_FIELDS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+
+class SessionStore:
+    """Зашифрованные cookie-сессии, по файлу на логин"""
+
+    def __init__(self, directory, secret=None, max_age=None):
+        self.directory = Path(directory)
+        self.max_age = max_age if max_age is not None else config.SESSION_MAX_AGE
+        self._lock = threading.Lock()
+        self._secret = (secret or self._load_or_create_secret()).encode('utf-8')
+        # Ключ Fernet выводится из секрета, чтобы в SESSION_SECRET можно было задать произвольную строку
+        self._fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(self._secret).digest()))
+
+    def _load_or_create_secret(self, attempts=50):
+        """Секрет из файла рядом с сессиями (создается при первом запуске).
+
+        Воркеры gunicorn стартуют одновременно: ключ пишется во временный файл и публикуется
+        через os.link, поэтому файл .key появляется уже записанным и только один раз
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        key_file = self.directory / '.key'
+        for _ in range(attempts):
+            try:
+                secret = key_file.read_text().strip()
+            except FileNotFoundError:
+                secret = None
+            if secret:
+                return secret
+            if secret is None:
+                fd, tmp_name = tempfile.mkstemp(dir=str(self.directory), prefix='.key.', suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        f.write(Fernet.generate_key().decode('ascii'))
+                    os.link(tmp_name, str(key_file))
+                except FileExistsError:
+                    pass  # Ключ уже создал другой воркер - читаем его
+                finally:
+                    os.unlink(tmp_name)
+                continue
+            # Пустой файл (ключ записывает другой процесс без os.link) - перечитываем
+            time.sleep(0.1)
+        raise RuntimeError(f'Не удалось прочитать ключ сессий {key_file}')
+
+    def _path(self, login):
+        # Имя файла не раскрывает логин
+        name = hmac.new(self._secret, login.encode('utf-8'), hashlib.sha256).hexdigest()
+        return self.directory / f'{name}.session'
+
+    def _password_digest(self, password):
+        return hmac.new(self._secret, password.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def save(self, login, password, cookies):
+        """Сохранение cookies авторизованной сессии"""
+        payload = {
+            'saved_at': time.time(),
+            'password': self._password_digest(password),
+            'cookies': [{k: c[k] for k in COOKIE_FIELDS if k in c} for c in cookies]
+        }
+        token = self._fernet.encrypt(json.dumps(payload).encode('utf-8'))
+        path = self._path(login)
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Уникальное имя: этот же логин может одновременно сохранять другой воркер
+            fd, tmp_name = tempfile.mkstemp(dir=str(self.directory), prefix=f'{path.stem}.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(token)
+                os.replace(tmp_name, path)
+            except Exception:
+                os.unlink(tmp_name)
+                raise
+
+    def load(self, login, password):
+        """Cookies сохраненной сессии или None (нет, устарела, другой пароль, не расшифровывается)"""
+        path = self._path(login)
+        try:
+            token = path.read_bytes()
+        except OSError:
+            return None
+
+        try:
+            payload = json.loads(self._fernet.decrypt(token, ttl=self.max_age or None))
+        except (InvalidToken, ValueError):
+            self.delete(login)
+            return None
+
+        # Сессию получает только тот, кто знает пароль
+        if not hmac.compare_digest(payload.get('password', ''), self._password_digest(password)):
+            return None
+
+        now = time.time()
+        cookies = [c for c in payload.get('cookies', []) if not c.get('expiry') or c['expiry'] > now]
+        return cookies or None
+
+    def delete(self, login):
+        try:
+            self._path(login).unlink()
+        except OSError:
+            pass
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Хранилище сессий по настройкам config (None, если сохранение сессий отключено)"""
+    global _default_store
+    if not config.SESSION_STORE_DIR:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SessionStore(
+                Path(__file__).parent / config.SESSION_STORE_DIR,
+                secret=config.SESSION_SECRET or None
+            )
+        return _default_store
@@ -2,9 +2,70 @@
 let currentStep = 0;  // Начинаем с шага 0 (авторизация)
 let statusInterval = null;
 let logsInterval = null;
+let eventSource = null;  // Поток событий /api/events (статус и новые логи)
+let replaceLogsOnNext = false;  // Первая порция логов нового подключения заменяет список
+let lastLogSeq = null;  // seq последнего полученного лога (для опроса без EventSource)
+const MAX_LOG_ENTRIES = 30;  // Сколько последних логов показывать
 let logsExpanded = false;
 let authTimerInterval = null;  // Интервал для таймера авторизации
 let credentialsSaved = false;  // Флаг сохранения учетных данных
+let currentJobId = localStorage.getItem('currentJobId');  // Текущее задание (переживает перезагрузку страницы)
+
+// URL API с привязкой к текущему заданию
+function withJob(url) {
+    if (!currentJobId) {
+        return url;
+    }
+    return url + (url.includes('?') ? '&' : '?') + 'job_id=' + encodeURIComponent(currentJobId);
+}
+
+function setCurrentJob(jobId) {
+    const changed = currentJobId !== jobId;
+    currentJobId = jobId;
+    if (jobId) {
+        localStorage.setItem('currentJobId', jobId);
+    } else {
+        localStorage.removeItem('currentJobId');
+    }
+    if (changed) {
+        lastLogSeq = null;
+    }
+    // Поток событий привязан к заданию - переподключаемся
+    if (changed && eventSource) {
+        connectEvents();
+    }
+}
+
+// Подписка на статус и логи через Server-Sent Events (без опроса по таймеру)
+function connectEvents() {
+    if (!window.EventSource) {
+        // Старый браузер - опрашиваем API по таймеру
+        if (!statusInterval) {
+            statusInterval = setInterval(updateStatus, 2000);
+            logsInterval = setInterval(loadLogs, 3000);
+        }
+        return;
+    }
+    
+    if (eventSource) {
+        eventSource.close();
+    }
+    replaceLogsOnNext = true;
+    eventSource = new EventSource(withJob('/api/events'));
+    
+    eventSource.addEventListener('status', event => {
+        applyStatus(JSON.parse(event.data));
+    });
+    eventSource.addEventListener('logs', event => {
+        const data = JSON.parse(event.data);
+        renderLogs(data.logs || [], replaceLogsOnNext);
+        replaceLogsOnNext = false;
+    });
+    eventSource.onerror = () => {
+        // Браузер переподключится сам и передаст seq последнего лога (Last-Event-ID)
+        console.warn('Поток событий прерван, переподключение...');
+    };
+}
 
 // Инициализация
 document.addEventListener('DOMContentLoaded', function() {
@@ -16,12 +77,9 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
             console.log('API подключен:', data);
             checkCredentialsStatus();
-            updateStatus();
-            loadLogs();
             
-            // Устанавливаем интервалы
-            statusInterval = setInterval(updateStatus, 2000);
-            logsInterval = setInterval(loadLogs, 3000);
+            // Статус и логи приходят через поток событий
+            connectEvents();
         })
         .catch(error => {
             console.error('Ошибка подключения к API:', error);
@@ -111,11 +169,18 @@ async function saveCredentials(event) {
 // Обновление статуса
 async function updateStatus() {
     try {
-        const response = await fetch('/api/status/scraper');
+        const response = await fetch(withJob('/api/status/scraper'));
         if (!response.ok) return;
         
-        const status = await response.json();
-        
+        applyStatus(await response.json());
+    } catch (error) {
+        console.error('Ошибка при обновлении статуса:', error);
+    }
+}
+
+// Отображение статуса (из потока событий или запроса)
+function applyStatus(status) {
+    try {
         // Обновляем прогресс
         const progressContainer = document.getElementById('progress-container');
         const progressFill = document.getElementById('progress-fill');
@@ -299,6 +364,7 @@ async function startProcess() {
         const result = await response.json();
         
         if (response.ok) {
+            setCurrentJob(result.job_id);
             addLog('SYSTEM', 'Процесс запущен', 'info');
             showStep(1);
         } else {
@@ -359,7 +425,7 @@ function displaySchools(schools) {
 // Выбор школы
 async function selectSchool(schoolNumber) {
     try {
-        const response = await fetch('/api/select/school', {
+        const response = await fetch(withJob('/api/select/school'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ school_number: schoolNumber })
@@ -403,7 +469,7 @@ function displayClasses(classes) {
 // Выбор класса
 async function selectClass(className) {
     try {
-        const response = await fetch('/api/select/class', {
+        const response = await fetch(withJob('/api/select/class'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ class_name: className })
@@ -433,7 +499,7 @@ async function selectClass(className) {
 // Загрузка файлов
 async function loadFiles() {
     try {
-        const response = await fetch('/api/files');
+        const response = await fetch(withJob('/api/files'));
         const data = await response.json();
         
         const container = document.getElementById('files-container');
@@ -473,7 +539,7 @@ async function loadFiles() {
                                         Размер: ${formatFileSize(file.size)} | Изменен: ${file.modified}
                                     </div>
                                 </div>
-                                <a href="/api/download/${file.name}" class="btn btn-primary file-download" download>
+                                <a href="${file.url}" class="btn btn-primary file-download" download>
                                     <i class="fas fa-download"></i> Скачать
                                 </a>
                             </div>
@@ -502,7 +568,7 @@ async function loadFiles() {
                                         Размер: ${formatFileSize(file.size)} | Изменен: ${file.modified}
                                     </div>
                                 </div>
-                                <a href="/api/download/${file.name}" class="btn btn-primary file-download" download>
+                                <a href="${file.url}" class="btn btn-primary file-download" download>
                                     <i class="fas fa-download"></i> Скачать
                                 </a>
                             </div>
@@ -528,7 +594,7 @@ async function loadFiles() {
 // Перезапуск процесса
 async function restartProcess() {
     // Если процесс запущен, сначала останавливаем его
-    const response = await fetch('/api/status/scraper');
+    const response = await fetch(withJob('/api/status/scraper'));
     const status = await response.json();
     
     if (status.running) {
@@ -537,7 +603,7 @@ async function restartProcess() {
         }
         // Останавливаем процесс
         try {
-            await fetch('/api/stop/scraper', { method: 'POST' });
+            await fetch(withJob('/api/stop/scraper'), { method: 'POST' });
             // Ждем немного, чтобы процесс остановился
             await new Promise(resolve => setTimeout(resolve, 1000));
         } catch (e) {
@@ -551,7 +617,7 @@ async function restartProcess() {
     
     try {
         // Сбрасываем состояние на сервере
-        const response = await fetch('/api/reset', {
+        const response = await fetch(withJob('/api/reset'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' }
         });
@@ -563,6 +629,7 @@ async function restartProcess() {
         
         const result = await response.json();
         console.log('Состояние сброшено:', result);
+        setCurrentJob(null);
         
         // Сбрасываем локальное состояние
         // НЕ сбрасываем учетные данные, только переходим к шагу запуска
@@ -735,35 +802,50 @@ async function restartProcess() {
 // Логи
 async function loadLogs() {
     try {
-        const response = await fetch('/api/logs');
+        // Запрашиваем только записи новее уже полученных
+        const url = lastLogSeq === null ? '/api/logs' : '/api/logs?after=' + lastLogSeq;
+        const response = await fetch(withJob(url));
         const data = await response.json();
-        
-        const container = document.getElementById('logs-container');
-        if (!container) return;
-        
-        if (data.logs && data.logs.length > 0) {
-            const recentLogs = data.logs.slice(-30);
-            container.innerHTML = recentLogs.map(log => {
-                const levelClass = log.level || 'info';
-                const sourceClass = log.source.toLowerCase();
-                return `
-                    <div class="log-entry ${levelClass}">
-                        <span class="log-time">${log.timestamp || '--:--:--'}</span>
-                        <span class="log-source ${sourceClass}">${log.source || 'SYSTEM'}</span>
-                        <span class="log-message">${escapeHtml(log.message || '')}</span>
-                    </div>
-                `;
-            }).join('');
-            
-            if (logsExpanded) {
-                container.scrollTop = container.scrollHeight;
-            }
+        renderLogs(data.logs || [], lastLogSeq === null);
+        if (data.last_seq !== null && data.last_seq !== undefined) {
+            lastLogSeq = data.last_seq;
         }
     } catch (error) {
         console.error('Ошибка при загрузке логов:', error);
     }
 }
 
+// Вывод логов: replace - заменить список, иначе дописать новые записи
+function renderLogs(logs, replace) {
+    const container = document.getElementById('logs-container');
+    if (!container || !logs.length) return;
+    
+    const html = logs.slice(-MAX_LOG_ENTRIES).map(log => {
+        const levelClass = log.level || 'info';
+        const sourceClass = (log.source || 'SYSTEM').toLowerCase();
+        return `
+            <div class="log-entry ${levelClass}">
+                <span class="log-time">${log.timestamp || '--:--:--'}</span>
+                <span class="log-source ${sourceClass}">${log.source || 'SYSTEM'}</span>
+                <span class="log-message">${escapeHtml(log.message || '')}</span>
+            </div>
+        `;
+    }).join('');
+    
+    if (replace) {
+        container.innerHTML = html;
+    } else {
+        container.insertAdjacentHTML('beforeend', html);
+        while (container.children.length > MAX_LOG_ENTRIES) {
+            container.removeChild(container.firstElementChild);
+        }
+    }
+    
+    if (logsExpanded) {
+        container.scrollTop = container.scrollHeight;
+    }
+}
+
 function toggleLogs() {
     logsExpanded = !logsExpanded;
     const content = document.getElementById('logs-content');